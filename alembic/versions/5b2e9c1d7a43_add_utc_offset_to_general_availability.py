@@ -0,0 +1,43 @@
+"""add utc_offset to general_availability
+
+Revision ID: 5b2e9c1d7a43
+Revises: 928ad05a6950
+Create Date: 2026-10-18 10:12:41.502318
+
+"""
+from datetime import date, datetime, time
+from typing import Sequence, Union
+
+from alembic import op
+import pytz
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = '5b2e9c1d7a43'
+down_revision: Union[str, None] = '928ad05a6950'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    op.add_column('general_availability', sa.Column('utc_offset', sa.Integer(), nullable=True))
+
+    # Existing rows were converted with the offset of the day they were created on, which isn't known
+    # anymore; today's offset of their zone is the closest guess.
+    connection = op.get_bind()
+    zones = connection.execute(sa.text('SELECT DISTINCT time_zone FROM general_availability')).scalars().all()
+    for zone in zones:
+        try:
+            tz = pytz.timezone(zone)
+        except pytz.UnknownTimeZoneError:
+            continue
+        offset = int(tz.localize(datetime.combine(date.today(), time(12))).utcoffset().total_seconds()) // 60
+        connection.execute(
+            sa.text('UPDATE general_availability SET utc_offset = :offset WHERE time_zone = :zone'),
+            {'offset': offset, 'zone': zone},
+        )
+
+
+def downgrade() -> None:
+    op.drop_column('general_availability', 'utc_offset')
@@ -0,0 +1,70 @@
+"""reject overlapping availability slots in the database
+
+Revision ID: a71f04c3e8d2
+Revises: 5b2e9c1d7a43
+Create Date: 2026-10-18 11:03:27.816402
+
+Overlapping slots of a user on the same day/date are rejected by an exclusion constraint on Postgres
+(requires btree_gist and Postgres 14+ for multirange support) and by triggers on SQLite. Overlapping
+rows that already exist have to be cleaned up before upgrading, or creating the constraint fails.
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+
+
+# revision identifiers, used by Alembic.
+revision: str = 'a71f04c3e8d2'
+down_revision: Union[str, None] = '5b2e9c1d7a43'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+TABLES = (('general_availability', 'day'), ('custom_availability', 'date'))
+
+# A slot whose end is not after its start crosses midnight and covers both ends of the day
+SLOT_MULTIRANGE = (
+    "CASE WHEN end_time > start_time "
+    "THEN tsmultirange(tsrange(DATE '2000-01-01' + start_time, DATE '2000-01-01' + end_time)) "
+    "ELSE tsmultirange(tsrange(DATE '2000-01-01' + start_time, TIMESTAMP '2000-01-02 00:00'), "
+    "tsrange(TIMESTAMP '2000-01-01 00:00', DATE '2000-01-01' + end_time)) END"
+)
+
+
+def sqlite_overlap_condition(table: str, period: str) -> str:
+    return (
+        f"EXISTS (SELECT 1 FROM {table} e WHERE e.user_id = NEW.user_id AND e.{period} = NEW.{period} AND e.id IS NOT NEW.id AND ("
+        "(NEW.end_time <= NEW.start_time AND (e.end_time <= e.start_time OR e.end_time > NEW.start_time OR e.start_time < NEW.end_time)) OR "
+        "(NEW.end_time > NEW.start_time AND e.end_time <= e.start_time AND (e.end_time > NEW.start_time OR e.start_time < NEW.end_time)) OR "
+        "(NEW.end_time > NEW.start_time AND e.end_time > e.start_time AND e.start_time < NEW.end_time AND e.end_time > NEW.start_time)))"
+    )
+
+
+def upgrade() -> None:
+    dialect = op.get_bind().dialect.name
+    if dialect == 'postgresql':
+        op.execute('CREATE EXTENSION IF NOT EXISTS btree_gist')
+    for table, period in TABLES:
+        if dialect == 'postgresql':
+            op.execute(
+                f"ALTER TABLE {table} ADD CONSTRAINT exclude_overlapping_{table} "
+                f"EXCLUDE USING gist (user_id WITH =, {period} WITH =, ({SLOT_MULTIRANGE}) WITH &&)"
+            )
+        elif dialect == 'sqlite':
+            for operation in ('INSERT', 'UPDATE'):
+                op.execute(
+                    f"CREATE TRIGGER no_overlap_{table}_{operation.lower()} BEFORE {operation} ON {table} "
+                    f"WHEN {sqlite_overlap_condition(table, period)} "
+                    f"BEGIN SELECT RAISE(ABORT, 'overlapping {table}'); END"
+                )
+
+
+def downgrade() -> None:
+    dialect = op.get_bind().dialect.name
+    for table, _ in TABLES:
+        if dialect == 'postgresql':
+            op.execute(f'ALTER TABLE {table} DROP CONSTRAINT exclude_overlapping_{table}')
+        elif dialect == 'sqlite':
+            for operation in ('insert', 'update'):
+                op.execute(f'DROP TRIGGER no_overlap_{table}_{operation}')
@@ -0,0 +1,105 @@
+"""compare weekly availability rules of different zones for overlaps
+
+Revision ID: b8e3f5a1c904
+Revises: f2c6d1a8b347
+Create Date: 2026-10-18 18:21:53.240817
+
+f2c6d1a8b347 only compared a rule with the rules of its own zone, so a 09:00-10:00 Europe/Paris rule
+and the same hour entered in UTC were both accepted. Rules of the same zone are still compared in
+wall-clock time (stored time + utc_offset); rules of different zones are compared on their stored UTC
+times. On Postgres that takes a second exclusion constraint, with time_zone WITH <>.
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+
+
+# revision identifiers, used by Alembic.
+revision: str = 'b8e3f5a1c904'
+down_revision: Union[str, None] = 'f2c6d1a8b347'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+TABLE = 'general_availability'
+
+
+def slot_multirange(start: str, end: str) -> str:
+    # A slot whose end is not after its start crosses midnight and covers both ends of the day
+    return (
+        f"CASE WHEN {end} > {start} "
+        f"THEN tsmultirange(tsrange(DATE '2000-01-01' + {start}, DATE '2000-01-01' + {end})) "
+        f"ELSE tsmultirange(tsrange(DATE '2000-01-01' + {start}, TIMESTAMP '2000-01-02 00:00'), "
+        f"tsrange(TIMESTAMP '2000-01-01 00:00', DATE '2000-01-01' + {end})) END"
+    )
+
+
+def sqlite_slots_overlap(start: str, end: str, existing_start: str, existing_end: str) -> str:
+    return (
+        f"(({end} <= {start} AND ({existing_end} <= {existing_start} OR {existing_end} > {start} OR {existing_start} < {end})) OR "
+        f"({end} > {start} AND {existing_end} <= {existing_start} AND ({existing_end} > {start} OR {existing_start} < {end})) OR "
+        f"({end} > {start} AND {existing_end} > {existing_start} AND {existing_start} < {end} AND {existing_end} > {start}))"
+    )
+
+
+def postgres_wall_clock(column: str) -> str:
+    return f"({column} + COALESCE(utc_offset, 0) * INTERVAL '1 minute')"
+
+
+def sqlite_wall_clock(alias: str, column: str) -> str:
+    return f"time({alias}.{column}, COALESCE({alias}.utc_offset, 0) || ' minutes')"
+
+
+def drop_overlap_check(dialect: str, across_zones: bool) -> None:
+    if dialect == 'postgresql':
+        op.execute(f'ALTER TABLE {TABLE} DROP CONSTRAINT exclude_overlapping_{TABLE}')
+        if across_zones:
+            op.execute(f'ALTER TABLE {TABLE} DROP CONSTRAINT exclude_overlapping_{TABLE}_across_zones')
+    elif dialect == 'sqlite':
+        for operation in ('insert', 'update'):
+            op.execute(f'DROP TRIGGER no_overlap_{TABLE}_{operation}')
+
+
+def create_overlap_check(dialect: str, across_zones: bool) -> None:
+    if dialect == 'postgresql':
+        local_slot = slot_multirange(postgres_wall_clock('start_time'), postgres_wall_clock('end_time'))
+        exclusions = [('', f'day WITH =, time_zone WITH =, ({local_slot}) WITH &&')]
+        if across_zones:
+            exclusions.append(('_across_zones', f"day WITH =, time_zone WITH <>, ({slot_multirange('start_time', 'end_time')}) WITH &&"))
+        for suffix, exclusion in exclusions:
+            op.execute(
+                f"ALTER TABLE {TABLE} ADD CONSTRAINT exclude_overlapping_{TABLE}{suffix} "
+                f"EXCLUDE USING gist (user_id WITH =, {exclusion})"
+            )
+    elif dialect == 'sqlite':
+        local_overlap = sqlite_slots_overlap(
+            sqlite_wall_clock('NEW', 'start_time'), sqlite_wall_clock('NEW', 'end_time'),
+            sqlite_wall_clock('e', 'start_time'), sqlite_wall_clock('e', 'end_time'),
+        )
+        if across_zones:
+            utc_overlap = sqlite_slots_overlap('NEW.start_time', 'NEW.end_time', 'e.start_time', 'e.end_time')
+            condition = (
+                f"e.day = NEW.day AND ((e.time_zone = NEW.time_zone AND {local_overlap}) OR "
+                f"(e.time_zone <> NEW.time_zone AND {utc_overlap}))"
+            )
+        else:
+            condition = f"e.day = NEW.day AND e.time_zone = NEW.time_zone AND {local_overlap}"
+        for operation in ('INSERT', 'UPDATE'):
+            op.execute(
+                f"CREATE TRIGGER no_overlap_{TABLE}_{operation.lower()} BEFORE {operation} ON {TABLE} "
+                f"WHEN EXISTS (SELECT 1 FROM {TABLE} e WHERE e.user_id = NEW.user_id AND e.id IS NOT NEW.id AND {condition}) "
+                f"BEGIN SELECT RAISE(ABORT, 'overlapping {TABLE}'); END"
+            )
+
+
+def upgrade() -> None:
+    dialect = op.get_bind().dialect.name
+    drop_overlap_check(dialect, across_zones=False)
+    create_overlap_check(dialect, across_zones=True)
+
+
+def downgrade() -> None:
+    dialect = op.get_bind().dialect.name
+    drop_overlap_check(dialect, across_zones=True)
+    create_overlap_check(dialect, across_zones=False)
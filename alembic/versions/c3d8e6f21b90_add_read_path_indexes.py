@@ -0,0 +1,34 @@
+"""add composite indexes for the common availability read path
+
+Revision ID: c3d8e6f21b90
+Revises: a71f04c3e8d2
+Create Date: 2026-10-18 11:41:09.204577
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = 'c3d8e6f21b90'
+down_revision: Union[str, None] = 'a71f04c3e8d2'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    # The INCLUDE columns make these covering indexes on Postgres; other dialects ignore them
+    op.create_index('ix_general_availability_user_id_day', 'general_availability', ['user_id', 'day'], unique=False,
+                    postgresql_include=['start_time', 'end_time', 'time_zone', 'utc_offset'])
+    op.create_index('ix_custom_availability_user_id_date', 'custom_availability', ['user_id', 'date'], unique=False,
+                    postgresql_include=['start_time', 'end_time', 'time_zone'])
+    op.create_index('ix_schedules_user_id_date', 'schedules', ['user_id', 'date'], unique=False,
+                    postgresql_include=['start_time', 'end_time'])
+
+
+def downgrade() -> None:
+    op.drop_index('ix_schedules_user_id_date', table_name='schedules')
+    op.drop_index('ix_custom_availability_user_id_date', table_name='custom_availability')
+    op.drop_index('ix_general_availability_user_id_day', table_name='general_availability')
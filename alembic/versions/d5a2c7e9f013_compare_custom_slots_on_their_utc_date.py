@@ -0,0 +1,125 @@
+"""compare custom availability slots for overlaps on their UTC date
+
+Revision ID: d5a2c7e9f013
+Revises: b8e3f5a1c904
+Create Date: 2026-10-18 19:07:36.918452
+
+Custom slots were compared on their local date with their UTC times, which only lines up within one
+zone: a Kolkata slot on 2026-11-02 01:00-02:00 (19:30-20:30 UTC the day before) blocked a UTC slot on
+2026-11-02 19:30-20:30, and let one on 2026-11-01 19:30-20:30 through. Adds utc_date, the UTC date
+start_time falls on, backfilled from each slot's zone and date. Slots are compared as UTC time on it, a
+slot crossing midnight running into the next date, and the unique constraint is keyed on it.
+
+"""
+from datetime import date, datetime, time, timedelta
+from typing import Sequence, Union
+
+from alembic import op
+import pytz
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = 'd5a2c7e9f013'
+down_revision: Union[str, None] = 'b8e3f5a1c904'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+TABLE = 'custom_availability'
+
+# A slot whose end is not after its start crosses midnight and covers both ends of the day
+SLOT_MULTIRANGE = (
+    "CASE WHEN end_time > start_time "
+    "THEN tsmultirange(tsrange(DATE '2000-01-01' + start_time, DATE '2000-01-01' + end_time)) "
+    "ELSE tsmultirange(tsrange(DATE '2000-01-01' + start_time, TIMESTAMP '2000-01-02 00:00'), "
+    "tsrange(TIMESTAMP '2000-01-01 00:00', DATE '2000-01-01' + end_time)) END"
+)
+
+# A slot whose end is not after its start runs into the next UTC date
+UTC_RANGE = (
+    "tsrange(utc_date + start_time, "
+    "CASE WHEN end_time > start_time THEN utc_date + end_time ELSE utc_date + 1 + end_time END)"
+)
+
+SQLITE_DATE_OVERLAP = (
+    "e.date = NEW.date AND ("
+    "(NEW.end_time <= NEW.start_time AND (e.end_time <= e.start_time OR e.end_time > NEW.start_time OR e.start_time < NEW.end_time)) OR "
+    "(NEW.end_time > NEW.start_time AND e.end_time <= e.start_time AND (e.end_time > NEW.start_time OR e.start_time < NEW.end_time)) OR "
+    "(NEW.end_time > NEW.start_time AND e.end_time > e.start_time AND e.start_time < NEW.end_time AND e.end_time > NEW.start_time))"
+)
+
+SQLITE_UTC_DATE_OVERLAP = (
+    "((e.utc_date = NEW.utc_date AND (e.end_time <= e.start_time OR NEW.start_time < e.end_time) "
+    "AND (NEW.end_time <= NEW.start_time OR e.start_time < NEW.end_time)) OR "
+    "(e.utc_date = date(NEW.utc_date, '-1 day') AND e.end_time <= e.start_time AND NEW.start_time < e.end_time) OR "
+    "(e.utc_date = date(NEW.utc_date, '+1 day') AND NEW.end_time <= NEW.start_time AND e.start_time < NEW.end_time))"
+)
+
+
+def utc_date(on_date: date, start_time: time, zone: str) -> date:
+    # start_time was converted to UTC with the offset of the slot's zone at noon of its date
+    try:
+        tz = pytz.timezone(zone)
+    except pytz.UnknownTimeZoneError:
+        return on_date
+    offset = int(tz.localize(datetime.combine(on_date, time(12))).utcoffset().total_seconds()) // 60
+    local_minutes = (start_time.hour * 60 + start_time.minute + offset) % 1440
+    return on_date + timedelta(days=(local_minutes - offset) // 1440)
+
+
+def drop_overlap_check(dialect: str) -> None:
+    if dialect == 'postgresql':
+        op.execute(f'ALTER TABLE {TABLE} DROP CONSTRAINT exclude_overlapping_{TABLE}')
+    elif dialect == 'sqlite':
+        for operation in ('insert', 'update'):
+            op.execute(f'DROP TRIGGER no_overlap_{TABLE}_{operation}')
+
+
+def create_overlap_check(dialect: str, on_utc_date: bool) -> None:
+    if dialect == 'postgresql':
+        exclusion = f'({UTC_RANGE}) WITH &&' if on_utc_date else f'date WITH =, ({SLOT_MULTIRANGE}) WITH &&'
+        op.execute(
+            f"ALTER TABLE {TABLE} ADD CONSTRAINT exclude_overlapping_{TABLE} "
+            f"EXCLUDE USING gist (user_id WITH =, {exclusion})"
+        )
+    elif dialect == 'sqlite':
+        condition = SQLITE_UTC_DATE_OVERLAP if on_utc_date else SQLITE_DATE_OVERLAP
+        for operation in ('INSERT', 'UPDATE'):
+            op.execute(
+                f"CREATE TRIGGER no_overlap_{TABLE}_{operation.lower()} BEFORE {operation} ON {TABLE} "
+                f"WHEN EXISTS (SELECT 1 FROM {TABLE} e WHERE e.user_id = NEW.user_id AND e.id IS NOT NEW.id AND {condition}) "
+                f"BEGIN SELECT RAISE(ABORT, 'overlapping {TABLE}'); END"
+            )
+
+
+def upgrade() -> None:
+    dialect = op.get_bind().dialect.name
+    drop_overlap_check(dialect)
+    op.add_column(TABLE, sa.Column('utc_date', sa.Date(), nullable=True))
+
+    slots = sa.table(
+        TABLE, sa.column('id', sa.Integer), sa.column('date', sa.Date), sa.column('start_time', sa.Time),
+        sa.column('time_zone', sa.String), sa.column('utc_date', sa.Date),
+    )
+    connection = op.get_bind()
+    rows = connection.execute(sa.select(slots.c.id, slots.c.date, slots.c.start_time, slots.c.time_zone)).all()
+    for slot_id, on_date, start_time, zone in rows:
+        connection.execute(slots.update().where(slots.c.id == slot_id).values(utc_date=utc_date(on_date, start_time, zone)))
+
+    # Batch mode: SQLite can only change constraints by copying the table
+    with op.batch_alter_table(TABLE) as batch_op:
+        batch_op.alter_column('utc_date', existing_type=sa.Date(), nullable=False)
+        batch_op.drop_constraint('unique_custom_availability', type_='unique')
+        batch_op.create_unique_constraint('unique_custom_availability', ['user_id', 'utc_date', 'start_time', 'end_time'])
+    create_overlap_check(dialect, on_utc_date=True)
+
+
+def downgrade() -> None:
+    dialect = op.get_bind().dialect.name
+    drop_overlap_check(dialect)
+    with op.batch_alter_table(TABLE) as batch_op:
+        batch_op.drop_constraint('unique_custom_availability', type_='unique')
+        batch_op.create_unique_constraint('unique_custom_availability', ['user_id', 'date', 'start_time', 'end_time'])
+        batch_op.drop_column('utc_date')
+    create_overlap_check(dialect, on_utc_date=False)
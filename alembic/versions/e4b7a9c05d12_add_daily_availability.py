@@ -0,0 +1,33 @@
+"""add the materialized daily_availability table
+
+Revision ID: e4b7a9c05d12
+Revises: c3d8e6f21b90
+Create Date: 2026-10-18 15:02:47.519304
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = 'e4b7a9c05d12'
+down_revision: Union[str, None] = 'c3d8e6f21b90'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    # Starts empty: reads fall back to the rules until extend_materialized_horizon fills it
+    op.create_table('daily_availability',
+    sa.Column('user_id', sa.Integer(), nullable=False),
+    sa.Column('date', sa.Date(), nullable=False),
+    sa.Column('slots', sa.String(), nullable=False),
+    sa.ForeignKeyConstraint(['user_id'], ['users.id'], ),
+    sa.PrimaryKeyConstraint('user_id', 'date')
+    )
+
+
+def downgrade() -> None:
+    op.drop_table('daily_availability')
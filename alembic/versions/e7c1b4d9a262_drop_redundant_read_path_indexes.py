@@ -0,0 +1,35 @@
+"""drop the read path indexes the unique constraints already provide
+
+Revision ID: e7c1b4d9a262
+Revises: d5a2c7e9f013
+Create Date: 2026-10-18 21:14:52.630817
+
+The unique constraints of general_availability (user_id, day, time_zone, utc_offset, start_time,
+end_time) and schedules (user_id, date, start_time, end_time) come with indexes that start like
+ix_general_availability_user_id_day and ix_schedules_user_id_date and hold every column the read path
+selects. The planner serves the reads from those (SQLite picks them over the ix_ indexes), so the ix_
+indexes only cost writes. ix_custom_availability_user_id_date stays: that unique key is on utc_date.
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+
+
+# revision identifiers, used by Alembic.
+revision: str = 'e7c1b4d9a262'
+down_revision: Union[str, None] = 'd5a2c7e9f013'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    op.drop_index('ix_schedules_user_id_date', table_name='schedules')
+    op.drop_index('ix_general_availability_user_id_day', table_name='general_availability')
+
+
+def downgrade() -> None:
+    op.create_index('ix_general_availability_user_id_day', 'general_availability', ['user_id', 'day'], unique=False,
+                    postgresql_include=['start_time', 'end_time', 'time_zone', 'utc_offset'])
+    op.create_index('ix_schedules_user_id_date', 'schedules', ['user_id', 'date'], unique=False,
+                    postgresql_include=['start_time', 'end_time'])
@@ -0,0 +1,109 @@
+"""compare weekly availability rules for overlaps in wall-clock time
+
+Revision ID: f2c6d1a8b347
+Revises: e4b7a9c05d12
+Create Date: 2026-10-18 16:42:09.513204
+
+general_availability stores UTC times converted with the offset on the day each rule was saved, so two
+rules of the same zone saved on either side of a DST change don't line up in UTC. The exclusion
+constraint (Postgres) and triggers (SQLite) now compare rules in wall-clock time (stored time +
+utc_offset) among the rules of the same zone, as crud does, and the unique constraint on the UTC times
+includes the zone and offset. Custom slots are unchanged.
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+
+
+# revision identifiers, used by Alembic.
+revision: str = 'f2c6d1a8b347'
+down_revision: Union[str, None] = 'e4b7a9c05d12'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+TABLE = 'general_availability'
+
+
+def slot_multirange(start: str, end: str) -> str:
+    # A slot whose end is not after its start crosses midnight and covers both ends of the day
+    return (
+        f"CASE WHEN {end} > {start} "
+        f"THEN tsmultirange(tsrange(DATE '2000-01-01' + {start}, DATE '2000-01-01' + {end})) "
+        f"ELSE tsmultirange(tsrange(DATE '2000-01-01' + {start}, TIMESTAMP '2000-01-02 00:00'), "
+        f"tsrange(TIMESTAMP '2000-01-01 00:00', DATE '2000-01-01' + {end})) END"
+    )
+
+
+def sqlite_overlap_condition(keys: str, new_start: str, new_end: str, start: str, end: str) -> str:
+    return (
+        f"EXISTS (SELECT 1 FROM {TABLE} e WHERE e.user_id = NEW.user_id AND {keys} AND e.id IS NOT NEW.id AND ("
+        f"({new_end} <= {new_start} AND ({end} <= {start} OR {end} > {new_start} OR {start} < {new_end})) OR "
+        f"({new_end} > {new_start} AND {end} <= {start} AND ({end} > {new_start} OR {start} < {new_end})) OR "
+        f"({new_end} > {new_start} AND {end} > {start} AND {start} < {new_end} AND {end} > {new_start})))"
+    )
+
+
+def postgres_wall_clock(column: str) -> str:
+    return f"({column} + COALESCE(utc_offset, 0) * INTERVAL '1 minute')"
+
+
+def sqlite_wall_clock(alias: str, column: str) -> str:
+    return f"time({alias}.{column}, COALESCE({alias}.utc_offset, 0) || ' minutes')"
+
+
+def drop_overlap_check(dialect: str) -> None:
+    if dialect == 'postgresql':
+        op.execute(f'ALTER TABLE {TABLE} DROP CONSTRAINT exclude_overlapping_{TABLE}')
+    elif dialect == 'sqlite':
+        for operation in ('insert', 'update'):
+            op.execute(f'DROP TRIGGER no_overlap_{TABLE}_{operation}')
+
+
+def create_overlap_check(dialect: str, wall_clock: bool) -> None:
+    if dialect == 'postgresql':
+        if wall_clock:
+            keys, multirange = 'day WITH =, time_zone WITH =', slot_multirange(postgres_wall_clock('start_time'), postgres_wall_clock('end_time'))
+        else:
+            keys, multirange = 'day WITH =', slot_multirange('start_time', 'end_time')
+        op.execute(
+            f"ALTER TABLE {TABLE} ADD CONSTRAINT exclude_overlapping_{TABLE} "
+            f"EXCLUDE USING gist (user_id WITH =, {keys}, ({multirange}) WITH &&)"
+        )
+    elif dialect == 'sqlite':
+        if wall_clock:
+            condition = sqlite_overlap_condition(
+                'e.day = NEW.day AND e.time_zone = NEW.time_zone',
+                sqlite_wall_clock('NEW', 'start_time'), sqlite_wall_clock('NEW', 'end_time'),
+                sqlite_wall_clock('e', 'start_time'), sqlite_wall_clock('e', 'end_time'),
+            )
+        else:
+            condition = sqlite_overlap_condition('e.day = NEW.day', 'NEW.start_time', 'NEW.end_time', 'e.start_time', 'e.end_time')
+        for operation in ('INSERT', 'UPDATE'):
+            op.execute(
+                f"CREATE TRIGGER no_overlap_{TABLE}_{operation.lower()} BEFORE {operation} ON {TABLE} "
+                f"WHEN {condition} "
+                f"BEGIN SELECT RAISE(ABORT, 'overlapping {TABLE}'); END"
+            )
+
+
+def replace_unique_constraint(columns: list) -> None:
+    # Batch mode: SQLite can only change constraints by copying the table (the triggers are dropped first)
+    with op.batch_alter_table(TABLE) as batch_op:
+        batch_op.drop_constraint('unique_general_availability', type_='unique')
+        batch_op.create_unique_constraint('unique_general_availability', columns)
+
+
+def upgrade() -> None:
+    dialect = op.get_bind().dialect.name
+    drop_overlap_check(dialect)
+    replace_unique_constraint(['user_id', 'day', 'time_zone', 'utc_offset', 'start_time', 'end_time'])
+    create_overlap_check(dialect, wall_clock=True)
+
+
+def downgrade() -> None:
+    dialect = op.get_bind().dialect.name
+    drop_overlap_check(dialect)
+    replace_unique_constraint(['user_id', 'day', 'start_time', 'end_time'])
+    create_overlap_check(dialect, wall_clock=False)
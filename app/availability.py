@@ -0,0 +1,146 @@
+# app/availability.py
+from datetime import date, timedelta
+from typing import Dict, Iterable, List, Tuple
+
+from app import intervals, timezones
+from app.intervals import Interval
+
+
+# Weekday names as stored in GeneralAvailability.day, mapped to date.weekday()
+WEEKDAYS = {
+    "monday": 0,
+    "tuesday": 1,
+    "wednesday": 2,
+    "thursday": 3,
+    "friday": 4,
+    "saturday": 5,
+    "sunday": 6,
+}
+
+# A slot in wall-clock minutes of one of the user's time zones: (start, end, zone index).
+# The end may pass midnight (see intervals.unwrap).
+Piece = Tuple[int, int, int]
+
+
+class UserAvailability:
+    """ A user's availability compiled once for expansion over any date range.
+
+        Weekly rules are indexed by weekday (7 slots) and custom slots are keyed by date, so expanding a
+        range is a single walk over the days instead of a walk per rule with weekday string comparisons.
+        Slots are kept in the wall-clock time of the zone they were entered in and only moved into the
+        requested zone while expanding: into UTC with their own date's offset, then into the requested
+        zone with the offset of the UTC date they land on, so DST is applied per date on both sides.
+    """
+    __slots__ = ("zones", "weekly", "custom")
+
+    def __init__(self):
+        self.zones: List[str] = []
+        self.weekly: List[List[Piece]] = [[] for _ in range(7)]
+        self.custom: Dict[date, List[Piece]] = {}
+
+    def _zone_index(self, tz_name: str) -> int:
+        if tz_name not in self.zones:
+            self.zones.append(tz_name)
+        return self.zones.index(tz_name)
+
+    def add_weekly(self, day: str, start_minute: int, end_minute: int, tz_name: str = "UTC") -> None:
+        weekday = WEEKDAYS.get(day.strip().lower())
+        if weekday is None:
+            return  # Not a weekday name, it can never match a date
+        self.weekly[weekday].append(intervals.unwrap(start_minute, end_minute) + (self._zone_index(tz_name),))
+
+    def add_custom(self, on_date: date, start_minute: int, end_minute: int, tz_name: str = "UTC") -> None:
+        self.custom.setdefault(on_date, []).append(intervals.unwrap(start_minute, end_minute) + (self._zone_index(tz_name),))
+
+    def is_empty(self) -> bool:
+        return not self.custom and not any(self.weekly)
+
+    def expand(self, start_date: date, end_date: date, tz: str = "UTC") -> Dict[date, List[Interval]]:
+        """ Slots per date of time zone tz for start_date..end_date. Custom slots replace the weekly
+            rules on their date. The day on each side of the range is expanded too, since converting to
+            tz can move its slots into the range.
+        """
+        slots: Dict[date, List[Interval]] = {}
+        current_date = start_date - timedelta(days=1)
+        last_date = end_date + timedelta(days=1)
+        weekday = current_date.weekday()
+        while current_date <= last_date:
+            pieces = self.custom.get(current_date)
+            if pieces is None:
+                pieces = self.weekly[weekday]
+            if pieces:
+                source_offsets = [timezones.utc_offset(zone, current_date) for zone in self.zones]
+                for start, end, zone in pieces:
+                    # Into UTC with the offset of the slot's own date, then into tz with the offset of the
+                    # UTC date each part lands on, the same steps as materialized days (crud._use_materialized)
+                    source_offset = source_offsets[zone]
+                    for utc_day, (utc_start, utc_end) in intervals.split_days(start - source_offset, end - source_offset):
+                        utc_date = current_date + timedelta(days=utc_day)
+                        shift = timezones.utc_offset(tz, utc_date)
+                        for offset, interval in intervals.split_days(utc_start + shift, utc_end + shift):
+                            slot_date = utc_date + timedelta(days=offset)
+                            if start_date <= slot_date <= end_date:
+                                slots.setdefault(slot_date, []).append(interval)
+
+            current_date += timedelta(days=1)
+            weekday = (weekday + 1) % 7
+        return slots
+
+
+def compile_availability(general_availability: list, custom_availability: list) -> UserAvailability:
+    """ Rows are stored in UTC; they are turned back into wall-clock time of their own time zone here.
+        Weekly rules use the offset recorded when they were saved (utc_offset), custom slots the offset
+        on their date. Rows are the minute tuples built by crud._group_availability_rows.
+    """
+    compiled = UserAvailability()
+    for day, start_minute, end_minute, tz_name, offset in general_availability:
+        if offset is None:
+            offset = timezones.utc_offset(tz_name, date.today())
+        compiled.add_weekly(day, start_minute + offset, end_minute + offset, tz_name)
+    for on_date, start_minute, end_minute, tz_name in custom_availability:
+        offset = timezones.utc_offset(tz_name, on_date)
+        compiled.add_custom(on_date, start_minute + offset, end_minute + offset, tz_name)
+    return compiled
+
+
+def busy_by_date(scheduled_events: Iterable[Tuple[date, int, int]], tz: str = "UTC") -> Dict[date, List[Interval]]:
+    """ Scheduled events, as (date, start minute, end minute) in UTC, per date of time zone tz. """
+    busy: Dict[date, List[Interval]] = {}
+    for event_date, start_minute, end_minute in scheduled_events:
+        start, end = intervals.unwrap(start_minute, end_minute)
+        shift = timezones.utc_offset(tz, event_date)
+        for offset, interval in intervals.split_days(start + shift, end + shift):
+            busy.setdefault(event_date + timedelta(days=offset), []).append(interval)
+    return busy
+
+
+def subtract_busy(slots: Dict[date, List[Interval]], busy: Dict[date, List[Interval]]) -> Dict[date, List[Interval]]:
+    """ Remove scheduled events from the slots, date by date. Dates left without free time are dropped. """
+    if not busy:
+        return slots
+    free: Dict[date, List[Interval]] = {}
+    for slot_date, day_slots in slots.items():
+        day_busy = busy.get(slot_date)
+        remaining = intervals.subtract(day_slots, day_busy) if day_busy else day_slots
+        if remaining:
+            free[slot_date] = remaining
+    return free
+
+
+def intersect_by_date(user_availability: List[Dict[date, List[Interval]]], start_date: date, end_date: date) -> Dict[date, List[Interval]]:
+    common_availability = {}
+
+    # Iterate over the date range
+    current_date = start_date
+    while current_date <= end_date:
+        # Collect slots from all users for this date, skipping the date if anyone has none
+        daily_slots = [user_slots.get(current_date) for user_slots in user_availability]
+        if all(daily_slots):
+            # Sweep all users' intervals together to find the windows everyone shares
+            common_slots = intervals.intersect_all(daily_slots)
+            if common_slots:
+                common_availability[current_date] = common_slots
+
+        current_date += timedelta(days=1)
+
+    return common_availability
@@ -0,0 +1,83 @@
+# app/bitmap.py
+import os
+from datetime import date, timedelta
+from typing import Dict, List
+
+from app.intervals import Interval, MINUTES_PER_DAY, normalize
+
+
+# Cells of the (users x days x buckets) arrays built at once. A request over more is computed in runs
+# of days, so memory stays bounded whatever the group size, date range and resolution.
+MAX_CELLS = int(os.getenv("BITMAP_MAX_CELLS", str(1 << 22)))
+
+
+def common_availability_bitmap(user_availability: List[Dict[date, List[Interval]]], start_date: date, end_date: date, resolution: int = 15, max_cells: int = None) -> Dict[date, List[Interval]]:
+    """ Common availability computed on a (users x days x buckets) boolean array.
+
+        Each day is cut into buckets of `resolution` minutes and a user is free in a bucket only if one of
+        their slots covers it entirely, so results are the exact interval answer rounded inwards to the
+        bucket grid. Meant for very large groups, where one vectorized AND over the users axis replaces
+        the per-date sweep. The days are taken in chunks of at most max_cells cells (MAX_CELLS by default),
+        at least one day each.
+    """
+    import numpy as np  # Optional dependency, only needed by this backend
+
+    days = (end_date - start_date).days + 1
+    buckets = MINUTES_PER_DAY // resolution
+    if days <= 0 or not user_availability:
+        return {}
+
+    # Slot boundaries as flat arrays of (user, day, first bucket, bucket after the last)
+    users_idx, days_idx, first_bucket, end_bucket = [], [], [], []
+    for user_index, user_slots in enumerate(user_availability):
+        for slot_date, slots in user_slots.items():
+            day_index = (slot_date - start_date).days
+            if not 0 <= day_index < days:
+                continue
+            # Merged first: slots that only touch (09:00-10:10, 10:10-11:00) cover the bucket between them
+            for start, end in normalize(slots):
+                users_idx.append(user_index)
+                days_idx.append(day_index)
+                first_bucket.append(-(-start // resolution))  # ceil: partially covered buckets don't count
+                end_bucket.append(end // resolution)
+
+    users_idx = np.asarray(users_idx, dtype=np.intp)
+    days_idx = np.asarray(days_idx, dtype=np.intp)
+    first_bucket = np.asarray(first_bucket, dtype=np.intp)
+    end_bucket = np.asarray(end_bucket, dtype=np.intp)
+    keep = end_bucket > first_bucket
+    users_idx, days_idx, first_bucket, end_bucket = users_idx[keep], days_idx[keep], first_bucket[keep], end_bucket[keep]
+
+    common_availability: Dict[date, List[Interval]] = {}
+    chunk_days = max(1, (max_cells or MAX_CELLS) // (len(user_availability) * (buckets + 1)))
+    for chunk_start in range(0, days, chunk_days):
+        chunk = (days_idx >= chunk_start) & (days_idx < chunk_start + chunk_days)
+        common = _common_buckets(
+            np, len(user_availability), min(chunk_days, days - chunk_start), buckets,
+            users_idx[chunk], days_idx[chunk] - chunk_start, first_bucket[chunk], end_bucket[chunk],
+        )
+
+        # Turn runs of free buckets back into intervals
+        padded = np.zeros((common.shape[0], buckets + 2), dtype=np.int8)
+        padded[:, 1:-1] = common
+        edges = np.diff(padded, axis=1)
+        run_days, run_starts = np.nonzero(edges == 1)
+        _, run_ends = np.nonzero(edges == -1)
+        for day_index, start, end in zip(run_days.tolist(), run_starts.tolist(), run_ends.tolist()):
+            slot_date = start_date + timedelta(days=chunk_start + day_index)
+            common_availability.setdefault(slot_date, []).append((start * resolution, end * resolution))
+    return common_availability
+
+
+def _common_buckets(np, users: int, days: int, buckets: int, users_idx, days_idx, first_bucket, end_bucket):
+    # (days x buckets) booleans, True where every user is free for the whole bucket
+
+    # Mark slot starts with +1 and ends with -1 and take a running sum, so a bucket is covered when
+    # the sum is positive. This fills every slot at once instead of slicing per slot.
+    marks = np.zeros((users, days, buckets + 1), dtype=np.int32)
+    np.add.at(marks, (users_idx, days_idx, first_bucket), 1)
+    np.add.at(marks, (users_idx, days_idx, end_bucket), -1)
+    covered = np.cumsum(marks[:, :, :buckets], axis=2, dtype=np.int32) > 0
+
+    # Free for everyone: AND across the users axis
+    return covered.all(axis=0)
@@ -0,0 +1,108 @@
+# app/cache.py
+import os
+import threading
+import time
+from collections import OrderedDict
+from typing import Any, Dict, Hashable, Iterable, Tuple
+
+from app import metrics
+
+
+class LRUCache:
+    """ Bounded in-process LRU cache with a time-to-live per entry and hit/miss counters.
+
+        The cache lives in one worker process: writes handled by other workers are only picked up once
+        the entry expires, so the TTL bounds how stale a cached value can get.
+    """
+
+    def __init__(self, maxsize: int = 1024, ttl: float = 300.0):
+        self.maxsize = maxsize
+        self.ttl = ttl
+        self.hits = 0
+        self.misses = 0
+        self._entries: "OrderedDict[Hashable, tuple]" = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, key: Hashable, default: Any = None) -> Any:
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                self.misses += 1
+                return default
+            expires_at, value = entry
+            if expires_at < time.monotonic():
+                del self._entries[key]
+                self.misses += 1
+                return default
+            self._entries.move_to_end(key)
+            self.hits += 1
+            return value
+
+    def set(self, key: Hashable, value: Any) -> None:
+        if self.maxsize <= 0:
+            return
+        with self._lock:
+            self._entries[key] = (time.monotonic() + self.ttl, value)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.maxsize:
+                self._entries.popitem(last=False)
+
+    def invalidate(self, key: Hashable) -> None:
+        with self._lock:
+            self._entries.pop(key, None)
+
+    def clear(self) -> None:
+        with self._lock:
+            self._entries.clear()
+
+    def stats(self) -> Dict[str, int]:
+        with self._lock:
+            return {"size": len(self._entries), "hits": self.hits, "misses": self.misses}
+
+
+class DataVersions:
+    """ A counter per user, bumped whenever data that feeds their availability changes. Cached results
+        remember the versions of their users and are only served while those are unchanged, so a write
+        never has to find every cached result it affects. Per process, like LRUCache.
+    """
+
+    def __init__(self):
+        self._versions: Dict[Hashable, int] = {}
+        self._lock = threading.Lock()
+
+    def bump(self, key: Hashable) -> None:
+        with self._lock:
+            self._versions[key] = self._versions.get(key, 0) + 1
+
+    def get(self, keys: Iterable[Hashable]) -> Tuple[int, ...]:
+        with self._lock:
+            return tuple(self._versions.get(key, 0) for key in keys)
+
+
+# Compiled availability per user id, with the data version it was loaded at, see crud.get_compiled_availability
+availability_cache = LRUCache(
+    maxsize=int(os.getenv("AVAILABILITY_CACHE_SIZE", "10000")),
+    ttl=float(os.getenv("AVAILABILITY_CACHE_TTL", "300")),
+)
+
+# /common-availability/ responses per normalized request, see crud.get_common_availability_cached
+response_cache = LRUCache(
+    maxsize=int(os.getenv("RESPONSE_CACHE_SIZE", "1000")),
+    ttl=float(os.getenv("RESPONSE_CACHE_TTL", "60")),
+)
+
+user_data_versions = DataVersions()
+
+
+def user_data_changed(user_id: int) -> None:
+    # Call after any write to a user's availability or schedules
+    availability_cache.invalidate(user_id)
+    user_data_versions.bump(user_id)
+
+
+def _cache_stats(cache: LRUCache):
+    return lambda: {(("stat", stat),): value for stat, value in cache.stats().items()}
+
+
+metrics.register(metrics.Gauge("availability_cache", "Compiled availability cache entries and lookups.", _cache_stats(availability_cache)))
+metrics.register(metrics.Gauge("response_cache", "Common availability response cache entries and lookups.", _cache_stats(response_cache)))
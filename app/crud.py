@@ -1,16 +1,123 @@
 # app/crud.py
+from sqlalchemy import and_, delete, func, insert, or_, select
+from sqlalchemy.ext.asyncio import async_sessionmaker
 from sqlalchemy.orm import Session
-from app.models import User, GeneralAvailability, CustomAvailability, Schedule
+from app.models import User, GeneralAvailability, CustomAvailability, DailyAvailability, Schedule, rule_local_time
 from app.schemas import UserCreate, GeneralAvailabilityCreate, CustomAvailabilityCreate
+from app import intervals, metrics, parallel, timezones
+from app.availability import UserAvailability, compile_availability, busy_by_date, intersect_by_date, subtract_busy
+from app.cache import availability_cache, response_cache, user_data_changed, user_data_versions
 from fastapi import HTTPException
+from starlette.concurrency import run_in_threadpool
+from contextlib import contextmanager
+import asyncio
+import hashlib
+import json
 import logging
+import os
 from sqlalchemy.exc import IntegrityError, SQLAlchemyError
-from pytz import timezone
 import pytz
-from datetime import datetime, date, timedelta
-from typing import List, Dict
+from datetime import datetime, date, time, timedelta
+from typing import FrozenSet, Iterator, List, Dict, Tuple
 
 
+# Ways of computing common availability, selectable per request
+COMMON_AVAILABILITY_BACKENDS = ("interval", "bitmap")
+# Smallest bucket of the bitmap backend, in minutes; finer ones cost memory and time for no real gain
+MIN_BITMAP_RESOLUTION = 5
+
+
+def slots_overlap(start_time, end_time, existing_start_time, existing_end_time) -> bool:
+    # A slot whose end is not after its start crosses midnight (see intervals.unwrap)
+    wraps = end_time <= start_time
+    existing_wraps = existing_end_time <= existing_start_time
+    if wraps and existing_wraps:
+        return True  # Both contain midnight
+    if wraps or existing_wraps:
+        return existing_end_time > start_time or existing_start_time < end_time
+    return start_time < existing_end_time and existing_start_time < end_time
+
+
+def wall_clock(value: time, utc_offset) -> time:
+    """ Local time of a weekly rule stored as value (UTC) with utc_offset; rows stored before utc_offset
+        existed count as UTC. Python side of models.rule_local_time.
+    """
+    return timezones.minutes_to_time(intervals.time_to_minutes(value) + (utc_offset or 0))
+
+
+def rules_overlap(rule, existing_rule) -> bool:
+    """ Whether two weekly rules of the same day, mappings of the table's columns, overlap: in wall-clock
+        time within a zone, on the stored UTC times across zones. The same test as rule_overlap_filter.
+    """
+    if rule["time_zone"] != existing_rule["time_zone"]:
+        return slots_overlap(rule["start_time"], rule["end_time"], existing_rule["start_time"], existing_rule["end_time"])
+    return slots_overlap(*(
+        wall_clock(slot[column], slot["utc_offset"]) for slot in (rule, existing_rule) for column in ("start_time", "end_time")
+    ))
+
+
+def overlap_filter(existing_start_time, existing_end_time, start_time, end_time, wraps: bool):
+    """ SQL condition matching the stored slots existing_start_time..existing_end_time that overlap
+        start_time..end_time, the same test as slots_overlap. Any of them may be SQL expressions, so
+        whether start_time..end_time crosses midnight is passed in as wraps. Combined with equality on
+        user_id and day it is a range probe on the (user_id, day) index of weekly rules.
+    """
+    existing_wraps = existing_end_time <= existing_start_time
+    if wraps:
+        return or_(existing_wraps, existing_end_time > start_time, existing_start_time < end_time)
+    return or_(
+        and_(~existing_wraps, existing_start_time < end_time, existing_end_time > start_time),
+        and_(existing_wraps, or_(existing_start_time < end_time, existing_end_time > start_time)),
+    )
+
+
+def rule_overlap_filter(time_zone: str, start_time_utc: time, end_time_utc: time, utc_offset: int):
+    """ SQL condition matching the stored weekly rules that overlap a rule of time_zone stored as
+        start_time_utc..end_time_utc with utc_offset, the same test as rules_overlap and the table's
+        constraint / trigger (see models.py).
+    """
+    rule = GeneralAvailability
+    same_zone = overlap_filter(
+        rule_local_time(rule.start_time, rule.utc_offset), rule_local_time(rule.end_time, rule.utc_offset),
+        rule_local_time(start_time_utc, utc_offset), rule_local_time(end_time_utc, utc_offset),
+        wall_clock(end_time_utc, utc_offset) <= wall_clock(start_time_utc, utc_offset),
+    )
+    other_zones = overlap_filter(rule.start_time, rule.end_time, start_time_utc, end_time_utc, end_time_utc <= start_time_utc)
+    return or_(and_(rule.time_zone == time_zone, same_zone), and_(rule.time_zone != time_zone, other_zones))
+
+
+def _utc_span(slot) -> Tuple[int, int]:
+    # Minutes since the epoch of a custom slot's UTC start and end; a slot crossing midnight ends the next day
+    start = (slot["utc_date"] - date(1970, 1, 1)).days * intervals.MINUTES_PER_DAY + intervals.time_to_minutes(slot["start_time"])
+    length = (intervals.time_to_minutes(slot["end_time"]) - intervals.time_to_minutes(slot["start_time"])) % intervals.MINUTES_PER_DAY
+    return start, start + (length or intervals.MINUTES_PER_DAY)
+
+
+def custom_slots_overlap(slot, existing_slot) -> bool:
+    """ Whether two custom slots, mappings of the table's columns, overlap in UTC. The same test as
+        custom_slot_overlap_filter.
+    """
+    start, end = _utc_span(slot)
+    existing_start, existing_end = _utc_span(existing_slot)
+    return start < existing_end and existing_start < end
+
+
+def custom_slot_overlap_filter(utc_date: date, start_time_utc: time, end_time_utc: time):
+    """ SQL condition matching the stored custom slots that overlap a slot from start_time_utc on utc_date
+        to end_time_utc, on the next UTC date if it crosses midnight. Slots are compared as UTC time on
+        the UTC date they start on, so slots of any zone line up; see models.py. Combined with equality on
+        user_id it is a range probe on the (user_id, utc_date, ...) unique index.
+    """
+    slot = CustomAvailability
+    existing_wraps = slot.end_time <= slot.start_time
+    same_day = and_(slot.utc_date == utc_date, or_(existing_wraps, slot.end_time > start_time_utc))
+    # Ending past midnight, a slot covers the evening of its day and the morning of the next one
+    day_before = and_(slot.utc_date == utc_date - timedelta(days=1), existing_wraps, slot.end_time > start_time_utc)
+    if end_time_utc <= start_time_utc:
+        day_after = and_(slot.utc_date == utc_date + timedelta(days=1), slot.start_time < end_time_utc)
+        return or_(same_day, day_before, day_after)
+    return or_(and_(same_day, slot.start_time < end_time_utc), day_before)
+
 
 def create_user(db: Session, user: UserCreate):
     db_user = User(name=user.name, email=user.email, time_zone=user.time_zone)
@@ -25,34 +132,31 @@ def create_general_availability(db: Session, availability: GeneralAvailabilityCr
         timezone field of the db , so eventhough the start time and end time is in UTC not in the timezone mentioned
         in the timezone field.
 
+        The UTC offset used for the conversion is stored in utc_offset, so reads can get back the wall-clock
+        time and apply the offset of each date the rule falls on (the rule keeps its local time across DST).
     """
+    phases = metrics.Phases("create_general_availability")
     try:
-        user_tz = timezone(availability.time_zone)
-        start_time_utc = user_tz.localize(
-            datetime.combine(datetime.today(), availability.start_time)
-        ).astimezone(timezone("UTC")).time()
-        end_time_utc = user_tz.localize(
-            datetime.combine(datetime.today(), availability.end_time)
-        ).astimezone(timezone("UTC")).time()
-
-        # Check if the availability already exists for the user on the given day and time
-        existing_availability = db.query(GeneralAvailability).filter(
-            GeneralAvailability.user_id == availability.user_id,
-            GeneralAvailability.day == availability.day,
-            GeneralAvailability.time_zone == availability.time_zone
-        ).all()
-
-        # Check for overlapping time slots
-        for existing in existing_availability:
-            if (
-                (start_time_utc >= existing.start_time and start_time_utc < existing.end_time) or
-                (end_time_utc > existing.start_time and end_time_utc <= existing.end_time) or
-                (start_time_utc <= existing.start_time and end_time_utc >= existing.end_time)
-            ):
-                raise HTTPException(
-                    status_code=400,
-                    detail=f"Time slot {availability.start_time} - {availability.end_time} overlaps with an existing availability for user {availability.user_id}."
-                )
+        today = date.today()
+        utc_offset = timezones.utc_offset(availability.time_zone, today)
+        start_time_utc = timezones.local_to_utc(availability.start_time, availability.time_zone, today)
+        end_time_utc = timezones.local_to_utc(availability.end_time, availability.time_zone, today)
+
+        # Check if an overlapping availability already exists for the user on the given day, in any
+        # timezone (see rules_overlap). A single index probe, however many rules the user has; the
+        # exclusion constraints / trigger on the table catch concurrent writers racing past it.
+        with phases("overlap_check"):
+            overlapping = db.query(GeneralAvailability.id).filter(
+                GeneralAvailability.user_id == availability.user_id,
+                GeneralAvailability.day == availability.day,
+                rule_overlap_filter(availability.time_zone, start_time_utc, end_time_utc, utc_offset)
+            ).first()
+
+        if overlapping is not None:
+            raise HTTPException(
+                status_code=400,
+                detail=f"Time slot {availability.start_time} - {availability.end_time} overlaps with an existing availability for user {availability.user_id}."
+            )
 
         # Create the general availability record if no overlap
         db_availability = GeneralAvailability(
@@ -61,10 +165,21 @@ def create_general_availability(db: Session, availability: GeneralAvailabilityCr
             start_time=start_time_utc,
             end_time=end_time_utc,
             time_zone=availability.time_zone,
+            utc_offset=utc_offset,
         )
-        db.add(db_availability)
+        with phases("insert"):
+            db.add(db_availability)
+            db.flush()
+        # A weekly rule changes every materialized day of the user
+        with phases("materialize"):
+            refresh_materialized_availability(db, [availability.user_id])
         db.commit()
         db.refresh(db_availability)
+
+        # The user's compiled availability and cached results are stale now
+        user_data_changed(availability.user_id)
+        metrics.ROWS_WRITTEN.inc(table="general_availability")
+        phases.record()
         return db_availability
 
     except IntegrityError as e: #if the new value break any constrain of db table 
@@ -81,34 +196,26 @@ def create_general_availability(db: Session, availability: GeneralAvailabilityCr
     
 
 def create_custom_availability(db: Session, availability: CustomAvailabilityCreate):
+    phases = metrics.Phases("create_custom_availability")
     try:
-        user_tz = timezone(availability.time_zone)
-       
-        start_time_utc = user_tz.localize(
-            datetime.combine(datetime.today(), availability.start_time)
-        ).astimezone(timezone("UTC")).time()
-        end_time_utc = user_tz.localize(
-            datetime.combine(datetime.today(), availability.end_time)
-        ).astimezone(timezone("UTC")).time()
-        
-        # Check if the custom availability already exists for the user on the given date and time
-        existing_availability = db.query(CustomAvailability).filter(
-            CustomAvailability.user_id == availability.user_id,
-            CustomAvailability.date == availability.date,
-            CustomAvailability.time_zone == availability.time_zone
-        ).all()
-
-        # Check for overlapping time slots
-        for existing in existing_availability:
-            if (
-                (start_time_utc >= existing.start_time and start_time_utc < existing.end_time) or
-                (end_time_utc > existing.start_time and end_time_utc <= existing.end_time) or
-                (start_time_utc <= existing.start_time and end_time_utc >= existing.end_time)
-            ):
-                raise HTTPException(
-                    status_code=400,
-                    detail=f"Time slot {availability.start_time} - {availability.end_time} on {availability.date} overlaps with an existing custom availability for user {availability.user_id}."
-                )
+        # Convert with the offset in effect on the slot's own date, not today's
+        utc_date, start_time_utc = timezones.local_to_utc_date(availability.start_time, availability.time_zone, availability.date)
+        end_time_utc = timezones.local_to_utc(availability.end_time, availability.time_zone, availability.date)
+
+        # Check if an overlapping custom availability already exists for the user, in any timezone: on
+        # the UTC date the slot starts on and the dates around it. A single index probe, backed by the
+        # table's exclusion constraint / trigger.
+        with phases("overlap_check"):
+            overlapping = db.query(CustomAvailability.id).filter(
+                CustomAvailability.user_id == availability.user_id,
+                custom_slot_overlap_filter(utc_date, start_time_utc, end_time_utc)
+            ).first()
+
+        if overlapping is not None:
+            raise HTTPException(
+                status_code=400,
+                detail=f"Time slot {availability.start_time} - {availability.end_time} on {availability.date} overlaps with an existing custom availability for user {availability.user_id}."
+            )
 
         # Create the custom availability record if no overlap
         db_availability = CustomAvailability(
@@ -117,151 +224,863 @@ def create_custom_availability(db: Session, availability: CustomAvailabilityCrea
             start_time=start_time_utc,
             end_time=end_time_utc,
             time_zone=availability.time_zone,
+            utc_date=utc_date,
         )
-        db.add(db_availability)
+        with phases("insert"):
+            db.add(db_availability)
+            db.flush()
+        # Converted to UTC, the slot can land on the UTC day before or after its date
+        with phases("materialize"):
+            refresh_materialized_availability(db, [availability.user_id], availability.date - timedelta(days=1), availability.date + timedelta(days=1))
         db.commit()
         db.refresh(db_availability)
+
+        # The user's compiled availability and cached results are stale now
+        user_data_changed(availability.user_id)
+        metrics.ROWS_WRITTEN.inc(table="custom_availability")
+        phases.record()
         return db_availability
 
-    except HTTPException as e :
+    except (HTTPException, IntegrityError) as e :
+        db.rollback()
         raise HTTPException(
                     status_code=400,
                     detail=f"Time slot {availability.start_time} - {availability.end_time} on {availability.date} overlaps with an existing custom availability for user {availability.user_id}."
                 )
 
     except Exception as e:
-        print(e)
         logging.error(f"{str(e)}")
         raise HTTPException(status_code=500, detail="An unexpected error occurred.")
     
 
 
 
-def get_common_availability(db: Session, user_ids: List[int], start_date: date, end_date: date, tz: str) -> Dict:
-  
-    # Convert timezone
-    user_timezone = timezone(tz)
+def bulk_create_general_availability(db: Session, availabilities: List[GeneralAvailabilityCreate]) -> Dict:
+    """ Insert many general availability rows in one transaction. Rows that can't be inserted (unknown
+        user or timezone, overlap with a stored row or an earlier row of the batch) are reported per row
+        by their index in the batch; the others are still inserted.
+    """
+    errors = []
+    today = date.today()
+    records = []
+    for index, availability in enumerate(availabilities):
+        try:
+            utc_offset = timezones.utc_offset(availability.time_zone, today)
+        except pytz.UnknownTimeZoneError:
+            errors.append({"index": index, "detail": f"Unknown timezone {availability.time_zone}."})
+            continue
+        records.append((index, {
+            "user_id": availability.user_id,
+            "day": availability.day,
+            "start_time": timezones.local_to_utc(availability.start_time, availability.time_zone, today),
+            "end_time": timezones.local_to_utc(availability.end_time, availability.time_zone, today),
+            "time_zone": availability.time_zone,
+            "utc_offset": utc_offset,
+        }))
+    return _bulk_insert_availability(db, GeneralAvailability, "day", records, errors)
+
+
+def bulk_create_custom_availability(db: Session, availabilities: List[CustomAvailabilityCreate]) -> Dict:
+    """ Same as bulk_create_general_availability, for custom availability. """
+    errors = []
+    records = []
+    for index, availability in enumerate(availabilities):
+        try:
+            utc_date, start_time_utc = timezones.local_to_utc_date(availability.start_time, availability.time_zone, availability.date)
+            end_time_utc = timezones.local_to_utc(availability.end_time, availability.time_zone, availability.date)
+        except pytz.UnknownTimeZoneError:
+            errors.append({"index": index, "detail": f"Unknown timezone {availability.time_zone}."})
+            continue
+        records.append((index, {
+            "user_id": availability.user_id,
+            "date": availability.date,
+            "start_time": start_time_utc,
+            "end_time": end_time_utc,
+            "time_zone": availability.time_zone,
+            "utc_date": utc_date,
+        }))
+    return _bulk_insert_availability(db, CustomAvailability, "utc_date", records, errors)
+
+
+def _period_around(value, step: int):
+    # A UTC date step days away; weekdays only ever compare with themselves (step 0)
+    return value + timedelta(days=step) if step else value
+
+
+def _bulk_insert_availability(db: Session, model, period: str, records: List[tuple], errors: List[Dict]) -> Dict:
+    # period is the column a slot is checked for overlaps on besides the user: "day" for general, "utc_date"
+    # for custom. Custom slots crossing midnight reach the next UTC date, so the dates around are checked too
+    if model is GeneralAvailability:
+        overlaps, reach = rules_overlap, (0,)
+    else:
+        overlaps, reach = custom_slots_overlap, (-1, 0, 1)
+    user_ids = {record["user_id"] for _, record in records}
+    periods = {_period_around(record[period], step) for _, record in records for step in reach}
+    accepted = []
+    phases = metrics.Phases(f"bulk_create_{model.__tablename__}")
+
+    if records:
+        with phases("load_existing"):
+            known_users = {user_id for user_id, in db.query(User.id).filter(User.id.in_(user_ids)).all()}
+
+            # Every stored slot the batch could collide with, in one query, grouped for in-memory checks
+            existing_availability = db.execute(select(*model.__table__.columns).filter(
+                model.user_id.in_(user_ids),
+                getattr(model, period).in_(periods)
+            )).mappings().all()
+
+        taken = {}
+        for existing in existing_availability:
+            taken.setdefault((existing["user_id"], existing[period]), []).append(existing)
+
+        # The same tests as the single-row creates and the table's constraint / trigger
+        for index, record in records:
+            if record["user_id"] not in known_users:
+                errors.append({"index": index, "detail": f"User {record['user_id']} does not exist."})
+                continue
+            key = (record["user_id"], record[period])
+            nearby = (existing for step in reach for existing in taken.get((record["user_id"], _period_around(record[period], step)), ()))
+            if any(overlaps(record, existing) for existing in nearby):
+                errors.append({"index": index, "detail": f"Time slot overlaps with an existing availability for user {record['user_id']}."})
+                continue
+            taken.setdefault(key, []).append(record)
+            accepted.append(record)
+
+    if accepted:
+        try:
+            # A single executemany INSERT and one commit for the whole batch
+            with phases("insert"):
+                db.execute(insert(model), accepted)
+            with phases("materialize"):
+                if model is CustomAvailability:
+                    dates = [record["date"] for record in accepted]
+                    refresh_materialized_availability(db, [record["user_id"] for record in accepted], min(dates) - timedelta(days=1), max(dates) + timedelta(days=1))
+                else:
+                    refresh_materialized_availability(db, [record["user_id"] for record in accepted])
+            db.commit()
+        except IntegrityError as e:
+            db.rollback()
+            logging.error(f"IntegrityError: {str(e)}")
+            raise HTTPException(status_code=400, detail="Database constraint violation error.")
+        except SQLAlchemyError as e:
+            db.rollback()
+            logging.error(f"SQLAlchemyError: {str(e)}")
+            raise HTTPException(status_code=500, detail="An unexpected database error occurred.")
+
+        for user_id in {record["user_id"] for record in accepted}:
+            user_data_changed(user_id)
+        metrics.ROWS_WRITTEN.inc(len(accepted), table=model.__tablename__)
+
+    phases.record()
+    errors.sort(key=lambda error: error["index"])
+    return {"inserted": len(accepted), "errors": errors}
 
-    # Store availability per user
-    user_availability = []
 
-    # Iterate over all user IDs and fatch custom and general availabity
+def _dialect_insert(db: Session):
+    # The dialect's insert(), which has ON CONFLICT clauses; None on databases without them
+    dialect = db.get_bind().dialect.name
+    if dialect == "postgresql":
+        from sqlalchemy.dialects.postgresql import insert as dialect_insert
+    elif dialect == "sqlite":
+        from sqlalchemy.dialects.sqlite import insert as dialect_insert
+    else:
+        dialect_insert = None
+    return dialect_insert
+
+
+def insert_schedules(db: Session, rows: List[Dict]) -> int:
+    """ Insert a batch of schedules rows and commit. Rows equal to a stored schedule (same user, date,
+        start and end) are skipped rather than failing the batch, so an import can be run again. Returns
+        the number of rows inserted. Callers invalidate the users' caches, see ical.import_calendar.
+    """
+    if not rows:
+        return 0
+    dialect_insert = _dialect_insert(db)
+    # On the table rather than the model: a Core executemany, whose rowcount counts the rows inserted
+    statement = dialect_insert(Schedule.__table__).on_conflict_do_nothing() if dialect_insert else insert(Schedule.__table__)
+    try:
+        inserted = db.execute(statement, rows).rowcount
+        db.commit()
+    except SQLAlchemyError as e:
+        db.rollback()
+        logging.error(f"SQLAlchemyError: {str(e)}")
+        raise HTTPException(status_code=500, detail="An unexpected database error occurred.")
+    metrics.ROWS_WRITTEN.inc(inserted, table="schedules")
+    return inserted
+
+
+# Read-path queries. They are built here so scripts/check_query_plans.py can EXPLAIN exactly what runs;
+# each one is served by a (user_id, day/date) index, see the models. Plain select() statements, so the
+# sync Session and the AsyncSession paths run the same SQL.
+def custom_availability_query(user_ids: List[int], start_date: date, end_date: date):
+    return select(
+        CustomAvailability.user_id, CustomAvailability.date, CustomAvailability.start_time,
+        CustomAvailability.end_time, CustomAvailability.time_zone
+    ).where(
+        CustomAvailability.user_id.in_(user_ids),
+        CustomAvailability.date.between(start_date, end_date)
+    )
+
+
+def general_availability_query(user_ids: List[int]):
+    # General availability is a weekly rule, so it can only be bounded by user
+    return select(
+        GeneralAvailability.user_id, GeneralAvailability.day, GeneralAvailability.start_time,
+        GeneralAvailability.end_time, GeneralAvailability.time_zone, GeneralAvailability.utc_offset
+    ).where(
+        GeneralAvailability.user_id.in_(user_ids)
+    )
+
+
+def scheduled_events_query(user_ids: List[int], start_date: date, end_date: date):
+    return select(Schedule.user_id, Schedule.date, Schedule.start_time, Schedule.end_time).where(
+        Schedule.user_id.in_(user_ids),
+        Schedule.date.between(start_date, end_date)
+    )
+
+
+def materialized_availability_query(user_ids: List[int], start_date: date, end_date: date):
+    return select(DailyAvailability.user_id, DailyAvailability.date, DailyAvailability.slots).where(
+        DailyAvailability.user_id.in_(user_ids), DailyAvailability.date.between(start_date, end_date)
+    )
+
+
+# The queries select columns, not entities, so rows come back as plain tuples without ORM objects or
+# identity map bookkeeping. Grouping turns them into tuples of minutes right away:
+#   general  (day, start minute, end minute, time zone, utc_offset)
+#   custom   (date, start minute, end minute, time zone)
+#   events   (date, start minute, end minute)
+# with the times in UTC, as stored.
+def _group_availability_rows(user_ids: List[int], custom_availability: list, general_availability: list) -> Dict[int, Dict[str, list]]:
+    metrics.ROWS_LOADED.inc(len(custom_availability), table="custom_availability")
+    metrics.ROWS_LOADED.inc(len(general_availability), table="general_availability")
+    to_minutes = intervals.time_to_minutes
+    rows = {user_id: {"custom": [], "general": []} for user_id in user_ids}
+    for user_id, on_date, start_time, end_time, tz_name in custom_availability:
+        rows[user_id]["custom"].append((on_date, to_minutes(start_time), to_minutes(end_time), tz_name))
+    for user_id, day, start_time, end_time, tz_name, utc_offset in general_availability:
+        rows[user_id]["general"].append((day, to_minutes(start_time), to_minutes(end_time), tz_name, utc_offset))
+    return rows
+
+
+def _group_scheduled_events(user_ids: List[int], scheduled_events: list) -> Dict[int, list]:
+    metrics.ROWS_LOADED.inc(len(scheduled_events), table="schedules")
+    to_minutes = intervals.time_to_minutes
+    events = {user_id: [] for user_id in user_ids}
+    for user_id, event_date, start_time, end_time in scheduled_events:
+        events[user_id].append((event_date, to_minutes(start_time), to_minutes(end_time)))
+    return events
+
+
+def load_availability_rows(db: Session, user_ids: List[int], start_date: date, end_date: date) -> Dict[int, Dict[str, list]]:
+    """ Fetch custom and general availability for all the users at once (one IN (...) query per table
+        instead of queries per user) and group the rows by user.
+    """
+    if not user_ids:
+        return {}
+    custom_availability = db.execute(custom_availability_query(user_ids, start_date, end_date)).all()
+    general_availability = db.execute(general_availability_query(user_ids)).all()
+    return _group_availability_rows(user_ids, custom_availability, general_availability)
+
+
+def load_scheduled_events(db: Session, user_ids: List[int], start_date: date, end_date: date) -> Dict[int, list]:
+    if not user_ids:
+        return {}
+    scheduled_events = db.execute(scheduled_events_query(user_ids, start_date, end_date)).all()
+    return _group_scheduled_events(user_ids, scheduled_events)
+
+
+def _cached_compiled_availability(user_ids: List[int], start_date: date, end_date: date):
+    """ Users whose cached entry was loaded for a window covering start_date..end_date, the others, and
+        the data versions of the others, read before they are loaded from the db.
+
+        Entries are stored with the version read before their load and only served while it is the
+        user's current one: a write committing while a load is in flight bumps the version after that
+        load may have read the old rows, and its invalidate may run before the load's set.
+    """
+    compiled = {}
+    missing = []
+    unique_user_ids = list(dict.fromkeys(user_ids))
+    versions = dict(zip(unique_user_ids, user_data_versions.get(unique_user_ids)))
+    for user_id in unique_user_ids:
+        entry = availability_cache.get(user_id)
+        if entry is not None and entry[0] == versions[user_id] and entry[1] <= start_date and end_date <= entry[2]:
+            compiled[user_id] = entry[3]
+        else:
+            missing.append(user_id)
+    return compiled, missing, versions
+
+
+def _compile_missing(compiled: Dict[int, UserAvailability], user_rows: Dict[int, Dict[str, list]], start_date: date, end_date: date, versions: Dict[int, int]) -> None:
+    for user_id, rows in user_rows.items():
+        # Compile the weekly rules into a weekday index with custom dates overriding them
+        compiled[user_id] = compile_availability(rows["general"], rows["custom"])
+        availability_cache.set(user_id, (versions[user_id], start_date, end_date, compiled[user_id]))
+
+
+def get_compiled_availability(db: Session, user_ids: List[int], start_date: date, end_date: date, phases: metrics.Phases = None) -> Dict[int, UserAvailability]:
+    """ Compiled availability per user, served from availability_cache when the cached entry was loaded
+        for a date window covering start_date..end_date. Only the users that miss are read from the db.
+    """
+    phases = phases or metrics.Phases("compiled_availability")
+    compiled, missing, versions = _cached_compiled_availability(user_ids, start_date, end_date)
+    if missing:
+        # Users whose days are all materialized are a range scan away; only the rest are compiled from rules
+        with phases("load_materialized"):
+            materialized_rows = db.execute(materialized_availability_query(missing, start_date, end_date)).all()
+        missing = _use_materialized(compiled, missing, materialized_rows, start_date, end_date, versions)
+    if missing:
+        with phases("load_availability"):
+            user_rows = load_availability_rows(db, missing, start_date, end_date)
+        with phases("compile"):
+            _compile_missing(compiled, user_rows, start_date, end_date, versions)
+    return compiled
+
+
+# Materialized availability, see models.DailyAvailability. Rows are kept for yesterday (UTC) up to
+# MATERIALIZED_HORIZON_DAYS ahead: written on every availability create, and extended day by day by
+# extend_materialized_horizon (a background task in the app, or scripts/materialize_availability.py).
+MATERIALIZED_HORIZON_DAYS = int(os.getenv("MATERIALIZED_HORIZON_DAYS", "90"))
+# Seconds between runs of the app's background extension; 0 turns it off (e.g. when a cron job runs the script)
+MATERIALIZE_INTERVAL = float(os.getenv("MATERIALIZE_INTERVAL", "3600"))
+MATERIALIZE_BATCH_SIZE = 500
+
+
+def materialized_horizon(today: date = None) -> Tuple[date, date]:
+    today = today or datetime.now(pytz.utc).date()
+    return today - timedelta(days=1), today + timedelta(days=MATERIALIZED_HORIZON_DAYS)
+
+
+def _use_materialized(compiled: Dict[int, UserAvailability], user_ids: List[int], materialized_rows: list, start_date: date, end_date: date, versions: Dict[int, int]) -> List[int]:
+    # Build availability for the users with a row for every date of the window; returns the others
+    days = (end_date - start_date).days + 1
+    by_user: Dict[int, list] = {}
+    for user_id, row_date, slots in materialized_rows:
+        by_user.setdefault(user_id, []).append((row_date, slots))
+    metrics.ROWS_LOADED.inc(len(materialized_rows), table="daily_availability")
+
+    missing = []
     for user_id in user_ids:
-        # Fetch custom  availability
-        custom_availability = db.query(CustomAvailability).filter(
-            CustomAvailability.user_id == user_id,
-            CustomAvailability.date.between(start_date, end_date)
-        ).all()
-
-        # fatch general availability 
-        general_availability = db.query(GeneralAvailability).filter(
-            GeneralAvailability.user_id == user_id
-        ).all()
-
-        # Fetch scheduled events
-        scheduled_events = db.query(Schedule).filter(
-            Schedule.user_id == user_id,
-            Schedule.date.between(start_date, end_date)
-        ).all()
+        rows = by_user.get(user_id, ())
+        if len(rows) != days:
+            missing.append(user_id)
+            continue
+        # The days are UTC dates, so they expand like custom slots entered in UTC
+        user_availability = UserAvailability()
+        for row_date, slots in rows:
+            for start, end in intervals.decode(slots):
+                user_availability.add_custom(row_date, start, end, "UTC")
+        compiled[user_id] = user_availability
+        availability_cache.set(user_id, (versions[user_id], start_date, end_date, user_availability))
+    return missing
 
-        # If no availability at all, this user cannot contribute to common availability
-        if not custom_availability and not general_availability:
-            return {}  # No common availability possible
-
-        # Track availability for this user
-        user_slots = {}
-        custom_dates = []
-        # Handle custom availability
-        for availability in custom_availability:
-            date_str = availability.date.strftime('%d-%m-%Y')
-            start_time = availability.start_time
-            end_time = availability.end_time
-            custom_dates.append(availability.date)
-
-            # Convert to localized time
-            start_time = user_timezone.localize(datetime.combine(availability.date, start_time))
-            end_time = user_timezone.localize(datetime.combine(availability.date, end_time))
-
-            # Check for conflicts with events
-            # conflicts = False
-            # for event in scheduled_events:
-            #     event_start = user_timezone.localize(datetime.combine(event.date, event.start_time))
-            #     event_end = user_timezone.localize(datetime.combine(event.date, event.end_time))
-
-            #     if start_time < event_end and end_time > event_start:  # Overlapping event
-            #         conflicts = True
-            #         break
-
-            # If no conflict, add to slots
-            
-            user_slots.setdefault(date_str, [])
-            user_slots[date_str].append(f"{start_time.strftime('%I:%M%p')}-{end_time.strftime('%I:%M%p')}")
-
-        
-        
-        # Handle general availability only for dates without custom slots
-        
-        for availability in general_availability:
-            current_date = start_date
-
-            print(type(current_date))
-            while current_date <= end_date:
-                
-                if availability.day.lower() == current_date.strftime('%A').lower() and current_date not in custom_dates:  # Match weekday
-                    
-                    date_str = current_date.strftime('%d-%m-%Y')
-                    start_time = availability.start_time
-                    end_time = availability.end_time
-
-                    # Convert to localized time
-                    start_time = user_timezone.localize(datetime.combine(current_date, start_time))
-                    end_time = user_timezone.localize(datetime.combine(current_date, end_time))
-
-                    # Check for conflicts
-                    # conflicts = False
-                    # for event in scheduled_events:
-                    #     event_start = user_timezone.localize(datetime.combine(event.date, event.start_time))
-                    #     event_end = user_timezone.localize(datetime.combine(event.date, event.end_time))
-
-                    #     if start_time < event_end and end_time > event_start:  # Overlapping event
-                    #         conflicts = True
-                    #         break
-
-                    # If no conflict, add to slots
-                    
-                    user_slots.setdefault(date_str, [])
-                    user_slots[date_str].append(f"{start_time.strftime('%I:%M%p')}-{end_time.strftime('%I:%M%p')}")
-
-                current_date += timedelta(days=1)
-
-        # Append this user's slots to the overall availability
-        user_availability.append(user_slots)
+
+def materialize_availability(db: Session, user_ids: List[int], start_date: date, end_date: date) -> int:
+    """ Recompute the users' daily_availability rows for the UTC dates start_date..end_date, replacing the
+        stored ones. Returns the number of rows written. Doesn't commit.
+    """
+    if not user_ids or start_date > end_date:
+        return 0
+    user_rows = load_availability_rows(db, user_ids, *load_window(start_date, end_date))
+    rows = []
+    for user_id in user_ids:
+        compiled = compile_availability(user_rows[user_id]["general"], user_rows[user_id]["custom"])
+        slots_by_date = compiled.expand(start_date, end_date, "UTC")
+        current_date = start_date
+        while current_date <= end_date:
+            slots = intervals.normalize(slots_by_date.get(current_date, ()))
+            rows.append({"user_id": user_id, "date": current_date, "slots": intervals.encode(slots)})
+            current_date += timedelta(days=1)
+
+    # An upsert rather than delete + insert: a create request's refresh and the horizon extension can
+    # write the same (user_id, date) rows at the same time, and neither should fail on the primary key
+    dialect_insert = _dialect_insert(db)
+    if dialect_insert is not None:
+        statement = dialect_insert(DailyAvailability.__table__)
+        db.execute(statement.on_conflict_do_update(index_elements=["user_id", "date"], set_={"slots": statement.excluded.slots}), rows)
+    else:
+        db.execute(delete(DailyAvailability).where(
+            DailyAvailability.user_id.in_(user_ids), DailyAvailability.date.between(start_date, end_date)
+        ))
+        db.execute(insert(DailyAvailability), rows)
+    metrics.ROWS_WRITTEN.inc(len(rows), table="daily_availability")
+    return len(rows)
+
+
+def refresh_materialized_availability(db: Session, user_ids: List[int], start_date: date = None, end_date: date = None) -> None:
+    """ Rewrite the users' materialized days after their availability changed, limited to start_date..
+        end_date (UTC dates, default: the whole horizon) within the horizon. Doesn't commit, so it runs
+        in the same transaction as the write that changed the availability.
+    """
+    first, last = materialized_horizon()
+    start_date = max(start_date, first) if start_date else first
+    end_date = min(end_date, last) if end_date else last
+    user_ids = list(dict.fromkeys(user_ids))
+    for offset in range(0, len(user_ids), MATERIALIZE_BATCH_SIZE):
+        materialize_availability(db, user_ids[offset:offset + MATERIALIZE_BATCH_SIZE], start_date, end_date)
+
+
+# Postgres advisory lock held while extending the materialized horizon
+MATERIALIZE_LOCK_KEY = 718_203_611
+
+
+@contextmanager
+def materialize_lock(db: Session) -> Iterator[bool]:
+    """ Whether this runner may extend the materialized horizon now. On Postgres a session advisory lock
+        on a connection of its own, so of the app workers and cron runs that get there at the same time
+        only one does the work and the others skip it. Other databases always get True: SQLite runs one
+        writer at a time anyway, and the rows are upserted.
+    """
+    engine = db.get_bind()
+    if engine.dialect.name != "postgresql":
+        yield True
+        return
+    with engine.connect() as connection:
+        acquired = connection.execute(select(func.pg_try_advisory_lock(MATERIALIZE_LOCK_KEY))).scalar()
+        try:
+            yield acquired
+        finally:
+            if acquired:
+                connection.execute(select(func.pg_advisory_unlock(MATERIALIZE_LOCK_KEY)))
+
+
+def extend_materialized_horizon(db: Session, today: date = None) -> int:
+    """ Roll the materialized horizon forward: drop the days before it and materialize each user's
+        missing days up to its end. Users whose rows don't form an unbroken run from the start of the
+        horizon are rebuilt entirely. Returns the number of rows written, 0 when another runner holds
+        materialize_lock.
+    """
+    with materialize_lock(db) as acquired:
+        if not acquired:
+            logging.info("Materialized availability is being extended by another runner")
+            return 0
+        return _extend_materialized_horizon(db, today)
+
+
+def _extend_materialized_horizon(db: Session, today: date = None) -> int:
+    first, last = materialized_horizon(today)
+    db.execute(delete(DailyAvailability).where(DailyAvailability.date < first))
+    db.commit()
+
+    stored = {
+        user_id: (min_date, max_date, count)
+        for user_id, min_date, max_date, count in db.execute(
+            select(DailyAvailability.user_id, func.min(DailyAvailability.date), func.max(DailyAvailability.date), func.count())
+            .group_by(DailyAvailability.user_id)
+        )
+    }
+    # Users grouped by the first date they are missing
+    pending: Dict[date, List[int]] = {}
+    for user_id in db.execute(select(User.id)).scalars():
+        min_date, max_date, count = stored.get(user_id, (None, None, 0))
+        contiguous = min_date == first and count == (max_date - min_date).days + 1
+        next_date = max_date + timedelta(days=1) if contiguous else first
+        if next_date <= last:
+            pending.setdefault(next_date, []).append(user_id)
+
+    written = 0
+    for next_date, user_ids in sorted(pending.items()):
+        for offset in range(0, len(user_ids), MATERIALIZE_BATCH_SIZE):
+            written += materialize_availability(db, user_ids[offset:offset + MATERIALIZE_BATCH_SIZE], next_date, last)
+            db.commit()
+    return written
+
+
+def check_common_availability_args(tz: str, backend: str = "interval", resolution: int = 15) -> None:
+    if backend not in COMMON_AVAILABILITY_BACKENDS:
+        raise HTTPException(status_code=400, detail=f"Unknown backend {backend}, expected one of {', '.join(COMMON_AVAILABILITY_BACKENDS)}.")
+    if backend == "bitmap" and (resolution < MIN_BITMAP_RESOLUTION or intervals.MINUTES_PER_DAY % resolution):
+        raise HTTPException(status_code=400, detail=f"Resolution must be a number of minutes of at least {MIN_BITMAP_RESOLUTION} that divides a day evenly.")
+
+    try:
+        timezones.get_timezone(tz)
+    except pytz.UnknownTimeZoneError:
+        raise HTTPException(status_code=400, detail=f"Unknown timezone {tz}.")
+
+
+def load_window(start_date: date, end_date: date):
+    # Converting between time zones can move slots across midnight, so rows are read for a day more on each side
+    return start_date - timedelta(days=1), end_date + timedelta(days=1)
+
+
+def get_common_availability(db: Session, user_ids: List[int], start_date: date, end_date: date, tz: str, backend: str = "interval", resolution: int = 15) -> Dict:
+
+    check_common_availability_args(tz, backend, resolution)
+    load_start, load_end = load_window(start_date, end_date)
+    phases = metrics.Phases("common_availability")
+
+    # Compiled availability of every user, from the cache or loaded in one go
+    compiled_availability = get_compiled_availability(db, user_ids, load_start, load_end, phases)
+
+    # If no availability at all, this user cannot contribute to common availability
+    if any(compiled_availability[user_id].is_empty() for user_id in user_ids):
+        phases.record()
+        return {}  # No common availability possible
+
+    with phases("load_schedules"):
+        user_events = load_scheduled_events(db, user_ids, load_start, load_end)
+
+    common_availability = compute_common_availability(compiled_availability, user_events, user_ids, start_date, end_date, tz, backend, resolution, phases)
+    phases.record()
+    return common_availability
+
+
+def iter_common_availability(db: Session, user_ids: List[int], start_date: date, end_date: date, tz: str, backend: str = "interval", resolution: int = 15, window_days: int = 7) -> Iterator[Tuple[str, List[str]]]:
+    """ get_common_availability as a generator of (date, slots) in date order. Rows are loaded and
+        intersected one window of window_days at a time, so memory stays flat however long the range
+        is and the first dates are available before the rest is computed.
+    """
+    check_common_availability_args(tz, backend, resolution)
+    window_start = start_date
+    while window_start <= end_date:
+        window_end = min(window_start + timedelta(days=window_days - 1), end_date)
+        yield from get_common_availability(db, user_ids, window_start, window_end, tz, backend, resolution).items()
+        window_start = window_end + timedelta(days=1)
+
+
+def compute_common_availability(compiled_availability: Dict[int, UserAvailability], user_events: Dict[int, list], user_ids: List[int], start_date: date, end_date: date, tz: str, backend: str = "interval", resolution: int = 15, phases: metrics.Phases = None) -> Dict:
+    """ The CPU side of get_common_availability, shared by the sync and async paths: expand each user's
+        compiled availability, remove their events, intersect and format the response.
+    """
+    phases = phases or metrics.Phases("common_availability")
+    common_slots_by_date = compute_common_slots(compiled_availability, user_events, user_ids, start_date, end_date, tz, backend, resolution, phases)
+
+    with phases("format"):
+        return format_common_slots(common_slots_by_date)
+
+
+def format_common_slots(common_slots_by_date: Dict[date, List[intervals.Interval]]) -> Dict:
+    # Strings are only built here, at the response boundary
+    return {
+        slot_date.strftime('%d-%m-%Y'): [intervals.format_interval(slot) for slot in common_slots]
+        for slot_date, common_slots in sorted(common_slots_by_date.items())
+    }
+
+
+def compute_common_slots(compiled_availability: Dict[int, UserAvailability], user_events: Dict[int, list], user_ids: List[int], start_date: date, end_date: date, tz: str, backend: str = "interval", resolution: int = 15, phases: metrics.Phases = None) -> Dict[date, List[intervals.Interval]]:
+    # Common free intervals per date in tz, as minutes; compute_common_availability without the formatting
+    phases = phases or metrics.Phases("common_availability")
+
+    # Large requests are split by date range across the process pool, see app/parallel.py
+    if parallel.should_shard(len(user_ids), start_date, end_date):
+        with phases("parallel"):
+            try:
+                slots_processed, common_slots_by_date = parallel.compute_common_slots_sharded(
+                    compiled_availability, user_events, user_ids, start_date, end_date, tz, backend, resolution
+                )
+            except ImportError:
+                raise HTTPException(status_code=400, detail="The bitmap backend requires numpy to be installed.")
+        metrics.SLOTS_PROCESSED.inc(slots_processed)
+        return common_slots_by_date
+
+    user_availability = expand_free_slots(compiled_availability, user_events, user_ids, start_date, end_date, tz, phases)
 
     # Calculate common availability
-    common_availability = {}
+    with phases("intersect"):
+        return intersect_free_slots(user_availability, start_date, end_date, backend, resolution)
 
-    # Iterate over the date range
-    current_date = start_date
-    while current_date <= end_date:
-        date_str = current_date.strftime('%d-%m-%Y')
 
-        # Collect slots from all users for this date
-        daily_slots = [] # daily_slots = [set1, set2, {time_slot of user}] ie. daily_slots = list of sets
-        for user_slots in user_availability:
-            if date_str in user_slots:
-                daily_slots.append(set(user_slots[date_str]))
+def intersect_free_slots(user_availability: List[Dict[date, List[intervals.Interval]]], start_date: date, end_date: date, backend: str = "interval", resolution: int = 15) -> Dict[date, List[intervals.Interval]]:
+    if backend == "bitmap":
+        try:
+            from app.bitmap import common_availability_bitmap
+            return common_availability_bitmap(user_availability, start_date, end_date, resolution)
+        except ImportError:
+            raise HTTPException(status_code=400, detail="The bitmap backend requires numpy to be installed.")
+    return intersect_by_date(user_availability, start_date, end_date)
 
-        # If no slots for all users, skip this date
-        if len(daily_slots) < len(user_ids):
-            current_date += timedelta(days=1)
+
+def expand_free_slots(compiled_availability: Dict[int, UserAvailability], user_events: Dict[int, list], user_ids: List[int], start_date: date, end_date: date, tz: str, phases: metrics.Phases) -> List[Dict[date, List[intervals.Interval]]]:
+    # Free time of each user, in user_ids order, as {date in tz: [(start_minute, end_minute)]}
+    user_availability = []
+    slots_processed = 0
+
+    for user_id in user_ids:
+        # Expand over the requested range in a single pass, converted to the requested timezone
+        # (timezone conversion happens per date inside the expansion, so it is timed with it)
+        with phases("expand"):
+            user_slots = compiled_availability[user_id].expand(start_date, end_date, tz)
+
+        # Take the user's scheduled events out of their free time
+        with phases("subtract_busy"):
+            user_availability.append(subtract_busy(user_slots, busy_by_date(user_events[user_id], tz)))
+        slots_processed += sum(len(slots) for slots in user_slots.values())
+
+    metrics.SLOTS_PROCESSED.inc(slots_processed)
+    return user_availability
+
+
+def quorum_runs(windows: List[Tuple[int, int, FrozenSet[int]]], required: FrozenSet[int]) -> Iterator[Tuple[int, int, FrozenSet[int]]]:
+    """ The windows of intervals.coverage that include every required index, with touching ones merged
+        into a single run and the indices free for the whole of it. coverage cuts a window wherever the
+        set of free users changes, so one stretch that keeps the quorum throughout can come back as
+        several windows, each shorter than the stretch.
+    """
+    run = None
+    for start, end, members in windows:
+        if not required <= members:
+            continue
+        if run is not None and run[1] == start:
+            run = (run[0], end, run[2] & members)
             continue
+        if run is not None:
+            yield run
+        run = (start, end, members)
+    if run is not None:
+        yield run
+
+
+def get_quorum_availability(db: Session, required_user_ids: List[int], optional_user_ids: List[int], start_date: date, end_date: date, tz: str, min_attendees: int, min_duration: int = 0) -> List[Dict]:
+    """ Windows when every required user and at least min_attendees users in total are free, ranked by
+        attendance (most attendees first, then earliest). A window lasts as long as the quorum holds, even
+        if who makes it up changes; its attendees are the users free for the whole of it.
+
+        Rather than intersecting subsets of users, all users' free intervals for a date are swept
+        together once (intervals.coverage), keeping the set of users free at each point.
+    """
+    check_common_availability_args(tz)
+    required = list(dict.fromkeys(required_user_ids))
+    optional = [user_id for user_id in dict.fromkeys(optional_user_ids) if user_id not in required]
+    user_ids = required + optional
+    if not 1 <= min_attendees <= len(user_ids):
+        raise HTTPException(status_code=400, detail=f"min_attendees must be between 1 and the number of users ({len(user_ids)}).")
+    min_attendees = max(min_attendees, len(required))
+
+    load_start, load_end = load_window(start_date, end_date)
+    phases = metrics.Phases("quorum_availability")
+    compiled_availability = get_compiled_availability(db, user_ids, load_start, load_end, phases)
+
+    # A required user with no availability at all rules out every window
+    if any(compiled_availability[user_id].is_empty() for user_id in required):
+        phases.record()
+        return []
+
+    with phases("load_schedules"):
+        user_events = load_scheduled_events(db, user_ids, load_start, load_end)
+    user_availability = expand_free_slots(compiled_availability, user_events, user_ids, start_date, end_date, tz, phases)
+
+    # Users are indexed by position in user_ids, so the required ones are the indices below len(required)
+    required_indices = frozenset(range(len(required)))
+    windows = []
+    with phases("sweep"):
+        current_date = start_date
+        while current_date <= end_date:
+            daily_slots = [user_slots.get(current_date, []) for user_slots in user_availability]
+            for start, end, members in quorum_runs(intervals.coverage(daily_slots, min_attendees), required_indices):
+                if end - start >= min_duration:
+                    windows.append((current_date, start, end, members))
+            current_date += timedelta(days=1)
+
+    with phases("format"):
+        windows.sort(key=lambda window: (-len(window[3]), window[0], window[1]))
+        result = [
+            {
+                "date": window_date.strftime('%d-%m-%Y'),
+                "slot": intervals.format_interval((start, end)),
+                "attendees": [user_ids[index] for index in sorted(members)],
+                "missing": [user_ids[index] for index in range(len(user_ids)) if index not in members],
+            }
+            for window_date, start, end, members in windows
+        ]
+    phases.record()
+    return result
+
+
+def split_into_meetings(free: List[intervals.Interval], duration: int, day_start: int = 0, day_end: int = intervals.MINUTES_PER_DAY) -> Iterator[intervals.Interval]:
+    # Back-to-back meetings of duration minutes inside each free interval, clipped to [day_start, day_end)
+    for start, end in free:
+        start, end = max(start, day_start), min(end, day_end)
+        while start + duration <= end:
+            yield start, start + duration
+            start += duration
+
+
+def find_meeting_slots(db: Session, user_ids: List[int], start_date: date, end_date: date, tz: str, duration: int, count: int, day_start: time = None, day_end: time = None, window_days: int = 7) -> List[Tuple[date, intervals.Interval]]:
+    """ The first count meetings of duration minutes that every user can attend, earliest first, between
+        day_start and day_end each day when given.
+
+        The range is walked a window at a time, starting with a single day and doubling up to window_days,
+        and the walk stops as soon as count meetings are found: "the next three slots" usually costs a
+        day or two of loading and intersecting, not the whole range.
+    """
+    if duration <= 0 or count <= 0:
+        raise HTTPException(status_code=400, detail="Duration and count must be positive.")
+    check_common_availability_args(tz)
+    bounds_start = intervals.time_to_minutes(day_start) if day_start else 0
+    bounds_end = intervals.time_to_minutes(day_end) if day_end else intervals.MINUTES_PER_DAY
+    if bounds_end - bounds_start < duration:
+        raise HTTPException(status_code=400, detail="The working hours are shorter than the meeting duration.")
+
+    phases = metrics.Phases("find_meeting_slots")
+    meetings = []
+    window_start, window_length = start_date, 1
+    while window_start <= end_date and len(meetings) < count:
+        window_end = min(window_start + timedelta(days=window_length - 1), end_date)
+        load_start, load_end = load_window(window_start, window_end)
+
+        compiled_availability = get_compiled_availability(db, user_ids, load_start, load_end, phases)
+        # An empty user only rules out this window; custom availability may still exist further on
+        if not any(compiled_availability[user_id].is_empty() for user_id in user_ids):
+            with phases("load_schedules"):
+                user_events = load_scheduled_events(db, user_ids, load_start, load_end)
+            common_slots_by_date = compute_common_slots(compiled_availability, user_events, user_ids, window_start, window_end, tz, phases=phases)
+
+            for slot_date in sorted(common_slots_by_date):
+                meetings.extend((slot_date, meeting) for meeting in split_into_meetings(common_slots_by_date[slot_date], duration, bounds_start, bounds_end))
+
+        window_start = window_end + timedelta(days=1)
+        window_length = min(window_length * 2, window_days)
+
+    phases.record()
+    return meetings[:count]
+
+
+# Async read path: the same queries on AsyncSessions. Each query gets its own session (and connection)
+# so the tables, and chunks of a large user list, are fetched concurrently.
+ASYNC_FETCH_CHUNK_SIZE = 200
+
+
+async def _fetch_all(session_factory: async_sessionmaker, statement) -> list:
+    async with session_factory() as session:
+        return (await session.execute(statement)).all()
+
+
+def _chunks(user_ids: List[int]) -> List[List[int]]:
+    return [user_ids[i:i + ASYNC_FETCH_CHUNK_SIZE] for i in range(0, len(user_ids), ASYNC_FETCH_CHUNK_SIZE)]
+
+
+async def _fetch_chunked(session_factory: async_sessionmaker, user_ids: List[int], build_query) -> list:
+    results = await asyncio.gather(*(_fetch_all(session_factory, build_query(chunk)) for chunk in _chunks(user_ids)))
+    return [row for rows in results for row in rows]
+
 
-        # Intersect slots to find common availability
-        common_slots = set.intersection(*daily_slots) if daily_slots else set() 
-        # common_slots is set with common time_slots of all the users
-        if common_slots:
-            common_availability[date_str] = list(common_slots)
+async def load_availability_rows_async(session_factory: async_sessionmaker, user_ids: List[int], start_date: date, end_date: date) -> Dict[int, Dict[str, list]]:
+    if not user_ids:
+        return {}
+    custom_availability, general_availability = await asyncio.gather(
+        _fetch_chunked(session_factory, user_ids, lambda chunk: custom_availability_query(chunk, start_date, end_date)),
+        _fetch_chunked(session_factory, user_ids, general_availability_query),
+    )
+    return _group_availability_rows(user_ids, custom_availability, general_availability)
 
-        current_date += timedelta(days=1)
 
+async def load_scheduled_events_async(session_factory: async_sessionmaker, user_ids: List[int], start_date: date, end_date: date) -> Dict[int, list]:
+    if not user_ids:
+        return {}
+    scheduled_events = await _fetch_chunked(session_factory, user_ids, lambda chunk: scheduled_events_query(chunk, start_date, end_date))
+    return _group_scheduled_events(user_ids, scheduled_events)
+
+
+async def load_common_availability_data_async(session_factory: async_sessionmaker, user_ids: List[int], load_start: date, load_end: date, phases: metrics.Phases) -> Tuple[Dict[int, UserAvailability], Dict[int, list]]:
+    # Compiled availability and scheduled events of the users, for the load window
+    unique_user_ids = list(dict.fromkeys(user_ids))
+
+    # Cache misses and scheduled events are read at the same time, so they are timed as one phase
+    compiled_availability, missing, versions = _cached_compiled_availability(unique_user_ids, load_start, load_end)
+    with phases("load"):
+        materialized_rows, user_events = await asyncio.gather(
+            _fetch_chunked(session_factory, missing, lambda chunk: materialized_availability_query(chunk, load_start, load_end)),
+            load_scheduled_events_async(session_factory, unique_user_ids, load_start, load_end),
+        )
+        # Only users without all their days materialized are compiled from the rules. Decoding and compiling
+        # are CPU work, so they run in the threadpool and only the queries are awaited on the event loop
+        missing = await run_in_threadpool(_use_materialized, compiled_availability, missing, materialized_rows, load_start, load_end, versions)
+        user_rows = await load_availability_rows_async(session_factory, missing, load_start, load_end)
+    with phases("compile"):
+        await run_in_threadpool(_compile_missing, compiled_availability, user_rows, load_start, load_end, versions)
+    return compiled_availability, user_events
+
+
+async def get_common_availability_async(session_factory: async_sessionmaker, user_ids: List[int], start_date: date, end_date: date, tz: str, backend: str = "interval", resolution: int = 15) -> Dict:
+    check_common_availability_args(tz, backend, resolution)
+    load_start, load_end = load_window(start_date, end_date)
+    phases = metrics.Phases("common_availability")
+    compiled_availability, user_events = await load_common_availability_data_async(session_factory, user_ids, load_start, load_end, phases)
+
+    # If no availability at all, this user cannot contribute to common availability
+    if any(compiled_availability[user_id].is_empty() for user_id in user_ids):
+        phases.record()
+        return {}  # No common availability possible
+
+    # Off the event loop: a large request would otherwise stall every other request on this worker. The
+    # sharded path waits on the process pool from the worker thread too
+    common_availability = await run_in_threadpool(
+        compute_common_availability, compiled_availability, user_events, user_ids, start_date, end_date, tz, backend, resolution, phases
+    )
+    phases.record()
     return common_availability
+
+
+async def get_common_availability_cached(session_factory: async_sessionmaker, user_ids: List[int], start_date: date, end_date: date, tz: str, backend: str = "interval", resolution: int = 15) -> Tuple[Dict, str]:
+    """ get_common_availability_async behind response_cache. Returns (result, ETag).
+
+        The cache key is the normalized request (the result doesn't depend on the order of user_ids or
+        on duplicates), and an entry is only served while the data versions of its users are the ones
+        it was computed with: every write bumps its user's version, see cache.user_data_changed.
+    """
+    users = tuple(sorted(set(user_ids)))
+    key = (users, start_date, end_date, tz, backend, resolution)
+    # Read before computing, so a write landing during the computation makes the entry stale
+    versions = user_data_versions.get(users)
+    entry = response_cache.get(key)
+    if entry is not None and entry[0] == versions:
+        return entry[1], entry[2]
+
+    result = await get_common_availability_async(session_factory, list(users), start_date, end_date, tz, backend, resolution)
+    # Derived from the content, so it stays valid across processes and restarts
+    etag = '"' + hashlib.sha1(json.dumps(result).encode()).hexdigest() + '"'
+    response_cache.set(key, (versions, result, etag))
+    return result, etag
+
+
+# One common availability query: (user_ids, start_date, end_date, tz, backend, resolution)
+AvailabilityQuery = Tuple[List[int], date, date, str, str, int]
+
+
+async def get_common_availability_batch(session_factory: async_sessionmaker, queries: List[AvailabilityQuery]) -> List[Dict]:
+    """ Answer many common availability queries, in order, from a single load.
+
+        The union of their users is loaded once over the widest date range, instead of once per query.
+        Each user's free time is then expanded once per (date range, time zone) the queries ask for and
+        shared by every query over that range, so overlapping meetings only pay for the intersections.
+    """
+    for index, (user_ids, start_date, end_date, tz, backend, resolution) in enumerate(queries):
+        try:
+            check_common_availability_args(tz, backend, resolution)
+        except HTTPException as e:
+            raise HTTPException(status_code=e.status_code, detail=f"Query {index}: {e.detail}")
+    if not queries:
+        return []
+
+    phases = metrics.Phases("common_availability_batch")
+    all_user_ids = list(dict.fromkeys(user_id for user_ids, *_ in queries for user_id in user_ids))
+    load_start, load_end = load_window(min(query[1] for query in queries), max(query[2] for query in queries))
+    compiled_availability, user_events = await load_common_availability_data_async(session_factory, all_user_ids, load_start, load_end, phases)
+
+    results = await run_in_threadpool(compute_common_availability_batch, compiled_availability, user_events, queries, phases)
+    phases.record()
+    return results
+
+
+def compute_common_availability_batch(compiled_availability: Dict[int, UserAvailability], user_events: Dict[int, list], queries: List[AvailabilityQuery], phases: metrics.Phases) -> List[Dict]:
+    # The CPU side of get_common_availability_batch
+    free_slots = {}  # (user_id, start_date, end_date, tz) -> the user's free time
+    results = []
+    for user_ids, start_date, end_date, tz, backend, resolution in queries:
+        # If no availability at all, this user cannot contribute to common availability
+        if any(compiled_availability[user_id].is_empty() for user_id in user_ids):
+            results.append({})
+            continue
+
+        user_availability = []
+        for user_id in user_ids:
+            key = (user_id, start_date, end_date, tz)
+            if key not in free_slots:
+                free_slots[key] = expand_free_slots(compiled_availability, user_events, [user_id], start_date, end_date, tz, phases)[0]
+            user_availability.append(free_slots[key])
+
+        with phases("intersect"):
+            common_slots_by_date = intersect_free_slots(user_availability, start_date, end_date, backend, resolution)
+        with phases("format"):
+            results.append(format_common_slots(common_slots_by_date))
+    return results
@@ -0,0 +1,465 @@
+# app/ical.py
+import calendar
+import os
+import re
+from datetime import date, datetime, time, timedelta
+from typing import AsyncIterator, Dict, Iterable, Iterator, List, NamedTuple, Optional, Tuple
+
+import pytz
+from fastapi import HTTPException
+from sqlalchemy.orm import Session
+from starlette.concurrency import run_in_threadpool
+
+from app import crud, ingest
+from app.cache import user_data_changed
+from app.models import User
+from app.timezones import get_timezone
+
+
+# Recurring events are expanded up to this many days ahead, and nothing outside today-1..today+N is imported
+ICAL_IMPORT_HORIZON_DAYS = int(os.getenv("ICAL_IMPORT_HORIZON_DAYS", "365"))
+# Schedules inserted per transaction
+ICAL_IMPORT_BATCH_SIZE = int(os.getenv("ICAL_IMPORT_BATCH_SIZE", "1000"))
+# Errors beyond this many are counted but not reported one by one, so a broken file can't grow the response
+MAX_REPORTED_ERRORS = 100
+
+WEEKDAYS = {"MO": 0, "TU": 1, "WE": 2, "TH": 3, "FR": 4, "SA": 5, "SU": 6}
+RRULE_FREQUENCIES = ("DAILY", "WEEKLY", "MONTHLY", "YEARLY")
+# Rule parts this expansion doesn't implement; such events are imported as their first occurrence only
+UNSUPPORTED_RRULE_PARTS = ("BYSETPOS", "BYWEEKNO", "BYYEARDAY", "BYHOUR", "BYMINUTE", "BYSECOND")
+
+DURATION_PATTERN = re.compile(r"^([+-])?P(?:(\d+)W)?(?:(\d+)D)?(?:T(?:(\d+)H)?(?:(\d+)M)?(?:(\d+)S)?)?$")
+BYDAY_PATTERN = re.compile(r"^([+-]?\d{1,2})?(MO|TU|WE|TH|FR|SA|SU)$")
+
+
+class Event(NamedTuple):
+    """ A VEVENT reduced to what blocks time. start is the wall-clock start in tz (midnight for all-day
+        events), exdates the excluded occurrences as naive UTC datetimes.
+    """
+    uid: str
+    summary: Optional[str]
+    start: datetime
+    tz: str
+    duration: timedelta
+    rrule: Optional[Dict[str, str]]
+    exdates: frozenset
+    busy: bool  # False for cancelled and transparent (free) events
+
+
+def _split_params(text: str) -> List[str]:
+    # Split on ";" outside double quotes
+    parts, current, quoted = [], [], False
+    for char in text:
+        if char == '"':
+            quoted = not quoted
+        elif char == ";" and not quoted:
+            parts.append("".join(current))
+            current = []
+            continue
+        current.append(char)
+    parts.append("".join(current))
+    return parts
+
+
+def parse_content_line(line: str) -> Tuple[str, Dict[str, str], str]:
+    """ "DTSTART;TZID=Europe/Paris:20250106T090000" as ("DTSTART", {"TZID": "Europe/Paris"}, "2025...") """
+    quoted = False
+    for position, char in enumerate(line):
+        if char == '"':
+            quoted = not quoted
+        elif char == ":" and not quoted:
+            break
+    else:
+        raise ValueError(f"Not a content line: {line[:80]!r}")
+    name, *params = _split_params(line[:position])
+    parsed = {}
+    for param in params:
+        key, _, value = param.partition("=")
+        parsed[key.upper()] = value.strip('"')
+    return name.upper(), parsed, line[position + 1:]
+
+
+def unescape_text(value: str) -> str:
+    return re.sub(r"\\([\\;,nN])", lambda match: "\n" if match.group(1) in "nN" else match.group(1), value)
+
+
+def parse_duration(value: str) -> timedelta:
+    match = DURATION_PATTERN.match(value.strip())
+    if not match:
+        raise ValueError(f"Invalid DURATION {value!r}")
+    sign, weeks, days, hours, minutes, seconds = match.groups()
+    duration = timedelta(
+        weeks=int(weeks or 0), days=int(days or 0), hours=int(hours or 0), minutes=int(minutes or 0), seconds=int(seconds or 0)
+    )
+    return -duration if sign == "-" else duration
+
+
+def to_utc(value: datetime, tz: str) -> datetime:
+    # Naive wall-clock time in tz as a naive UTC datetime
+    if tz == "UTC":
+        return value
+    return get_timezone(tz).localize(value).astimezone(pytz.utc).replace(tzinfo=None)
+
+
+class CalendarReader:
+    """ Incremental iCalendar parser. Feed it the physical lines of a file as they are read; every call
+        returns the events completed by that line, so only the event being read is held in memory.
+
+        Folded lines (continuations starting with a space or tab) are joined before parsing, which is why
+        a line is only parsed once the next one has been seen. Properties of components nested in an event
+        (VALARM) are ignored. Times without a TZID, TZIDs pytz doesn't know and all-day dates are taken in
+        default_tz. Malformed events are returned as a ValueError, so the caller can report them and go on.
+    """
+
+    def __init__(self, default_tz: str = "UTC"):
+        self.default_tz = default_tz
+        self.unknown_tzids = set()
+        self._pending: Optional[str] = None
+        self._components: List[str] = []
+        self._properties: Optional[List[Tuple[str, Dict[str, str], str]]] = None
+
+    def feed(self, line: str) -> list:
+        if line[:1] in (" ", "\t") and self._pending is not None:
+            self._pending += line[1:]
+            return []
+        logical, self._pending = self._pending, line
+        return self._parse(logical) if logical else []
+
+    def close(self) -> list:
+        logical, self._pending = self._pending, None
+        return self._parse(logical) if logical else []
+
+    def _parse(self, logical: str) -> list:
+        try:
+            name, params, value = parse_content_line(logical.lstrip("\ufeff"))
+        except ValueError:
+            return []  # Stray text between properties; nothing to attach it to
+        if name == "BEGIN":
+            self._components.append(value.upper())
+            if value.upper() == "VEVENT":
+                self._properties = []
+        elif name == "END":
+            if self._components:
+                self._components.pop()
+            if value.upper() == "VEVENT" and self._properties is not None:
+                properties, self._properties = self._properties, None
+                try:
+                    return [self._build_event(properties)]
+                except (ValueError, KeyError, OverflowError) as e:
+                    return [ValueError(str(e))]
+        elif self._properties is not None and self._components[-1:] == ["VEVENT"]:
+            self._properties.append((name, params, value))
+        return []
+
+    def _zone(self, params: Dict[str, str], value: str) -> str:
+        if value.endswith("Z"):
+            return "UTC"
+        tzid = params.get("TZID")
+        if not tzid:
+            return self.default_tz
+        tzid = tzid.lstrip("/")
+        try:
+            get_timezone(tzid)
+            return tzid
+        except pytz.UnknownTimeZoneError:
+            self.unknown_tzids.add(tzid)
+            return self.default_tz
+
+    def parse_datetime(self, params: Dict[str, str], value: str) -> Tuple[datetime, str, bool]:
+        """ A DATE or DATE-TIME value as (naive wall-clock datetime, its time zone, whether it is a date). """
+        value = value.strip()
+        if params.get("VALUE", "").upper() == "DATE" or len(value) == 8:
+            return datetime.strptime(value[:8], "%Y%m%d"), self.default_tz, True
+        parsed = datetime.strptime(value.rstrip("Z")[:15], "%Y%m%dT%H%M%S")
+        return parsed, self._zone(params, value), False
+
+    def _build_event(self, properties: List[Tuple[str, Dict[str, str], str]]) -> Event:
+        found = {}
+        exdates = set()
+        for name, params, value in properties:
+            if name == "EXDATE":
+                for item in value.split(","):
+                    excluded, tz, _ = self.parse_datetime(params, item)
+                    exdates.add(to_utc(excluded, tz))
+            else:
+                found.setdefault(name, (params, value))
+
+        if "DTSTART" not in found:
+            raise ValueError("Event without DTSTART")
+        start, tz, all_day = self.parse_datetime(*found["DTSTART"])
+        if "DTEND" in found:
+            end, end_tz, _ = self.parse_datetime(*found["DTEND"])
+            duration = to_utc(end, end_tz) - to_utc(start, tz)
+        elif "DURATION" in found:
+            duration = parse_duration(found["DURATION"][1])
+        else:
+            duration = timedelta(days=1) if all_day else timedelta(0)
+
+        rrule = None
+        if "RRULE" in found:
+            rrule = dict(part.partition("=")[::2] for part in found["RRULE"][1].upper().split(";") if part)
+
+        status = found.get("STATUS", ({}, ""))[1].strip().upper()
+        transparency = found.get("TRANSP", ({}, ""))[1].strip().upper()
+        return Event(
+            uid=found.get("UID", ({}, ""))[1],
+            summary=unescape_text(found["SUMMARY"][1]) if "SUMMARY" in found else None,
+            start=start,
+            tz=tz,
+            duration=duration,
+            rrule=rrule,
+            exdates=frozenset(exdates),
+            busy=status != "CANCELLED" and transparency != "TRANSPARENT",
+        )
+
+
+def _month_days(year: int, month: int, monthdays: List[int], weekdays: List[Tuple[int, int]], default_day: int) -> List[int]:
+    # Days of a month matching BYMONTHDAY / BYDAY (both given: days matching both), else default_day
+    days_in_month = calendar.monthrange(year, month)[1]
+    by_monthday = {day if day > 0 else days_in_month + day + 1 for day in monthdays}
+    by_weekday = set()
+    for ordinal, weekday in weekdays:
+        first = (weekday - calendar.weekday(year, month, 1)) % 7 + 1
+        matching = list(range(first, days_in_month + 1, 7))
+        if not ordinal:
+            by_weekday.update(matching)
+        elif -len(matching) <= ordinal <= len(matching):
+            by_weekday.add(matching[ordinal - 1 if ordinal > 0 else ordinal])
+    if monthdays and weekdays:
+        days = by_monthday & by_weekday
+    else:
+        days = by_monthday or by_weekday or {default_day}
+    return sorted(day for day in days if 1 <= day <= days_in_month)
+
+
+def _add_months(value: date, months: int) -> Tuple[int, int]:
+    index = value.year * 12 + value.month - 1 + months
+    return index // 12, index % 12 + 1
+
+
+def recurrence_dates(rrule: Dict[str, str], first: date, last: date, skip_before: date = None) -> Iterator[date]:
+    """ Dates of the occurrences of a rule starting on first, in order, until the rule ends or the dates
+        pass last. Daily and weekly rules without a COUNT jump over the whole periods before skip_before,
+        so an old rule isn't walked from its start; COUNT is counted from first, so those rules are.
+    """
+    frequency = rrule.get("FREQ")
+    if frequency not in RRULE_FREQUENCIES:
+        raise ValueError(f"Unsupported RRULE FREQ={frequency}")
+    unsupported = [part for part in UNSUPPORTED_RRULE_PARTS if part in rrule]
+    if unsupported:
+        raise ValueError(f"Unsupported RRULE part {unsupported[0]}")
+
+    interval = max(1, int(rrule.get("INTERVAL", "1")))
+    count = int(rrule["COUNT"]) if "COUNT" in rrule else None
+    months = [int(month) for month in rrule["BYMONTH"].split(",")] if "BYMONTH" in rrule else []
+    monthdays = [int(day) for day in rrule["BYMONTHDAY"].split(",")] if "BYMONTHDAY" in rrule else []
+    weekdays = []
+    for item in rrule.get("BYDAY", "").split(","):
+        if item:
+            match = BYDAY_PATTERN.match(item.strip())
+            if not match:
+                raise ValueError(f"Invalid RRULE BYDAY {item!r}")
+            weekdays.append((int(match.group(1) or 0), WEEKDAYS[match.group(2)]))
+    if frequency == "YEARLY" and weekdays and not months:
+        raise ValueError("Unsupported RRULE: YEARLY BYDAY without BYMONTH")
+    if frequency in ("DAILY", "WEEKLY") and any(ordinal for ordinal, _ in weekdays):
+        raise ValueError(f"Invalid RRULE: numbered BYDAY with FREQ={frequency}")
+    week_start = WEEKDAYS.get(rrule.get("WKST", "MO"), 0)
+
+    period = 0
+    if count is None and skip_before is not None and frequency in ("DAILY", "WEEKLY"):
+        period = max(0, (skip_before - first).days // (interval * (7 if frequency == "WEEKLY" else 1)) - 1)
+
+    emitted = 0
+    while True:
+        if frequency == "DAILY":
+            period_start = first + timedelta(days=period * interval)
+            candidates = [period_start]
+            if weekdays:
+                candidates = [day for day in candidates if day.weekday() in {weekday for _, weekday in weekdays}]
+            if monthdays:
+                candidates = [day for day in candidates if day.day in _month_days(day.year, day.month, monthdays, [], 0)]
+        elif frequency == "WEEKLY":
+            period_start = first - timedelta(days=(first.weekday() - week_start) % 7) + timedelta(weeks=period * interval)
+            days = sorted({(weekday - week_start) % 7 for _, weekday in weekdays} or {(first.weekday() - week_start) % 7})
+            candidates = [period_start + timedelta(days=offset) for offset in days]
+        elif frequency == "MONTHLY":
+            year, month = _add_months(first, period * interval)
+            period_start = date(year, month, 1)
+            candidates = [date(year, month, day) for day in _month_days(year, month, monthdays, weekdays, first.day)]
+        else:
+            year = first.year + period * interval
+            period_start = date(year, 1, 1)
+            candidates = [
+                date(year, month, day)
+                for month in (months or [first.month])
+                for day in _month_days(year, month, monthdays, weekdays, first.day)
+            ]
+        if period_start > last:
+            return
+        for candidate in candidates:
+            if candidate < first or (months and candidate.month not in months):
+                continue
+            if candidate > last:
+                return
+            yield candidate
+            emitted += 1
+            if count is not None and emitted >= count:
+                return
+        period += 1
+
+
+def _until(rrule: Dict[str, str], reader: CalendarReader, tz: str) -> Optional[datetime]:
+    # UNTIL as a naive UTC datetime, inclusive; a date includes the whole day
+    if "UNTIL" not in rrule:
+        return None
+    until, until_tz, is_date = reader.parse_datetime({}, rrule["UNTIL"])
+    if is_date:
+        return to_utc(until + timedelta(days=1), tz) - timedelta(microseconds=1)
+    return until if until_tz == "UTC" else to_utc(until, tz)
+
+
+def occurrences(event: Event, reader: CalendarReader, start_date: date, end_date: date) -> Iterator[Tuple[datetime, datetime]]:
+    """ (start, end) of the event's occurrences overlapping the UTC dates start_date..end_date, as naive
+        UTC datetimes. A recurrence is expanded in the event's wall-clock time, so it keeps its local time
+        across DST changes, and only as far as end_date.
+    """
+    window_start, window_end = datetime.combine(start_date, time()), datetime.combine(end_date + timedelta(days=1), time())
+    if event.rrule is None:
+        starts = iter([event.start])
+    else:
+        until = _until(event.rrule, reader, event.tz)
+        # Wall-clock dates are up to a day off the UTC ones, plus however long the event runs
+        margin = timedelta(days=event.duration.days + 2)
+        dates = recurrence_dates(event.rrule, event.start.date(), end_date + timedelta(days=1), start_date - margin)
+        starts = (
+            datetime.combine(occurrence_date, event.start.time()) for occurrence_date in dates
+            if occurrence_date >= start_date - margin
+        )
+    for local_start in starts:
+        start = to_utc(local_start, event.tz)
+        if event.rrule is not None and until is not None and start > until:
+            return
+        if start in event.exdates:
+            continue
+        end = start + event.duration
+        if end > window_start and start < window_end:
+            yield max(start, window_start), min(end, window_end)
+
+
+def schedule_rows(user_id: int, start: datetime, end: datetime, description: Optional[str]) -> Iterator[Dict]:
+    # A UTC range as one schedules row per UTC date, widened to whole minutes. A row ending at midnight
+    # ends at 00:00, which the read path takes as the end of the day (see intervals.unwrap)
+    start = start.replace(second=0, microsecond=0)
+    if end.second or end.microsecond:
+        end = end.replace(second=0, microsecond=0) + timedelta(minutes=1)
+    while start < end:
+        piece_end = min(end, datetime.combine(start.date() + timedelta(days=1), time()))
+        yield {"user_id": user_id, "date": start.date(), "start_time": start.time(), "end_time": piece_end.time(), "description": description}
+        start = piece_end
+
+
+class CalendarImport:
+    """ State of one import: the reader, the schedules waiting for the next batch and the counts. feed()
+        returns True once a batch is ready to be taken and inserted, which the sync and async drivers below
+        do each their own way.
+    """
+
+    def __init__(self, user_id: int, default_tz: str, start_date: date, end_date: date, batch_size: int = ICAL_IMPORT_BATCH_SIZE):
+        self.user_id = user_id
+        self.start_date = start_date
+        self.end_date = end_date
+        self.batch_size = batch_size
+        self.reader = CalendarReader(default_tz)
+        self.batch: List[Dict] = []
+        self.events = 0
+        self.skipped = 0
+        self.inserted = 0
+        self.error_count = 0
+        self.errors: List[Dict] = []
+
+    def _error(self, index: int, detail: str) -> None:
+        self.error_count += 1
+        if len(self.errors) < MAX_REPORTED_ERRORS:
+            self.errors.append({"index": index, "detail": detail})
+
+    def _add(self, events: list) -> bool:
+        for event in events:
+            index = self.events
+            self.events += 1
+            if isinstance(event, Exception):
+                self._error(index, str(event))
+                continue
+            if not event.busy or event.duration <= timedelta(0):
+                self.skipped += 1
+                continue
+            if event.rrule is not None:
+                try:
+                    ranges = list(occurrences(event, self.reader, self.start_date, self.end_date))
+                except (ValueError, OverflowError) as e:
+                    self._error(index, f"{e}; imported its first occurrence only.")
+                    ranges = list(occurrences(event._replace(rrule=None), self.reader, self.start_date, self.end_date))
+            else:
+                ranges = occurrences(event, self.reader, self.start_date, self.end_date)
+            for start, end in ranges:
+                self.batch.extend(schedule_rows(self.user_id, start, end, event.summary))
+        return len(self.batch) >= self.batch_size
+
+    def feed(self, line: str) -> bool:
+        return self._add(self.reader.feed(line))
+
+    def close(self) -> bool:
+        return self._add(self.reader.close()) or bool(self.batch)
+
+    def take_batch(self) -> List[Dict]:
+        batch, self.batch = self.batch, []
+        return batch
+
+    def result(self) -> Dict:
+        for tzid in sorted(self.reader.unknown_tzids):
+            self._error(-1, f"Unknown TZID {tzid!r}, its times were taken in {self.reader.default_tz}.")
+        if self.error_count > len(self.errors):
+            self.errors.append({"index": -1, "detail": f"{self.error_count - len(self.errors)} more errors not shown."})
+        return {"events": self.events, "skipped": self.skipped, "inserted": self.inserted, "errors": self.errors}
+
+
+def start_import(db: Session, user_id: int, horizon_days: int = None, batch_size: int = None) -> CalendarImport:
+    user = db.get(User, user_id)
+    if user is None:
+        raise HTTPException(status_code=404, detail=f"User {user_id} does not exist.")
+    today = datetime.now(pytz.utc).date()
+    horizon_days = ICAL_IMPORT_HORIZON_DAYS if horizon_days is None else horizon_days
+    return CalendarImport(user_id, user.time_zone, today - timedelta(days=1), today + timedelta(days=horizon_days), batch_size or ICAL_IMPORT_BATCH_SIZE)
+
+
+def import_calendar(db: Session, user_id: int, lines: Iterable[str], horizon_days: int = None, batch_size: int = None) -> Dict:
+    """ Import the events of an iCalendar file, given line by line, as the user's schedules. Each batch
+        is inserted in its own transaction, so the file is never held whole and an import that fails
+        part way keeps the batches before it; schedules already stored are skipped, so it can be rerun.
+    """
+    job = start_import(db, user_id, horizon_days, batch_size)
+    try:
+        for line in lines:
+            if job.feed(line.rstrip("\r\n")):
+                job.inserted += crud.insert_schedules(db, job.take_batch())
+        if job.close():
+            job.inserted += crud.insert_schedules(db, job.take_batch())
+    finally:
+        user_data_changed(user_id)
+    return job.result()
+
+
+async def import_calendar_stream(stream: AsyncIterator[bytes], db: Session, user_id: int, horizon_days: int = None, batch_size: int = None) -> Dict:
+    """ import_calendar for a streamed request body: lines are parsed as they arrive and each batch is
+        inserted off the event loop.
+    """
+    job = await run_in_threadpool(start_import, db, user_id, horizon_days, batch_size)
+    try:
+        async for line in ingest.iter_lines(stream):
+            if job.feed(line):
+                job.inserted += await run_in_threadpool(crud.insert_schedules, db, job.take_batch())
+        if job.close():
+            job.inserted += await run_in_threadpool(crud.insert_schedules, db, job.take_batch())
+    finally:
+        user_data_changed(user_id)
+    return job.result()
@@ -0,0 +1,76 @@
+# app/ingest.py
+import csv
+import json
+from typing import AsyncIterator, Callable, Dict, List, Type
+
+from fastapi import Request
+from pydantic import BaseModel, ValidationError
+from sqlalchemy.orm import Session
+from starlette.concurrency import run_in_threadpool
+
+
+async def iter_lines(stream: AsyncIterator[bytes]) -> AsyncIterator[str]:
+    # Split the request body into lines as it arrives instead of reading it whole
+    buffer = bytearray()
+    async for chunk in stream:
+        buffer.extend(chunk)
+        start = 0
+        newline = buffer.find(b"\n", start)
+        while newline != -1:
+            yield buffer[start:newline].decode("utf-8").rstrip("\r")
+            start = newline + 1
+            newline = buffer.find(b"\n", start)
+        del buffer[:start]
+    if buffer:
+        yield buffer.decode("utf-8").rstrip("\r")
+
+
+async def iter_records(stream: AsyncIterator[bytes], content_type: str) -> AsyncIterator[Dict]:
+    """ One dict per row of an NDJSON body, or of a CSV body whose first line is the header.
+        A row that can't be decoded is yielded as the exception, so it can be reported with its index.
+    """
+    header = None
+    is_csv = "csv" in content_type
+    async for line in iter_lines(stream):
+        if not line.strip():
+            continue
+        if is_csv:
+            values = next(csv.reader([line]))
+            if header is None:
+                header = [name.strip() for name in values]
+                continue
+            yield dict(zip(header, values))
+        else:
+            try:
+                yield json.loads(line)
+            except ValueError as e:
+                yield e
+
+
+async def ingest_stream(request: Request, schema: Type[BaseModel], bulk_create: Callable, db: Session) -> Dict:
+    """ Validate a streamed NDJSON/CSV body row by row and hand the valid rows to one bulk_create call.
+        Errors from both steps are reported by the row's position in the body.
+    """
+    rows: List[BaseModel] = []
+    row_numbers: List[int] = []
+    errors: List[Dict] = []
+
+    index = 0
+    async for record in iter_records(request.stream(), request.headers.get("content-type", "")):
+        try:
+            if isinstance(record, Exception):
+                raise record
+            if not isinstance(record, dict):
+                raise ValueError("Expected an object per row.")
+            rows.append(schema(**record))
+            row_numbers.append(index)
+        except (ValueError, ValidationError) as e:
+            errors.append({"index": index, "detail": str(e)})
+        index += 1
+
+    # The insert is sync, keep it off the event loop
+    result = await run_in_threadpool(bulk_create, db, rows)
+    for error in result["errors"]:
+        error["index"] = row_numbers[error["index"]]
+    result["errors"] = sorted(errors + result["errors"], key=lambda error: error["index"])
+    return result
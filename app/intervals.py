@@ -0,0 +1,176 @@
+# app/intervals.py
+import heapq
+from datetime import time
+from typing import FrozenSet, Iterable, Iterator, List, Tuple
+
+
+# An interval is a half-open [start, end) pair of minutes counted from midnight
+Interval = Tuple[int, int]
+
+MINUTES_PER_DAY = 24 * 60
+
+
+def time_to_minutes(value: time) -> int:
+    return value.hour * 60 + value.minute
+
+
+def unwrap(start: int, end: int) -> Interval:
+    """ A stored slot as a forward range of minutes. A slot whose end is not after its start crosses
+        midnight (e.g. 20:30-02:30 once converted to UTC), so its end is moved onto the next day.
+    """
+    start %= MINUTES_PER_DAY
+    end %= MINUTES_PER_DAY
+    if end <= start:
+        end += MINUTES_PER_DAY
+    return (start, end)
+
+
+def split_days(start: int, end: int) -> List[Tuple[int, Interval]]:
+    """ Cut a range of minutes counted from some day's midnight (it may start before it or run past the
+        next one) into (day offset, interval) pieces that each fit within one day.
+    """
+    pieces = []
+    while start < end:
+        day, day_start = divmod(start, MINUTES_PER_DAY)
+        day_end = min(end - day * MINUTES_PER_DAY, MINUTES_PER_DAY)
+        pieces.append((day, (day_start, day_end)))
+        start = (day + 1) * MINUTES_PER_DAY
+    return pieces
+
+
+def normalize(intervals: Iterable[Interval]) -> List[Interval]:
+    """ Sort the intervals and merge the ones that overlap or touch, dropping empty ones. """
+    merged: List[Interval] = []
+    for start, end in sorted(intervals):
+        if end <= start:
+            continue
+        if merged and start <= merged[-1][1]:
+            if end > merged[-1][1]:
+                merged[-1] = (merged[-1][0], end)
+        else:
+            merged.append((start, end))
+    return merged
+
+
+def _boundaries(intervals: List[Interval]) -> Iterator[Tuple[int, int]]:
+    # Ends are tagged -1 and starts +1 so that at the same minute an end is seen before a start,
+    # which keeps slots that only touch (09:00-10:00 and 10:00-11:00) from counting as overlapping.
+    for start, end in intervals:
+        yield (start, 1)
+        yield (end, -1)
+
+
+def intersect_all(interval_lists: List[List[Interval]]) -> List[Interval]:
+    """ Windows covered by every one of the N lists.
+
+        Each list is normalized (sorted, disjoint) so its boundary points are already in order; the N
+        streams are then combined with a k-way heap merge and swept once, keeping a count of how many
+        lists are open. A window is common while that count equals N. O(total slots * log N).
+    """
+    n = len(interval_lists)
+    if n == 0:
+        return []
+
+    streams = []
+    for intervals in interval_lists:
+        merged = normalize(intervals)
+        if not merged:
+            return []  # One empty list means there is nothing in common
+        streams.append(_boundaries(merged))
+
+    common: List[Interval] = []
+    open_count = 0
+    window_start = None
+    for point, delta in heapq.merge(*streams):
+        open_count += delta
+        if open_count == n:
+            window_start = point
+        elif window_start is not None:
+            if common and common[-1][1] == window_start:
+                common[-1] = (common[-1][0], point)
+            elif point > window_start:
+                common.append((window_start, point))
+            window_start = None
+    return common
+
+
+def _tagged_boundaries(intervals: List[Interval], index: int) -> Iterator[Tuple[int, int, int]]:
+    for start, end in intervals:
+        yield (start, 1, index)
+        yield (end, -1, index)
+
+
+def coverage(interval_lists: List[List[Interval]], min_count: int = 1) -> List[Tuple[int, int, FrozenSet[int]]]:
+    """ Windows covered by at least min_count of the lists, as (start, end, indices of the lists covering it).
+
+        The same heap-merged sweep as intersect_all, but the set of open lists is kept instead of only
+        their count, and a window is cut wherever that set changes. Boundaries at the same minute are
+        applied together, so a list that ends as another starts doesn't produce an empty window.
+        O(total slots * log N), plus copying the open set for each window reported.
+    """
+    streams = [_tagged_boundaries(normalize(intervals), index) for index, intervals in enumerate(interval_lists)]
+
+    windows: List[Tuple[int, int, FrozenSet[int]]] = []
+    open_lists = set()
+    previous = None
+    for point, delta, index in heapq.merge(*streams):
+        if previous is not None and point > previous and len(open_lists) >= max(min_count, 1):
+            members = frozenset(open_lists)
+            if windows and windows[-1][1] == previous and windows[-1][2] == members:
+                windows[-1] = (windows[-1][0], point, members)
+            else:
+                windows.append((previous, point, members))
+        if delta > 0:
+            open_lists.add(index)
+        else:
+            open_lists.discard(index)
+        previous = point
+    return windows
+
+
+def subtract(free: List[Interval], busy: List[Interval]) -> List[Interval]:
+    """ Parts of the free intervals not covered by any busy interval.
+
+        Both lists are normalized and then walked together once, so the cost is O((free + busy) log)
+        for the sort instead of checking every free slot against every event.
+    """
+    free = normalize(free)
+    busy = normalize(busy)
+    remaining: List[Interval] = []
+    j = 0
+    for start, end in free:
+        # Skip events that finished before this slot starts
+        while j < len(busy) and busy[j][1] <= start:
+            j += 1
+        k = j
+        while k < len(busy) and busy[k][0] < end:
+            if busy[k][0] > start:
+                remaining.append((start, busy[k][0]))
+            start = max(start, busy[k][1])
+            if start >= end:
+                break
+            k += 1
+        if start < end:
+            remaining.append((start, end))
+    return remaining
+
+
+def format_minutes(minutes: int) -> str:
+    # Same output as strftime('%I:%M%p') without building a datetime
+    hour, minute = divmod(minutes % MINUTES_PER_DAY, 60)
+    return f"{(hour % 12) or 12:02d}:{minute:02d}{'AM' if hour < 12 else 'PM'}"
+
+
+def format_interval(interval: Interval) -> str:
+    return f"{format_minutes(interval[0])}-{format_minutes(interval[1])}"
+
+
+def encode(intervals: List[Interval]) -> str:
+    # Compact text form for storage, "540-720,780-1020"
+    return ",".join(f"{start}-{end}" for start, end in intervals)
+
+
+def decode(text: str) -> List[Interval]:
+    if not text:
+        return []
+    return [tuple(int(minute) for minute in interval.split("-")) for interval in text.split(",")]
@@ -1,17 +1,94 @@
 # app/main.py
-from fastapi import FastAPI, Depends, HTTPException
+from contextlib import asynccontextmanager
+from fastapi import APIRouter, FastAPI, Depends, HTTPException, Query, Request
+from fastapi.concurrency import run_in_threadpool
+from fastapi.responses import JSONResponse, PlainTextResponse, Response, StreamingResponse
 from sqlalchemy.orm import Session
-from app.database import SessionLocal, engine
-from app import crud, models, schemas
+from app import database
+from app.database import SessionLocal, AsyncSessionLocal
+from app import crud, ical, ingest, intervals, metrics, models, parallel, schemas
 import logging
+import os
 from sqlalchemy.exc import IntegrityError, SQLAlchemyError
 from datetime import date, datetime
+from typing import Dict, List
+import asyncio
+import json
+import time
 
-# Create the tables in the database
-models.Base.metadata.create_all(bind=engine)
+# Create missing tables on startup. Off by default: the schema is managed with Alembic migrations, and a
+# create_all from every worker on every boot is extra load on the database for nothing.
+CREATE_SCHEMA = os.getenv("DB_CREATE_SCHEMA", "").lower() in ("1", "true", "yes")
 
-# Initialize FastAPI app
-app = FastAPI()
+router = APIRouter()
+
+
+# Request latency per route, and with TIMING_HEADERS=1 a Server-Timing header with the phases of the request
+async def record_request_timings(request: Request, call_next):
+    timings = metrics.start_request_timings()
+    started = time.perf_counter()
+    response = await call_next(request)
+    elapsed = time.perf_counter() - started
+
+    route = request.scope.get("route")
+    metrics.REQUEST_SECONDS.observe(elapsed, method=request.method, route=getattr(route, "path", "unmatched"), status=response.status_code)
+    if metrics.TIMING_HEADERS:
+        response.headers["Server-Timing"] = metrics.server_timing_header(timings, elapsed)
+    return response
+
+
+def extend_materialized_horizon():
+    db = SessionLocal()
+    try:
+        written = crud.extend_materialized_horizon(db)
+        logging.info(f"Materialized {written} days of availability")
+    finally:
+        db.close()
+
+
+# Keep daily_availability filled up to the horizon as days go by. Every worker runs this loop; on Postgres
+# crud.materialize_lock lets one of them do the work and the others skip that round. The first run waits an
+# interval: the horizon only moves a day at a time, and create requests keep the days in it up to date.
+async def extend_materialized_horizon_periodically():
+    while True:
+        await asyncio.sleep(crud.MATERIALIZE_INTERVAL)
+        try:
+            await run_in_threadpool(extend_materialized_horizon)
+        except Exception as e:
+            logging.error(f"Extending the materialized availability failed: {str(e)}")
+
+
+def lifespan(create_schema: bool):
+    @asynccontextmanager
+    async def run(app: FastAPI):
+        engine = database.init_engines()
+        if create_schema:
+            await run_in_threadpool(models.Base.metadata.create_all, bind=engine)
+
+        materialize_task = None
+        if crud.MATERIALIZE_INTERVAL > 0:
+            materialize_task = asyncio.create_task(extend_materialized_horizon_periodically())
+        try:
+            yield
+        finally:
+            if materialize_task is not None:
+                materialize_task.cancel()
+            parallel.shutdown()
+            await database.dispose_engines()
+    return run
+
+
+def create_app(create_schema: bool = None) -> FastAPI:
+    """ The FastAPI application. Engines are created when it starts up (see lifespan), not when this
+        module is imported; pass create_schema=True, or set DB_CREATE_SCHEMA=1, to create missing tables.
+
+            uvicorn app.main:app
+            uvicorn --factory app.main:create_app
+    """
+    app = FastAPI(lifespan=lifespan(CREATE_SCHEMA if create_schema is None else create_schema))
+    app.middleware("http")(record_request_timings)
+    app.include_router(router)
+    return app
 
 
 # Dependency to get the database session
@@ -23,18 +100,23 @@ def get_db():
         db.close()
 
 
+# Dependency for the async read path: the session factory, since concurrent queries need their own sessions
+def get_async_sessionmaker():
+    return AsyncSessionLocal
+
+
 # POST endpoint to create a new user
-@app.post("/users/", response_model=schemas.UserResponse)
+@router.post("/users/", response_model=schemas.UserResponse)
 def create_user(user: schemas.UserCreate, db: Session = Depends(get_db)):
     return crud.create_user(db=db, user=user)
 
 
-@app.post("/general-availability/", response_model=schemas.GeneralAvailabilityResponse)
+@router.post("/general-availability/", response_model=schemas.GeneralAvailabilityResponse)
 def create_general_availability(availability: schemas.GeneralAvailabilityCreate, db: Session = Depends(get_db)):
     try:
         return crud.create_general_availability(db=db, availability=availability)
     except HTTPException as e:
-        print("ERROR = ",e)
+        logging.error(f"HTTPException: {e.detail}")
         raise HTTPException(status_code=400, detail="This availability already exists for the user or have overlaps with an existing availability")
     except IntegrityError as e:
         raise HTTPException(status_code=400, detail="Database constraint violation error.")
@@ -43,14 +125,41 @@ def create_general_availability(availability: schemas.GeneralAvailabilityCreate,
         logging.error(f"Unexpected error: {str(e)}")
 
 
-@app.post("/custom-availability/", response_model=schemas.CustomAvailabilityResponse)
+@router.post("/custom-availability/", response_model=schemas.CustomAvailabilityResponse)
 def create_custom_availability(availability: schemas.CustomAvailabilityCreate, db: Session = Depends(get_db)):
     return crud.create_custom_availability(db=db, availability=availability)
-    
+
+
+# Bulk loading: a JSON array, or a streamed NDJSON / CSV body (Content-Type: application/x-ndjson or text/csv)
+@router.post("/general-availability/bulk/", response_model=schemas.BulkInsertResponse)
+def bulk_create_general_availability(availabilities: List[schemas.GeneralAvailabilityCreate], db: Session = Depends(get_db)):
+    return crud.bulk_create_general_availability(db=db, availabilities=availabilities)
+
+
+@router.post("/general-availability/bulk/stream/", response_model=schemas.BulkInsertResponse)
+async def stream_general_availability(request: Request, db: Session = Depends(get_db)):
+    return await ingest.ingest_stream(request, schemas.GeneralAvailabilityCreate, crud.bulk_create_general_availability, db)
+
+
+@router.post("/custom-availability/bulk/", response_model=schemas.BulkInsertResponse)
+def bulk_create_custom_availability(availabilities: List[schemas.CustomAvailabilityCreate], db: Session = Depends(get_db)):
+    return crud.bulk_create_custom_availability(db=db, availabilities=availabilities)
+
+
+@router.post("/custom-availability/bulk/stream/", response_model=schemas.BulkInsertResponse)
+async def stream_custom_availability(request: Request, db: Session = Depends(get_db)):
+    return await ingest.ingest_stream(request, schemas.CustomAvailabilityCreate, crud.bulk_create_custom_availability, db)
+
+
+# iCalendar (.ics) import of a user's busy times, streamed: POST the file as the body (Content-Type: text/calendar)
+@router.post("/users/{user_id}/schedules/import/", response_model=schemas.CalendarImportResponse)
+async def import_schedules(user_id: int, request: Request, horizon_days: int = Query(None, ge=0), db: Session = Depends(get_db)):
+    return await ical.import_calendar_stream(request.stream(), db, user_id, horizon_days)
+
 
 # ANSWER ENDPOINT (MAIN ENDPOINT MENSTIONED IN TASK)
-@app.post("/common-availability/")
-def get_common_availability(payload: schemas.AvailabilityRequest, db: Session = Depends(get_db)):
+@router.post("/common-availability/")
+async def get_common_availability(payload: schemas.AvailabilityRequest, request: Request, session_factory=Depends(get_async_sessionmaker)):
     user_ids = payload.user_ids
     start_date = payload.startdate
     end_date = payload.enddate
@@ -60,12 +169,106 @@ def get_common_availability(payload: schemas.AvailabilityRequest, db: Session =
     start_date_obj = datetime.strptime(start_date, "%d-%m-%Y").date()
     end_date_obj = datetime.strptime(end_date, "%d-%m-%Y").date()
 
-    # Fetch availability for users
-    available_slots = crud.get_common_availability(db, user_ids, start_date_obj, end_date_obj, timezone)
+    # Fetch availability for users, from the response cache while none of them changed
+    available_slots, etag = await crud.get_common_availability_cached(
+        session_factory, user_ids, start_date_obj, end_date_obj, timezone,
+        backend=payload.backend, resolution=payload.resolution
+    )
+
+    # Pollers send back the ETag they got and get an empty 304 while the answer is the same
+    headers = {"ETag": etag, "Cache-Control": "no-cache"}
+    if etag_matches(request.headers.get("if-none-match"), etag):
+        return Response(status_code=304, headers=headers)
+    return JSONResponse(available_slots, headers=headers)
+
+
+def etag_matches(if_none_match: str, etag: str) -> bool:
+    if not if_none_match:
+        return False
+    candidates = [candidate.strip() for candidate in if_none_match.split(",")]
+    # Weak comparison, as If-None-Match requires
+    return "*" in candidates or etag in (candidate[2:] if candidate.startswith("W/") else candidate for candidate in candidates)
+
+
+# Many /common-availability/ queries in one request, answered in order from a single load of their users
+@router.post("/common-availability/batch/", response_model=List[Dict[str, List[str]]])
+async def get_common_availability_batch(payload: schemas.BatchAvailabilityRequest, session_factory=Depends(get_async_sessionmaker)):
+    queries = [
+        (
+            query.user_ids,
+            datetime.strptime(query.startdate, "%d-%m-%Y").date(),
+            datetime.strptime(query.enddate, "%d-%m-%Y").date(),
+            query.timezone,
+            query.backend,
+            query.resolution,
+        )
+        for query in payload.queries
+    ]
+    return await crud.get_common_availability_batch(session_factory, queries)
+
+
+# Same result as /common-availability/, streamed as one NDJSON line per date:
+# {"date": "dd-mm-yyyy", "slots": [...]}. Data is loaded window_days at a time.
+@router.post("/common-availability/stream/")
+def stream_common_availability(payload: schemas.AvailabilityRequest, window_days: int = Query(7, ge=1, le=366)):
+    start_date_obj = datetime.strptime(payload.startdate, "%d-%m-%Y").date()
+    end_date_obj = datetime.strptime(payload.enddate, "%d-%m-%Y").date()
+
+    # Reject bad arguments before the response starts, while a status code can still be sent
+    crud.check_common_availability_args(payload.timezone, payload.backend, payload.resolution)
+
+    def generate():
+        # The stream outlives the request's dependencies, so it owns its session
+        db = SessionLocal()
+        try:
+            for date_str, slots in crud.iter_common_availability(
+                db, payload.user_ids, start_date_obj, end_date_obj, payload.timezone,
+                backend=payload.backend, resolution=payload.resolution, window_days=window_days
+            ):
+                yield json.dumps({"date": date_str, "slots": slots}) + "\n"
+        finally:
+            db.close()
+
+    return StreamingResponse(generate(), media_type="application/x-ndjson")
+
+
+
+
+# The first count slots of duration minutes when every user is free, earliest first
+@router.post("/common-availability/slots/", response_model=List[schemas.MeetingSlot])
+def find_meeting_slots(payload: schemas.MeetingSlotRequest, db: Session = Depends(get_db)):
+    start_date_obj = datetime.strptime(payload.startdate, "%d-%m-%Y").date()
+    end_date_obj = datetime.strptime(payload.enddate, "%d-%m-%Y").date()
+
+    meetings = crud.find_meeting_slots(
+        db, payload.user_ids, start_date_obj, end_date_obj, payload.timezone,
+        payload.duration, payload.count, payload.day_start, payload.day_end
+    )
+    return [
+        {"date": slot_date.strftime("%d-%m-%Y"), "slot": intervals.format_interval(meeting)}
+        for slot_date, meeting in meetings
+    ]
+
+
+# Windows when at least min_attendees users (all required ones among them) are free, most attendees first
+@router.post("/common-availability/quorum/", response_model=List[schemas.QuorumSlot])
+def get_quorum_availability(payload: schemas.QuorumAvailabilityRequest, db: Session = Depends(get_db)):
+    start_date_obj = datetime.strptime(payload.startdate, "%d-%m-%Y").date()
+    end_date_obj = datetime.strptime(payload.enddate, "%d-%m-%Y").date()
+
+    return crud.get_quorum_availability(
+        db, payload.required_user_ids, payload.optional_user_ids, start_date_obj, end_date_obj,
+        payload.timezone, payload.min_attendees, payload.min_duration
+    )
+
 
-    return available_slots
+# Prometheus text format
+@router.get("/metrics", response_class=PlainTextResponse)
+def get_metrics():
+    return PlainTextResponse(metrics.render_prometheus(), media_type="text/plain; version=0.0.4")
 
 
+app = create_app()
 
 
 # extra working on 
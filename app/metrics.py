@@ -0,0 +1,165 @@
+# app/metrics.py
+import bisect
+import os
+import threading
+import time
+from contextlib import contextmanager
+from contextvars import ContextVar
+from typing import Callable, Dict, Iterator, List, Optional, Tuple
+
+
+# Add a Server-Timing header with the phases of each request
+TIMING_HEADERS = os.getenv("TIMING_HEADERS", "").lower() in ("1", "true", "yes")
+
+DEFAULT_BUCKETS = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+
+LabelValues = Tuple[Tuple[str, str], ...]
+
+
+def _labels(labels: Dict[str, object]) -> LabelValues:
+    return tuple(sorted((key, str(value)) for key, value in labels.items()))
+
+
+def _format_labels(labels: LabelValues, extra: str = "") -> str:
+    parts = [f'{key}="{value}"' for key, value in labels]
+    if extra:
+        parts.append(extra)
+    return "{" + ",".join(parts) + "}" if parts else ""
+
+
+class Counter:
+    def __init__(self, name: str, documentation: str):
+        self.name = name
+        self.documentation = documentation
+        self._values: Dict[LabelValues, float] = {}
+        self._lock = threading.Lock()
+
+    def inc(self, amount: float = 1, **labels) -> None:
+        key = _labels(labels)
+        with self._lock:
+            self._values[key] = self._values.get(key, 0) + amount
+
+    def render(self) -> List[str]:
+        lines = [f"# HELP {self.name} {self.documentation}", f"# TYPE {self.name} counter"]
+        with self._lock:
+            for labels, value in sorted(self._values.items()):
+                lines.append(f"{self.name}{_format_labels(labels)} {value}")
+        return lines
+
+
+class Gauge:
+    """ A value read when metrics are rendered, from a callback returning {labels: value}. """
+
+    def __init__(self, name: str, documentation: str, collect: Callable[[], Dict[LabelValues, float]]):
+        self.name = name
+        self.documentation = documentation
+        self.collect = collect
+
+    def render(self) -> List[str]:
+        lines = [f"# HELP {self.name} {self.documentation}", f"# TYPE {self.name} gauge"]
+        for labels, value in sorted(self.collect().items()):
+            lines.append(f"{self.name}{_format_labels(labels)} {value}")
+        return lines
+
+
+class Histogram:
+    def __init__(self, name: str, documentation: str, buckets: Tuple[float, ...] = DEFAULT_BUCKETS):
+        self.name = name
+        self.documentation = documentation
+        self.buckets = buckets
+        # labels -> (per-bucket counts, with a last +Inf bucket; sum; count)
+        self._values: Dict[LabelValues, list] = {}
+        self._lock = threading.Lock()
+
+    def observe(self, value: float, **labels) -> None:
+        key = _labels(labels)
+        with self._lock:
+            entry = self._values.get(key)
+            if entry is None:
+                entry = self._values[key] = [[0] * (len(self.buckets) + 1), 0.0, 0]
+            entry[0][bisect.bisect_left(self.buckets, value)] += 1
+            entry[1] += value
+            entry[2] += 1
+
+    def render(self) -> List[str]:
+        lines = [f"# HELP {self.name} {self.documentation}", f"# TYPE {self.name} histogram"]
+        with self._lock:
+            for labels, (counts, total, count) in sorted(self._values.items()):
+                cumulative = 0
+                for bound, bucket_count in zip(self.buckets + (float("inf"),), counts):
+                    cumulative += bucket_count
+                    le = "+Inf" if bound == float("inf") else repr(bound)
+                    bucket_label = f'le="{le}"'
+                    lines.append(f"{self.name}_bucket{_format_labels(labels, bucket_label)} {cumulative}")
+                lines.append(f"{self.name}_sum{_format_labels(labels)} {total}")
+                lines.append(f"{self.name}_count{_format_labels(labels)} {count}")
+        return lines
+
+
+REGISTRY: list = []
+
+
+def register(metric):
+    REGISTRY.append(metric)
+    return metric
+
+
+def render_prometheus() -> str:
+    lines = []
+    for metric in REGISTRY:
+        lines.extend(metric.render())
+    return "\n".join(lines) + "\n"
+
+
+PHASE_SECONDS = register(Histogram("availability_phase_seconds", "Time spent per phase of an operation."))
+REQUEST_SECONDS = register(Histogram("http_request_duration_seconds", "HTTP request latency by route."))
+ROWS_LOADED = register(Counter("availability_rows_loaded_total", "Rows read from the database, by table."))
+ROWS_WRITTEN = register(Counter("availability_rows_written_total", "Rows inserted, by table."))
+SLOTS_PROCESSED = register(Counter("availability_slots_processed_total", "Intervals produced by expanding users' availability."))
+
+
+# Phase timings of the request being handled, for the Server-Timing header
+_request_timings: ContextVar[Optional[Dict[str, float]]] = ContextVar("request_timings", default=None)
+
+
+class Phases:
+    """ Accumulates the time spent in each phase of one operation, e.g.
+
+            phases = Phases("common_availability")
+            with phases("expand"):
+                ...
+            phases.record()
+
+        A phase entered several times (once per user) is recorded once, with its total.
+    """
+
+    def __init__(self, operation: str):
+        self.operation = operation
+        self.totals: Dict[str, float] = {}
+
+    @contextmanager
+    def __call__(self, phase: str) -> Iterator[None]:
+        started = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.totals[phase] = self.totals.get(phase, 0.0) + time.perf_counter() - started
+
+    def record(self) -> None:
+        timings = _request_timings.get()
+        for phase, seconds in self.totals.items():
+            PHASE_SECONDS.observe(seconds, operation=self.operation, phase=phase)
+            if timings is not None:
+                timings[phase] = timings.get(phase, 0.0) + seconds
+
+
+def start_request_timings() -> Dict[str, float]:
+    timings: Dict[str, float] = {}
+    _request_timings.set(timings)
+    return timings
+
+
+def server_timing_header(timings: Dict[str, float], total: float) -> str:
+    entries = [f"{phase};dur={seconds * 1000:.2f}" for phase, seconds in timings.items()]
+    entries.append(f"total;dur={total * 1000:.2f}")
+    return ", ".join(entries)
@@ -1,5 +1,7 @@
-from sqlalchemy import Column, Integer, String, ForeignKey, Date, Time, UniqueConstraint
+from sqlalchemy import Column, Integer, String, ForeignKey, Date, Time, UniqueConstraint, Index, DDL, event
+from sqlalchemy.ext.compiler import compiles
 from sqlalchemy.orm import relationship
+from sqlalchemy.sql.expression import FunctionElement
 from sqlalchemy.types import Boolean
 from app.database import Base
 
@@ -29,13 +31,16 @@ class GeneralAvailability(Base):
     start_time = Column(Time, nullable=False)  # Start time for the availability
     end_time = Column(Time, nullable=False)    # End time for the availability
     time_zone = Column(String, nullable=False)  # Specific timezone for the availability
+    utc_offset = Column(Integer, nullable=True)  # Minutes east of UTC used to convert start/end time to UTC
 
     # Relationship
     user = relationship("User", back_populates="general_availability")
 
-    # Ensure uniqueness per user, day, start time, and end time
+    # Ensure uniqueness per user, day, start time, and end time. The stored UTC times are only comparable
+    # within a zone and offset: the same UTC times saved in summer and in winter are different local times.
+    # Its index also serves the read path, user_id IN (...): it holds every column read, so it covers it
     __table_args__ = (
-        UniqueConstraint("user_id", "day", "start_time", "end_time", name="unique_general_availability"),
+        UniqueConstraint("user_id", "day", "time_zone", "utc_offset", "start_time", "end_time", name="unique_general_availability"),
     )
 
 
@@ -49,13 +54,16 @@ class CustomAvailability(Base):
     start_time = Column(Time, nullable=False)  # Start time
     end_time = Column(Time, nullable=False)    # End time
     time_zone = Column(String, nullable=False)  # Specific timezone
+    utc_date = Column(Date, nullable=False)  # UTC date start_time falls on, which slots are compared for overlaps on
 
     # Relationship
     user = relationship("User", back_populates="custom_availability")
 
-    # Ensure uniqueness per user, date, start time, and end time
+    # Ensure uniqueness per user, UTC date, start time, and end time: the same instant, whatever the zone
     __table_args__ = (
-        UniqueConstraint("user_id", "date", "start_time", "end_time", name="unique_custom_availability"),
+        UniqueConstraint("user_id", "utc_date", "start_time", "end_time", name="unique_custom_availability"),
+        # Read path: user_id IN (...) AND date BETWEEN ..., which the unique key on utc_date can't serve
+        Index("ix_custom_availability_user_id_date", "user_id", "date", postgresql_include=["start_time", "end_time", "time_zone"]),
     )
 
 
@@ -73,7 +81,129 @@ class Schedule(Base):
     # Relationship
     user = relationship("User", back_populates="schedules")
 
-    # Prevent overlapping or duplicate schedules for the same user
+    # Prevent overlapping or duplicate schedules for the same user. Its index also serves the read path,
+    # user_id IN (...) AND date BETWEEN ..., and covers it
     __table_args__ = (
         UniqueConstraint("user_id", "date", "start_time", "end_time", name="unique_schedule"),
     )
+
+
+
+# Daily Availability Table (Materialized)
+class DailyAvailability(Base):
+    """ Each user's availability expanded per UTC date over a rolling horizon, so reads are a range scan
+        instead of expanding the weekly rules and custom dates. Derived data: it is rebuilt from
+        general_availability and custom_availability, see crud.materialize_availability.
+    """
+    __tablename__ = "daily_availability"
+
+    user_id = Column(Integer, ForeignKey("users.id"), primary_key=True)
+    date = Column(Date, primary_key=True)  # UTC date
+    slots = Column(String, nullable=False)  # UTC minutes of the day, "540-720,780-1020"; empty when not available
+
+
+# Overlapping availability slots of a user are rejected by the database itself, so concurrent writers
+# can't both pass the check in crud. A slot whose end is not after its start crosses midnight and covers
+# both ends of the day. Postgres uses exclusion constraints over the slot as a multirange (needs
+# btree_gist, Postgres 14+), SQLite a trigger with the same test as crud.slots_overlap.
+#
+# Weekly rules of a day are compared on their stored UTC times, except against rules of the same zone:
+# those are compared in the zone's wall-clock time (stored time + utc_offset), since their UTC times depend
+# on the offset on the day each was saved and summer and winter rules don't line up in UTC.
+#
+# Custom slots are compared as UTC time on the UTC date they start on (utc_date), so slots of any zone
+# line up. A slot crossing midnight runs into the next UTC date rather than covering both ends of its own,
+# so it meets slots of the day after, and slots of the day before that cross midnight too. Postgres
+# compares them as timestamp ranges, SQLite with the same test as crud.custom_slot_overlap_filter.
+class rule_local_time(FunctionElement):
+    """ SQL expression: rule_local_time(time, utc_offset) is the wall-clock time of a weekly rule stored
+        as time (UTC), wrapping around midnight. Rows stored before utc_offset existed count as UTC.
+    """
+    type = Time()
+    name = "rule_local_time"
+    inherit_cache = True
+
+
+def _local_time_sql(value: str, utc_offset: str, dialect: str) -> str:
+    if dialect == "postgresql":
+        return f"({value} + COALESCE({utc_offset}, 0) * INTERVAL '1 minute')"
+    return f"time({value}, COALESCE({utc_offset}, 0) || ' minutes')"
+
+
+@compiles(rule_local_time)
+def _compile_rule_local_time(element, compiler, **kw):
+    return _local_time_sql(*(compiler.process(clause, **kw) for clause in element.clauses), compiler.dialect.name)
+
+
+def _slot_multirange(start: str, end: str) -> str:
+    return (
+        f"CASE WHEN {end} > {start} "
+        f"THEN tsmultirange(tsrange(DATE '2000-01-01' + {start}, DATE '2000-01-01' + {end})) "
+        f"ELSE tsmultirange(tsrange(DATE '2000-01-01' + {start}, TIMESTAMP '2000-01-02 00:00'), "
+        f"tsrange(TIMESTAMP '2000-01-01 00:00', DATE '2000-01-01' + {end})) END"
+    )
+
+
+def _sqlite_slots_overlap(start: str, end: str, existing_start: str, existing_end: str) -> str:
+    return (
+        f"(({end} <= {start} AND ({existing_end} <= {existing_start} OR {existing_end} > {start} OR {existing_start} < {end})) OR "
+        f"({end} > {start} AND {existing_end} <= {existing_start} AND ({existing_end} > {start} OR {existing_start} < {end})) OR "
+        f"({end} > {start} AND {existing_end} > {existing_start} AND {existing_start} < {end} AND {existing_end} > {start}))"
+    )
+
+
+def _sqlite_overlap_condition(table: str) -> str:
+    utc_overlap = _sqlite_slots_overlap("NEW.start_time", "NEW.end_time", "e.start_time", "e.end_time")
+    if table == "general_availability":
+        local_overlap = _sqlite_slots_overlap(*(
+            _local_time_sql(f"{alias}.{column}", f"{alias}.utc_offset", "sqlite")
+            for alias in ("NEW", "e") for column in ("start_time", "end_time")
+        ))
+        condition = (
+            f"e.day = NEW.day AND ((e.time_zone = NEW.time_zone AND {local_overlap}) OR "
+            f"(e.time_zone <> NEW.time_zone AND {utc_overlap}))"
+        )
+    else:
+        condition = (
+            "((e.utc_date = NEW.utc_date AND (e.end_time <= e.start_time OR NEW.start_time < e.end_time) "
+            "AND (NEW.end_time <= NEW.start_time OR e.start_time < NEW.end_time)) OR "
+            "(e.utc_date = date(NEW.utc_date, '-1 day') AND e.end_time <= e.start_time AND NEW.start_time < e.end_time) OR "
+            "(e.utc_date = date(NEW.utc_date, '+1 day') AND NEW.end_time <= NEW.start_time AND e.start_time < NEW.end_time))"
+        )
+    return f"EXISTS (SELECT 1 FROM {table} e WHERE e.user_id = NEW.user_id AND e.id IS NOT NEW.id AND {condition})"
+
+
+def no_overlap_ddl(table: str, dialect: str) -> list:
+    if dialect == "postgresql":
+        if table == "general_availability":
+            utc_slot = _slot_multirange("start_time", "end_time")
+            local_slot = _slot_multirange(*(_local_time_sql(column, "utc_offset", dialect) for column in ("start_time", "end_time")))
+            exclusions = [
+                ("", f"day WITH =, time_zone WITH =, ({local_slot}) WITH &&"),
+                ("_across_zones", f"day WITH =, time_zone WITH <>, ({utc_slot}) WITH &&"),
+            ]
+        else:
+            utc_range = (
+                "tsrange(utc_date + start_time, "
+                "CASE WHEN end_time > start_time THEN utc_date + end_time ELSE utc_date + 1 + end_time END)"
+            )
+            exclusions = [("", f"({utc_range}) WITH &&")]
+        return ["CREATE EXTENSION IF NOT EXISTS btree_gist"] + [
+            f"ALTER TABLE {table} ADD CONSTRAINT exclude_overlapping_{table}{suffix} "
+            f"EXCLUDE USING gist (user_id WITH =, {exclusion})"
+            for suffix, exclusion in exclusions
+        ]
+    if dialect == "sqlite":
+        return [
+            f"CREATE TRIGGER no_overlap_{table}_{operation.lower()} BEFORE {operation} ON {table} "
+            f"WHEN {_sqlite_overlap_condition(table)} "
+            f"BEGIN SELECT RAISE(ABORT, 'overlapping {table}'); END"
+            for operation in ("INSERT", "UPDATE")
+        ]
+    return []
+
+
+for _model in (GeneralAvailability, CustomAvailability):
+    for _dialect in ("postgresql", "sqlite"):
+        for _statement in no_overlap_ddl(_model.__tablename__, _dialect):
+            event.listen(_model.__table__, "after_create", DDL(_statement).execute_if(dialect=_dialect))
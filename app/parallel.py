@@ -0,0 +1,152 @@
+# app/parallel.py
+import os
+import threading
+from datetime import date, timedelta
+from typing import Dict, List, Tuple
+
+from app.availability import UserAvailability, busy_by_date, intersect_by_date, subtract_busy
+from app.intervals import Interval
+
+
+# Processes used to compute common availability of large requests; 0 keeps everything in-process
+PARALLEL_WORKERS = int(os.getenv("PARALLEL_WORKERS", "0"))
+
+# Requests smaller than this many user-days stay in-process, where they are faster than a round trip to the pool
+PARALLEL_MIN_USER_DAYS = int(os.getenv("PARALLEL_MIN_USER_DAYS", "50000"))
+
+# Compact, picklable forms of the inputs and outputs. Everything is flattened into tuples of ints, which
+# pickle far smaller and faster than dates, dicts of lists and ORM rows:
+#   availability  (zones, weekly: 7 x (start, end, zone, ...), custom: ((date ordinal, (start, end, zone, ...)), ...))
+#   events        (date ordinal, start minute, end minute, ...) in UTC
+#   slots         ((date ordinal, (start, end, ...)), ...)
+PackedAvailability = Tuple[Tuple[str, ...], Tuple[Tuple[int, ...], ...], Tuple[Tuple[int, Tuple[int, ...]], ...]]
+PackedEvents = Tuple[int, ...]
+PackedSlots = Tuple[Tuple[int, Tuple[int, ...]], ...]
+
+_executor = None  # concurrent.futures.ProcessPoolExecutor, created on first use
+_executor_lock = threading.Lock()
+
+
+def _flatten(pieces) -> Tuple[int, ...]:
+    return tuple(value for piece in pieces for value in piece)
+
+
+def _triples(values: Tuple[int, ...]) -> List[Tuple[int, int, int]]:
+    return list(zip(values[0::3], values[1::3], values[2::3]))
+
+
+def pack_availability(user_availability: UserAvailability, start_date: date, end_date: date) -> PackedAvailability:
+    # Custom slots outside start_date..end_date (plus a day each side for time zone shifts) are left out
+    first, last = (start_date - timedelta(days=1)).toordinal(), (end_date + timedelta(days=1)).toordinal()
+    return (
+        tuple(user_availability.zones),
+        tuple(_flatten(pieces) for pieces in user_availability.weekly),
+        tuple(
+            (custom_date.toordinal(), _flatten(pieces))
+            for custom_date, pieces in user_availability.custom.items()
+            if first <= custom_date.toordinal() <= last
+        ),
+    )
+
+
+def unpack_availability(packed: PackedAvailability) -> UserAvailability:
+    zones, weekly, custom = packed
+    user_availability = UserAvailability()
+    user_availability.zones = list(zones)
+    user_availability.weekly = [_triples(pieces) for pieces in weekly]
+    user_availability.custom = {date.fromordinal(ordinal): _triples(pieces) for ordinal, pieces in custom}
+    return user_availability
+
+
+def pack_events(scheduled_events: list, start_date: date, end_date: date) -> PackedEvents:
+    first, last = start_date - timedelta(days=1), end_date + timedelta(days=1)
+    return tuple(
+        value
+        for event_date, start_minute, end_minute in scheduled_events if first <= event_date <= last
+        for value in (event_date.toordinal(), start_minute, end_minute)
+    )
+
+
+def _compute_shard(packed_users: List[PackedAvailability], packed_events: List[PackedEvents], start_ordinal: int, end_ordinal: int, tz: str, backend: str, resolution: int) -> Tuple[int, PackedSlots]:
+    # Runs in a worker process: the same expand / subtract / intersect steps as crud.compute_common_slots
+    start_date, end_date = date.fromordinal(start_ordinal), date.fromordinal(end_ordinal)
+    user_availability = []
+    slots_processed = 0
+    for packed, events in zip(packed_users, packed_events):
+        user_slots = unpack_availability(packed).expand(start_date, end_date, tz)
+        busy = busy_by_date(((date.fromordinal(ordinal), start, end) for ordinal, start, end in _triples(events)), tz)
+        user_availability.append(subtract_busy(user_slots, busy))
+        slots_processed += sum(len(slots) for slots in user_slots.values())
+
+    if backend == "bitmap":
+        from app.bitmap import common_availability_bitmap
+        common_slots_by_date = common_availability_bitmap(user_availability, start_date, end_date, resolution)
+    else:
+        common_slots_by_date = intersect_by_date(user_availability, start_date, end_date)
+    return slots_processed, tuple((slot_date.toordinal(), _flatten(slots)) for slot_date, slots in sorted(common_slots_by_date.items()))
+
+
+def get_executor():
+    global _executor
+    with _executor_lock:
+        if _executor is None:
+            # Imported here: most processes never shard, and multiprocessing adds to every worker's boot
+            import multiprocessing
+            from concurrent.futures import ProcessPoolExecutor
+
+            # spawn rather than fork: forking a server process that holds threads and open connections is unsafe
+            _executor = ProcessPoolExecutor(max_workers=PARALLEL_WORKERS, mp_context=multiprocessing.get_context("spawn"))
+        return _executor
+
+
+def shutdown() -> None:
+    global _executor
+    with _executor_lock:
+        if _executor is not None:
+            _executor.shutdown()
+            _executor = None
+
+
+def should_shard(user_count: int, start_date: date, end_date: date) -> bool:
+    days = (end_date - start_date).days + 1
+    return PARALLEL_WORKERS > 1 and days > 1 and user_count * days >= PARALLEL_MIN_USER_DAYS
+
+
+def shard_dates(start_date: date, end_date: date, shards: int) -> List[Tuple[date, date]]:
+    # Contiguous, nearly equal date ranges covering start_date..end_date, in order
+    days = (end_date - start_date).days + 1
+    shards = max(1, min(shards, days))
+    size, extra = divmod(days, shards)
+    ranges = []
+    shard_start = start_date
+    for index in range(shards):
+        shard_end = shard_start + timedelta(days=size + (1 if index < extra else 0) - 1)
+        ranges.append((shard_start, shard_end))
+        shard_start = shard_end + timedelta(days=1)
+    return ranges
+
+
+def compute_common_slots_sharded(compiled_availability: Dict[int, UserAvailability], user_events: Dict[int, list], user_ids: List[int], start_date: date, end_date: date, tz: str, backend: str = "interval", resolution: int = 15) -> Tuple[int, Dict[date, List[Interval]]]:
+    """ crud.compute_common_slots split by date range across the process pool.
+
+        Each date is independent of the others, so every shard gets its dates and only the custom slots
+        and events near them, computes common slots in a worker, and the results are merged back in date
+        order. Returns (slots processed, common slots per date).
+    """
+    futures = []
+    executor = get_executor()
+    for shard_start, shard_end in shard_dates(start_date, end_date, PARALLEL_WORKERS):
+        packed_users = [pack_availability(compiled_availability[user_id], shard_start, shard_end) for user_id in user_ids]
+        packed_events = [pack_events(user_events[user_id], shard_start, shard_end) for user_id in user_ids]
+        futures.append(executor.submit(
+            _compute_shard, packed_users, packed_events, shard_start.toordinal(), shard_end.toordinal(), tz, backend, resolution
+        ))
+
+    slots_processed = 0
+    common_slots_by_date: Dict[date, List[Interval]] = {}
+    for future in futures:
+        shard_slots_processed, packed_slots = future.result()
+        slots_processed += shard_slots_processed
+        for ordinal, flat in packed_slots:
+            common_slots_by_date[date.fromordinal(ordinal)] = list(zip(flat[0::2], flat[1::2]))
+    return slots_processed, common_slots_by_date
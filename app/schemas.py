@@ -2,7 +2,7 @@
 from pydantic import BaseModel
 from datetime import datetime
 from datetime import time, date
-from typing import List, Dict
+from typing import List, Dict, Optional
 
 
 class UserCreate(BaseModel):
@@ -51,11 +51,62 @@ class CustomAvailabilityResponse(CustomAvailabilityBase):
 
 
 
+class BulkRowError(BaseModel):
+    index: int  # Position of the row in the submitted batch
+    detail: str
+
+class BulkInsertResponse(BaseModel):
+    inserted: int
+    errors: List[BulkRowError]
+
+
+class CalendarImportResponse(BaseModel):
+    events: int  # VEVENTs read from the file
+    skipped: int  # Cancelled, free (TRANSP:TRANSPARENT) or zero-length events
+    inserted: int  # Schedules rows written, one per occurrence and UTC date
+    errors: List[BulkRowError]  # index: position of the event in the file, -1 for the file as a whole
+
+
+
 class AvailabilityRequest(BaseModel):
     user_ids: List[int]
     startdate: str  # Date in dd-mm-yyyy format
     enddate: str    # Date in dd-mm-yyyy format
     timezone: str   # Time zone, e.g., 'Asia/Kolkata'
+    backend: str = "interval"  # "interval" (exact) or "bitmap" (numpy, for very large groups)
+    resolution: int = 15  # Bucket size in minutes for the bitmap backend
+
+class BatchAvailabilityRequest(BaseModel):
+    queries: List[AvailabilityRequest]  # Answered in this order
+
+class MeetingSlotRequest(BaseModel):
+    user_ids: List[int]
+    startdate: str  # Date in dd-mm-yyyy format
+    enddate: str    # Date in dd-mm-yyyy format
+    timezone: str   # Time zone, e.g., 'Asia/Kolkata'
+    duration: int   # Meeting length in minutes
+    count: int = 3  # Number of slots to return
+    day_start: Optional[time] = None  # Working hours in the requested time zone, e.g. 09:00
+    day_end: Optional[time] = None
+
+class MeetingSlot(BaseModel):
+    date: str  # Date in dd-mm-yyyy format
+    slot: str  # e.g. "09:00AM-09:45AM"
+
+class QuorumAvailabilityRequest(BaseModel):
+    required_user_ids: List[int] = []  # Users who must attend every window
+    optional_user_ids: List[int] = []
+    startdate: str  # Date in dd-mm-yyyy format
+    enddate: str    # Date in dd-mm-yyyy format
+    timezone: str   # Time zone, e.g., 'Asia/Kolkata'
+    min_attendees: int  # Smallest number of free users, required ones included
+    min_duration: int = 0  # Drop windows shorter than this many minutes
+
+class QuorumSlot(BaseModel):
+    date: str  # Date in dd-mm-yyyy format
+    slot: str
+    attendees: List[int]  # Users free for the whole window
+    missing: List[int]
 
 class CommonAvailabilityResponse(BaseModel):
     date: Dict[str, List[str]]  # Date as key and available time slots as list
@@ -0,0 +1,56 @@
+# app/timezones.py
+from datetime import date, datetime, time, timedelta
+from functools import lru_cache
+from typing import Tuple
+
+import pytz
+
+from app import metrics
+from app.intervals import MINUTES_PER_DAY, time_to_minutes
+
+
+@lru_cache(maxsize=None)
+def get_timezone(name: str) -> pytz.BaseTzInfo:
+    # Raises pytz.UnknownTimeZoneError for names pytz doesn't know
+    return pytz.timezone(name)
+
+
+@lru_cache(maxsize=65536)
+def utc_offset(tz_name: str, on_date: date) -> int:
+    """ Minutes east of UTC in effect in tz_name on on_date.
+
+        Taken at local noon: DST changes happen at night, so this is the offset that holds for the
+        working part of the day. Cached per (tz, date), so converting a range costs one lookup per
+        day rather than a localize() per slot.
+    """
+    if tz_name == "UTC":
+        return 0
+    local_noon = get_timezone(tz_name).localize(datetime.combine(on_date, time(12)))
+    return int(local_noon.utcoffset().total_seconds()) // 60
+
+
+def minutes_to_time(minutes: int) -> time:
+    hour, minute = divmod(minutes % MINUTES_PER_DAY, 60)
+    return time(hour, minute)
+
+
+def local_to_utc(value: time, tz_name: str, on_date: date) -> time:
+    """ Wall-clock time in tz_name on on_date converted to UTC, wrapping around midnight. """
+    return minutes_to_time(time_to_minutes(value) - utc_offset(tz_name, on_date))
+
+
+def local_to_utc_date(value: time, tz_name: str, on_date: date) -> Tuple[date, time]:
+    """ local_to_utc with the UTC date the time lands on: on_date, or the day before or after it when
+        the conversion crosses midnight.
+    """
+    days, minutes = divmod(time_to_minutes(value) - utc_offset(tz_name, on_date), MINUTES_PER_DAY)
+    return on_date + timedelta(days=days), minutes_to_time(minutes)
+
+
+def _offset_cache_stats():
+    info = utc_offset.cache_info()
+    return {(("stat", "hits"),): info.hits, (("stat", "misses"),): info.misses, (("stat", "size"),): info.currsize}
+
+
+# Misses are the pytz localize() calls; a high miss rate means timezone conversion is a real cost
+metrics.register(metrics.Gauge("timezone_offset_cache", "Per-(tz, date) UTC offset cache.", _offset_cache_stats))
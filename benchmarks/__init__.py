@@ -0,0 +1,11 @@
+""" Reproducible benchmarks for the availability endpoints.
+
+    python -m benchmarks.run                          # time every scale, print a summary
+    python -m benchmarks.run --save-baseline          # store the results as benchmarks/baseline.json
+    python -m benchmarks.run --compare                # fail if anything got slower than the baseline
+    python -m benchmarks.load                         # requests/sec and tail latency of the running app
+
+Every run seeds a fresh SQLite database with synthetic users (see benchmarks.seed), so numbers are
+comparable between runs on the same machine. benchmarks.load seeds the same way and drives the app
+through uvicorn and concurrent HTTP clients instead of calling crud.
+"""
@@ -0,0 +1,158 @@
+""" Time crud.get_common_availability and the ingestion paths across data scales.
+
+Results are written as JSON and can be stored as a baseline and compared against it; see benchmarks/__init__.py.
+"""
+import argparse
+import json
+import os
+import platform
+import statistics
+import sys
+import tempfile
+import time
+from datetime import date, timedelta
+from typing import Callable, Dict, List
+
+DEFAULT_BASELINE = os.path.join(os.path.dirname(__file__), "baseline.json")
+
+
+def measure(function: Callable, repeat: int) -> float:
+    timings = []
+    for _ in range(repeat):
+        started = time.perf_counter()
+        function()
+        timings.append(time.perf_counter() - started)
+    return statistics.median(timings)
+
+
+def run_benchmarks(args) -> List[Dict]:
+    # app.database reads DATABASE_URL on import, so the throwaway database has to be set first
+    os.environ["DATABASE_URL"] = f"sqlite:///{os.path.join(tempfile.mkdtemp(), 'benchmark.sqlite')}"
+    from app import crud, models, schemas
+    from app.cache import availability_cache
+    from app.database import SessionLocal, init_engines
+    from benchmarks.seed import SeedConfig, seed_database
+
+    engine = init_engines()
+    models.Base.metadata.create_all(bind=engine)
+    config = SeedConfig(users=max(args.users), days=max(args.days), seed=args.seed)
+    db = SessionLocal()
+    seed_database(db, config)
+
+    backends = ["interval"]
+    try:
+        import numpy  # noqa: F401
+        backends.append("bitmap")
+    except ImportError:
+        pass
+
+    results = []
+
+    def record(name: str, seconds: float, **params):
+        results.append({"name": name, "seconds": round(seconds, 6), **params})
+        print(f"{name:<28} {json.dumps(params):<45} {seconds * 1000:10.2f} ms")
+
+    for users in args.users:
+        user_ids = list(range(1, users + 1))
+        for days in args.days:
+            start_date = config.start_date
+            end_date = start_date + timedelta(days=days - 1)
+            for backend in backends:
+                def query():
+                    crud.get_common_availability(db, user_ids, start_date, end_date, "UTC", backend=backend)
+
+                def cold_query():
+                    availability_cache.clear()
+                    query()
+
+                record("common_availability_cold", measure(cold_query, args.repeat), users=users, days=days, backend=backend)
+                record("common_availability_warm", measure(query, args.repeat), users=users, days=days, backend=backend)
+
+    # Ingestion: weekly schedules for fresh users, one bulk call vs one create per row
+    next_user_id = config.users + 1
+    for users in args.users:
+        def new_users(count: int) -> List[int]:
+            nonlocal next_user_id
+            ids = list(range(next_user_id, next_user_id + count))
+            next_user_id += count
+            db.add_all(models.User(id=user_id, name=f"user {user_id}", email=f"user{user_id}@example.com", time_zone="UTC") for user_id in ids)
+            db.commit()
+            return ids
+
+        def weekly_rows(ids: List[int]) -> List[schemas.GeneralAvailabilityCreate]:
+            return [
+                schemas.GeneralAvailabilityCreate(user_id=user_id, day=day, start_time="09:00", end_time="17:00", time_zone="UTC")
+                for user_id in ids for day in ("Monday", "Tuesday", "Wednesday", "Thursday", "Friday")
+            ]
+
+        def bulk_ingest():
+            crud.bulk_create_general_availability(db, weekly_rows(new_users(users)))
+
+        record("ingest_bulk", measure(bulk_ingest, args.repeat), users=users, rows=users * 5)
+
+        # The per-row path is slow by design; keep it to the smaller scales
+        if users <= args.max_single_row_users:
+            def single_row_ingest():
+                for row in weekly_rows(new_users(users)):
+                    crud.create_general_availability(db, row)
+
+            record("ingest_single_row", measure(single_row_ingest, args.repeat), users=users, rows=users * 5)
+
+    db.close()
+    return results
+
+
+def result_key(result: Dict) -> str:
+    return json.dumps({key: value for key, value in result.items() if key != "seconds"}, sort_keys=True)
+
+
+def compare(results: List[Dict], baseline: Dict, tolerance: float) -> List[str]:
+    """ Messages for the results slower than their baseline by more than tolerance (0.2 = 20%). """
+    previous = {result_key(result): result["seconds"] for result in baseline["results"]}
+    regressions = []
+    for result in results:
+        before = previous.get(result_key(result))
+        if before and result["seconds"] > before * (1 + tolerance):
+            regressions.append(f"{result_key(result)}: {before * 1000:.2f} ms -> {result['seconds'] * 1000:.2f} ms")
+    return regressions
+
+
+def main() -> int:
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--users", type=lambda value: [int(v) for v in value.split(",")], default=[10, 100, 1000], help="comma separated group sizes")
+    parser.add_argument("--days", type=lambda value: [int(v) for v in value.split(",")], default=[7, 30, 365], help="comma separated range lengths")
+    parser.add_argument("--repeat", type=int, default=3, help="runs per measurement, the median is kept")
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--max-single-row-users", type=int, default=100, help="largest scale timed through the per-row create path")
+    parser.add_argument("--output", help="write the results to this JSON file")
+    parser.add_argument("--baseline", default=DEFAULT_BASELINE)
+    parser.add_argument("--save-baseline", action="store_true", help="store the results as the baseline")
+    parser.add_argument("--compare", action="store_true", help="exit non-zero if a result regressed against the baseline")
+    parser.add_argument("--tolerance", type=float, default=0.2)
+    args = parser.parse_args()
+
+    report = {
+        "created": date.today().isoformat(),
+        "python": platform.python_version(),
+        "machine": platform.machine(),
+        "results": run_benchmarks(args),
+    }
+
+    for path in filter(None, [args.output, args.baseline if args.save_baseline else None]):
+        with open(path, "w") as f:
+            json.dump(report, f, indent=2)
+
+    if args.compare:
+        if not os.path.exists(args.baseline):
+            print(f"No baseline at {args.baseline}, run with --save-baseline first")
+            return 1
+        with open(args.baseline) as f:
+            regressions = compare(report["results"], json.load(f), args.tolerance)
+        for regression in regressions:
+            print(f"REGRESSION {regression}")
+        return 1 if regressions else 0
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,91 @@
+""" Synthetic data for benchmarks: users with weekly rules, custom dates and scheduled events. """
+import random
+from dataclasses import dataclass
+from datetime import date, time, timedelta
+from typing import Dict, List
+
+from sqlalchemy import insert
+
+from app.models import CustomAvailability, GeneralAvailability, Schedule, User
+
+
+WEEKDAYS = ["Monday", "Tuesday", "Wednesday", "Thursday", "Friday", "Saturday", "Sunday"]
+TIME_ZONES = ["UTC", "Europe/London", "America/New_York", "Asia/Kolkata"]
+
+
+@dataclass
+class SeedConfig:
+    users: int = 1000
+    start_date: date = date(2025, 1, 6)
+    days: int = 365
+    weekly_rules: int = 2         # Slots per working day
+    custom_dates: int = 12        # Dates with custom slots per user over the range
+    schedules: int = 100          # Scheduled events per user over the range
+    seed: int = 0
+
+
+def _slot(rng: random.Random, earliest: int, latest: int, length: int):
+    # A random (start, end) pair of times on a 15-minute grid
+    start = rng.randrange(earliest, latest - length, 15)
+    return time(start // 60, start % 60), time((start + length) // 60, (start + length) % 60)
+
+
+def user_rows(config: SeedConfig, rng: random.Random, user_id: int) -> Dict[str, List[dict]]:
+    """ Rows for one user. Times are stored as UTC with a zero offset, like rules entered in UTC. """
+    rows = {"general": [], "custom": [], "schedules": []}
+
+    # Working days split into weekly_rules consecutive non-overlapping slots between 06:00 and 20:00
+    for day in WEEKDAYS[:5]:
+        start = rng.randrange(6 * 60, 10 * 60, 15)
+        length = (10 * 60) // config.weekly_rules
+        for _ in range(config.weekly_rules):
+            rows["general"].append({
+                "user_id": user_id, "day": day, "time_zone": "UTC", "utc_offset": 0,
+                "start_time": time(start // 60, start % 60),
+                "end_time": time((start + length - 15) // 60, (start + length - 15) % 60),
+            })
+            start += length
+
+    for offset in rng.sample(range(config.days), min(config.custom_dates, config.days)):
+        start_time, end_time = _slot(rng, 8 * 60, 18 * 60, 180)
+        rows["custom"].append({
+            "user_id": user_id, "date": config.start_date + timedelta(days=offset),
+            "start_time": start_time, "end_time": end_time, "time_zone": "UTC",
+            "utc_date": config.start_date + timedelta(days=offset),
+        })
+
+    seen = set()
+    for _ in range(config.schedules):
+        event_date = config.start_date + timedelta(days=rng.randrange(config.days))
+        start_time, end_time = _slot(rng, 8 * 60, 18 * 60, rng.choice([30, 45, 60]))
+        if (event_date, start_time, end_time) in seen:
+            continue  # unique_schedule
+        seen.add((event_date, start_time, end_time))
+        rows["schedules"].append({
+            "user_id": user_id, "date": event_date, "start_time": start_time, "end_time": end_time,
+            "description": "benchmark event",
+        })
+    return rows
+
+
+def seed_database(db, config: SeedConfig) -> List[int]:
+    """ Insert config.users users and their rows with executemany batches. Returns the user ids. """
+    rng = random.Random(config.seed)
+    user_ids = list(range(1, config.users + 1))
+    db.execute(insert(User), [
+        {"id": user_id, "name": f"user {user_id}", "email": f"user{user_id}@example.com", "time_zone": rng.choice(TIME_ZONES)}
+        for user_id in user_ids
+    ])
+
+    batch = {"general": [], "custom": [], "schedules": []}
+    tables = {"general": GeneralAvailability, "custom": CustomAvailability, "schedules": Schedule}
+    for user_id in user_ids:
+        for kind, rows in user_rows(config, rng, user_id).items():
+            batch[kind].extend(rows)
+        if user_id % 500 == 0 or user_id == user_ids[-1]:
+            for kind, rows in batch.items():
+                if rows:
+                    db.execute(insert(tables[kind]), rows)
+                rows.clear()
+    db.commit()
+    return user_ids
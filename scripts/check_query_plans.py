@@ -0,0 +1,128 @@
+""" Query plan regression check for the common availability read path.
+
+Seeds a database with users, weekly rules, custom dates and schedules, then EXPLAINs the queries built by
+crud (custom_availability_query, general_availability_query, scheduled_events_query,
+materialized_availability_query) and fails if any of them stops using the index meant to serve it.
+
+    python scripts/check_query_plans.py                      # throwaway SQLite database
+    DATABASE_URL=postgresql://... python scripts/check_query_plans.py --use-database-url
+
+Against Postgres the tables must be empty or disposable: the check creates the schema and seeds it.
+"""
+import argparse
+import json
+import os
+import random
+import sys
+import tempfile
+from datetime import date, time, timedelta
+
+from sqlalchemy import create_engine, text
+from sqlalchemy.orm import sessionmaker
+
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), "..")))
+
+
+def seed(db, models, users: int = 200, days: int = 60) -> None:
+    rng = random.Random(7)
+    start = date(2025, 1, 6)
+    for user_id in range(1, users + 1):
+        db.add(models.User(id=user_id, name=f"user {user_id}", email=f"user{user_id}@example.com", time_zone="UTC"))
+    db.flush()
+    for user_id in range(1, users + 1):
+        for day in ("Monday", "Tuesday", "Wednesday", "Thursday", "Friday"):
+            db.add(models.GeneralAvailability(user_id=user_id, day=day, start_time=time(9), end_time=time(17), time_zone="UTC", utc_offset=0))
+        for offset in rng.sample(range(days), 10):
+            on_date = start + timedelta(days=offset)
+            db.add(models.CustomAvailability(user_id=user_id, date=on_date, start_time=time(10), end_time=time(12), time_zone="UTC", utc_date=on_date))
+        for offset in rng.sample(range(days), 20):
+            db.add(models.Schedule(user_id=user_id, date=start + timedelta(days=offset), start_time=time(13), end_time=time(14)))
+    db.commit()
+
+
+# Index meant to serve each read-path query, as (table, index or constraint name). The unique constraints
+# of general_availability and schedules hold every column their queries read, so they serve them
+READ_PATH_INDEXES = {
+    "custom_availability": ("custom_availability", "ix_custom_availability_user_id_date"),
+    "general_availability": ("general_availability", "unique_general_availability"),
+    "schedules": ("schedules", "unique_schedule"),
+    "daily_availability": ("daily_availability", "daily_availability_pkey"),
+}
+
+
+def read_path_queries(crud, user_ids, start_date: date, end_date: date) -> dict:
+    return {
+        "custom_availability": crud.custom_availability_query(user_ids, start_date, end_date),
+        "general_availability": crud.general_availability_query(user_ids),
+        "schedules": crud.scheduled_events_query(user_ids, start_date, end_date),
+        "daily_availability": crud.materialized_availability_query(user_ids, start_date, end_date),
+    }
+
+
+def index_name(name: str, dialect: str) -> str:
+    # The name of the query's index in that dialect's plans. SQLite names the index of a table's unique
+    # constraint or composite primary key (each table here has one) sqlite_autoindex_<table>_1
+    table, index = READ_PATH_INDEXES[name]
+    if dialect == "sqlite" and not index.startswith("ix_"):
+        return f"sqlite_autoindex_{table}_1"
+    return index
+
+
+def explain(db, query) -> str:
+    statement = query.compile(dialect=db.bind.dialect, compile_kwargs={"literal_binds": True})
+    if db.bind.dialect.name == "postgresql":
+        return json.dumps(db.execute(text(f"EXPLAIN (FORMAT JSON) {statement}")).scalar())
+    return "\n".join(row[-1] for row in db.execute(text(f"EXPLAIN QUERY PLAN {statement}")))
+
+
+def uses_index(plan: str, dialect: str, index: str = None) -> bool:
+    # With index, the plan must also use that one
+    if index is not None and index not in plan:
+        return False
+    if dialect == "postgresql":
+        return "Seq Scan" not in plan and "Index" in plan
+    # SQLite: "SEARCH table USING [COVERING] INDEX ..." is fine, a bare "SCAN table" is a full table scan
+    return "USING" in plan and "INDEX" in plan and not any(
+        line.strip().startswith("SCAN") and "INDEX" not in line for line in plan.splitlines()
+    )
+
+
+def main() -> int:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--use-database-url", action="store_true", help="check the database in DATABASE_URL instead of a temporary SQLite file")
+    parser.add_argument("-v", "--verbose", action="store_true", help="print every plan")
+    args = parser.parse_args()
+
+    if not args.use_database_url:
+        os.environ["DATABASE_URL"] = f"sqlite:///{os.path.join(tempfile.mkdtemp(), 'plans.sqlite')}"
+
+    from app import crud, models  # After DATABASE_URL is set, app.database reads it on import
+
+    engine = create_engine(os.environ["DATABASE_URL"])
+    models.Base.metadata.create_all(bind=engine)
+    db = sessionmaker(bind=engine)()
+    seed(db, models)
+    db.execute(text("ANALYZE"))
+    if engine.dialect.name == "postgresql":
+        # Seeded tables are small enough that a sequential scan could win on cost alone; what matters
+        # here is that an index can serve the query
+        db.execute(text("SET enable_seqscan = off"))
+
+    user_ids = list(range(1, 51))
+    start_date, end_date = date(2025, 1, 6), date(2025, 2, 6)
+    queries = read_path_queries(crud, user_ids, start_date, end_date)
+
+    failed = False
+    for name, query in queries.items():
+        plan = explain(db, query)
+        ok = uses_index(plan, engine.dialect.name, index_name(name, engine.dialect.name))
+        failed = failed or not ok
+        print(f"{'ok  ' if ok else 'FAIL'} {name}")
+        if not ok or args.verbose:
+            print(plan)
+    db.close()
+    return 1 if failed else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
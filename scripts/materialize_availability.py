@@ -0,0 +1,40 @@
+""" Extend the materialized daily availability up to the horizon, for running from cron.
+
+Drops the days that fell out of the horizon and materializes each user's missing days; see
+crud.extend_materialized_horizon. Run it daily, with MATERIALIZE_INTERVAL=0 in the app if the app
+shouldn't do the same in the background.
+
+    python scripts/materialize_availability.py
+    python scripts/materialize_availability.py --horizon-days 180
+"""
+import argparse
+import os
+import sys
+import time
+
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), "..")))
+
+
+def main() -> int:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--horizon-days", type=int, help="days ahead to materialize (default: MATERIALIZED_HORIZON_DAYS or 90)")
+    args = parser.parse_args()
+
+    if args.horizon_days is not None:
+        os.environ["MATERIALIZED_HORIZON_DAYS"] = str(args.horizon_days)
+    from app import crud  # After MATERIALIZED_HORIZON_DAYS is set, crud reads it on import
+    from app.database import SessionLocal, init_engines
+
+    started = time.perf_counter()
+    init_engines()
+    db = SessionLocal()
+    try:
+        written = crud.extend_materialized_horizon(db)
+    finally:
+        db.close()
+    print(f"Materialized {written} days of availability in {time.perf_counter() - started:.1f}s")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
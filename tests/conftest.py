@@ -0,0 +1,21 @@
+import pytest
+
+
+@pytest.fixture(scope="session")
+def engine(tmp_path_factory):
+    from app import database, models
+
+    engine = database.init_engines(f"sqlite:///{tmp_path_factory.mktemp('db') / 'test.sqlite'}")
+    models.Base.metadata.create_all(bind=engine)
+    return engine
+
+
+@pytest.fixture
+def db(engine):
+    from app.cache import availability_cache
+    from app.database import SessionLocal
+
+    availability_cache.clear()
+    session = SessionLocal()
+    yield session
+    session.close()
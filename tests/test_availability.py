@@ -0,0 +1,34 @@
+from datetime import date
+
+from app.availability import UserAvailability, compile_availability
+
+
+def expand(rules, start_date, end_date, tz):
+    user_availability = UserAvailability()
+    for day, start, end, zone in rules:
+        user_availability.add_weekly(day, start, end, zone)
+    return user_availability.expand(start_date, end_date, tz)
+
+
+def test_slot_moved_into_target_zone_with_the_offset_of_its_utc_date():
+    # Sunday 04:15-05:15 in Kolkata on 25-10-2026 is 22:45-23:45 UTC on the 24th, still BST in London
+    slots = expand([("Sunday", 255, 315, "Asia/Kolkata")], date(2026, 10, 24), date(2026, 10, 25), "Europe/London")
+    assert slots == {date(2026, 10, 24): [(1425, 1440)], date(2026, 10, 25): [(0, 45)]}
+
+
+def test_evening_slot_across_new_york_and_london_dst_changes():
+    rules = [("Saturday", 1260, 1380, "America/New_York"), ("Sunday", 1260, 1380, "America/New_York")]
+    slots = expand(rules, date(2026, 10, 31), date(2026, 11, 2), "Europe/London")
+    # 21:00 EDT on the 31st is 01:00 UTC on 1 Nov (GMT); 21:00 EST on 1 Nov is 02:00 UTC on the 2nd
+    assert slots == {date(2026, 11, 1): [(60, 180)], date(2026, 11, 2): [(120, 240)]}
+
+
+def test_same_zone_round_trips_across_dst():
+    slots = expand([("Sunday", 540, 1020, "Europe/Paris")], date(2026, 10, 25), date(2026, 10, 25), "Europe/Paris")
+    assert slots == {date(2026, 10, 25): [(540, 1020)]}
+
+
+def test_compiled_rows_are_converted_back_from_utc():
+    # Stored in UTC with the offset in effect when saved (+120 in Paris summer)
+    compiled = compile_availability([("Monday", 420, 900, "Europe/Paris", 120)], [])
+    assert compiled.expand(date(2026, 7, 6), date(2026, 7, 6), "Europe/Paris") == {date(2026, 7, 6): [(540, 1020)]}
@@ -0,0 +1,69 @@
+import random
+from datetime import date, timedelta
+
+import pytest
+
+from app.availability import intersect_by_date
+
+np = pytest.importorskip("numpy")
+from app.bitmap import common_availability_bitmap  # noqa: E402
+
+
+def round_inwards(slots_by_date, resolution):
+    rounded = {}
+    for slot_date, slots in slots_by_date.items():
+        for start, end in slots:
+            start, end = -(-start // resolution) * resolution, end // resolution * resolution
+            if end > start:
+                rounded.setdefault(slot_date, []).append((start, end))
+    return rounded
+
+
+def random_user(rng, start_date, days):
+    # Unaligned, overlapping and touching slots, in no particular order
+    slots = {}
+    for offset in range(days):
+        day_slots = []
+        for _ in range(rng.randrange(0, 6)):
+            start = rng.randrange(0, 1400)
+            end = min(1440, start + rng.randrange(1, 300))
+            day_slots.append((start, end))
+            if rng.random() < 0.3 and end < 1440:
+                day_slots.append((end, min(1440, end + rng.randrange(1, 120))))
+        rng.shuffle(day_slots)
+        if day_slots:
+            slots[start_date + timedelta(days=offset)] = day_slots
+    return slots
+
+
+def test_touching_slots_keep_the_bucket_between_them():
+    day = date(2025, 1, 6)
+    users = [{day: [(540, 610), (610, 660)]}]
+    assert common_availability_bitmap(users, day, day, 15) == intersect_by_date(users, day, day) == {day: [(540, 660)]}
+
+
+@pytest.mark.parametrize("seed", range(20))
+def test_bitmap_matches_interval_backend_rounded_inwards(seed):
+    rng = random.Random(seed)
+    start_date, days = date(2025, 1, 6), rng.randrange(1, 10)
+    end_date = start_date + timedelta(days=days - 1)
+    resolution = rng.choice([1, 5, 10, 15, 30, 60])
+    users = [random_user(rng, start_date, days) for _ in range(rng.randrange(1, 5))]
+
+    expected = round_inwards(intersect_by_date(users, start_date, end_date), resolution)
+    assert common_availability_bitmap(users, start_date, end_date, resolution) == expected
+    # In runs of a few days, or a single one, within a small cell budget
+    assert common_availability_bitmap(users, start_date, end_date, resolution, max_cells=1) == expected
+    assert common_availability_bitmap(users, start_date, end_date, resolution, max_cells=len(users) * 3 * 1441) == expected
+
+
+@pytest.mark.parametrize("resolution", [0, 1, 2, 7])
+def test_bitmap_resolution_is_bounded(resolution):
+    from fastapi import HTTPException
+
+    from app import crud
+
+    with pytest.raises(HTTPException) as error:
+        crud.check_common_availability_args("UTC", "bitmap", resolution)
+    assert error.value.status_code == 400
+    crud.check_common_availability_args("UTC", "bitmap", crud.MIN_BITMAP_RESOLUTION)
@@ -0,0 +1,123 @@
+from datetime import date, time
+
+import pytest
+from fastapi.testclient import TestClient
+
+from app import crud, database, main, models
+from app.cache import response_cache
+from app.schemas import CustomAvailabilityCreate, GeneralAvailabilityCreate
+
+
+# Past the materialized horizon, so availability is compiled from the rules
+START, END = date(2030, 1, 7), date(2030, 1, 13)
+
+
+@pytest.fixture
+def user_id(db):
+    user = models.User(name="Cache", email="cache@example.com", time_zone="UTC")
+    db.add(user)
+    db.commit()
+    crud.create_general_availability(db, GeneralAvailabilityCreate(user_id=user.id, day="Monday", start_time=time(9), end_time=time(10), time_zone="UTC"))
+    yield user.id
+    for model in (models.GeneralAvailability, models.CustomAvailability, models.DailyAvailability):
+        db.query(model).filter(model.user_id == user.id).delete()
+    db.delete(user)
+    db.commit()
+
+
+def test_write_during_load_is_not_cached(db, user_id, monkeypatch):
+    load_availability_rows = crud.load_availability_rows
+
+    def load_then_write(*args):
+        # The rows are read, then a write commits before the load stores its result in the cache
+        rows = load_availability_rows(*args)
+        monkeypatch.setattr(crud, "load_availability_rows", load_availability_rows)
+        crud.create_custom_availability(db, CustomAvailabilityCreate(user_id=user_id, date=START, start_time=time(12), end_time=time(13), time_zone="UTC"))
+        return rows
+
+    monkeypatch.setattr(crud, "load_availability_rows", load_then_write)
+    stale = crud.get_compiled_availability(db, [user_id], START, END)
+    assert stale[user_id].expand(START, START) == {START: [(9 * 60, 10 * 60)]}
+
+    fresh = crud.get_compiled_availability(db, [user_id], START, END)
+    assert fresh[user_id].expand(START, START) == {START: [(12 * 60, 13 * 60)]}
+
+
+@pytest.fixture
+def client(engine):
+    response_cache.clear()
+    with TestClient(main.create_app()) as client:
+        yield client
+    # Shutting the app down disposes the engines; bind the test database again for the tests after
+    database.init_engines(engine.url.render_as_string(hide_password=False))
+
+
+@pytest.fixture
+def computed(monkeypatch):
+    # Request user ids of every computation behind /common-availability/, i.e. of every cache miss
+    calls = []
+    compute = crud.get_common_availability_async
+
+    async def counting(session_factory, user_ids, *args):
+        calls.append(user_ids)
+        return await compute(session_factory, user_ids, *args)
+
+    monkeypatch.setattr(crud, "get_common_availability_async", counting)
+    return calls
+
+
+def common_availability(client, user_ids, etag=None):
+    headers = {"If-None-Match": etag} if etag else {}
+    payload = {"user_ids": user_ids, "startdate": START.strftime("%d-%m-%Y"), "enddate": END.strftime("%d-%m-%Y"), "timezone": "UTC"}
+    return client.post("/common-availability/", json=payload, headers=headers)
+
+
+@pytest.fixture
+def other_user_id(db):
+    user = models.User(name="Cache", email="cache2@example.com", time_zone="UTC")
+    db.add(user)
+    db.commit()
+    crud.create_general_availability(db, GeneralAvailabilityCreate(user_id=user.id, day="Monday", start_time=time(8), end_time=time(12), time_zone="UTC"))
+    yield user.id
+    for model in (models.GeneralAvailability, models.CustomAvailability, models.DailyAvailability):
+        db.query(model).filter(model.user_id == user.id).delete()
+    db.delete(user)
+    db.commit()
+
+
+def test_matching_etag_gets_304(client, computed, user_id, other_user_id):
+    first = common_availability(client, [user_id, other_user_id])
+    assert first.status_code == 200
+    assert first.json() == {"07-01-2030": ["09:00AM-10:00AM"]}
+    etag = first.headers["ETag"]
+
+    again = common_availability(client, [user_id, other_user_id], etag)
+    assert again.status_code == 304
+    assert again.content == b""
+    assert again.headers["ETag"] == etag
+    # If-None-Match compares weakly, and may list several tags
+    assert common_availability(client, [user_id, other_user_id], f'"other", W/{etag}').status_code == 304
+    assert common_availability(client, [user_id, other_user_id], '"other"').status_code == 200
+    assert len(computed) == 1
+
+
+def test_reordered_and_duplicated_user_ids_share_the_entry(client, computed, user_id, other_user_id):
+    etag = common_availability(client, [user_id, other_user_id]).headers["ETag"]
+    assert common_availability(client, [other_user_id, user_id], etag).status_code == 304
+    assert common_availability(client, [other_user_id, user_id, other_user_id]).headers["ETag"] == etag
+    assert computed == [sorted([user_id, other_user_id])]
+
+
+def test_write_changes_the_etag(client, computed, user_id, other_user_id):
+    first = common_availability(client, [user_id, other_user_id])
+    created = client.post("/custom-availability/", json={
+        "user_id": other_user_id, "date": START.isoformat(), "start_time": "09:30", "end_time": "11:00", "time_zone": "UTC"
+    })
+    assert created.status_code == 200
+
+    after = common_availability(client, [user_id, other_user_id], first.headers["ETag"])
+    assert after.status_code == 200
+    assert after.json() == {"07-01-2030": ["09:30AM-10:00AM"]}
+    assert after.headers["ETag"] != first.headers["ETag"]
+    assert common_availability(client, [user_id, other_user_id], after.headers["ETag"]).status_code == 304
+    assert len(computed) == 2
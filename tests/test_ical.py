@@ -0,0 +1,127 @@
+from datetime import date, datetime, timedelta
+
+import pytest
+
+from app import ical, models
+
+
+def read(text, default_tz="UTC"):
+    reader = ical.CalendarReader(default_tz)
+    events = []
+    for line in text.strip().splitlines():
+        events.extend(reader.feed(line))
+    events.extend(reader.close())
+    return reader, events
+
+
+def calendar(*events):
+    return "BEGIN:VCALENDAR\nVERSION:2.0\n" + "".join(f"BEGIN:VEVENT\n{event.strip()}\nEND:VEVENT\n" for event in events) + "END:VCALENDAR\n"
+
+
+def starts(event, reader, start_date, end_date):
+    return [start for start, _ in ical.occurrences(event, reader, start_date, end_date)]
+
+
+def test_folded_lines_are_joined():
+    _, [event] = read(calendar(
+        "UID:folded\nSUMMARY:Quarterly planning \n with the \n\tplatform team\nDTSTART;TZID=Euro\n pe/Paris:20300107T090000\nDURATION:PT1H"
+    ))
+    assert event.summary == "Quarterly planning with the platform team"
+    assert event.tz == "Europe/Paris"
+    assert event.start == datetime(2030, 1, 7, 9)
+
+
+def test_utc_zoned_and_floating_times():
+    reader, events = read(calendar(
+        "UID:utc\nDTSTART:20300107T090000Z\nDTEND:20300107T100000Z",
+        "UID:zoned\nDTSTART;TZID=Asia/Kolkata:20300107T090000\nDTEND;TZID=Asia/Kolkata:20300107T100000",
+        "UID:floating\nDTSTART:20300107T090000\nDTEND:20300107T100000",
+        "UID:unknown\nDTSTART;TZID=Mars/Olympus:20300107T090000\nDTEND;TZID=Mars/Olympus:20300107T100000",
+    ), default_tz="America/New_York")
+    utc, zoned, floating, unknown = events
+    assert [event.tz for event in events] == ["UTC", "Asia/Kolkata", "America/New_York", "America/New_York"]
+    assert reader.unknown_tzids == {"Mars/Olympus"}
+    day = date(2030, 1, 7)
+    assert starts(utc, reader, day, day) == [datetime(2030, 1, 7, 9)]
+    assert starts(zoned, reader, day, day) == [datetime(2030, 1, 7, 3, 30)]
+    assert starts(floating, reader, day, day) == [datetime(2030, 1, 7, 14)]
+    assert starts(unknown, reader, day, day) == [datetime(2030, 1, 7, 14)]
+    assert {event.duration for event in events} == {timedelta(hours=1)}
+
+
+def test_exdate_removes_occurrences():
+    reader, [event] = read(calendar(
+        "UID:exdate\nDTSTART;TZID=Europe/Paris:20300107T090000\nDURATION:PT1H\nRRULE:FREQ=DAILY\n"
+        "EXDATE;TZID=Europe/Paris:20300108T090000,20300110T090000\nEXDATE:20300111T080000Z"
+    ))
+    assert [start.date() for start in starts(event, reader, date(2030, 1, 7), date(2030, 1, 12))] == [
+        date(2030, 1, 7), date(2030, 1, 9), date(2030, 1, 12)
+    ]
+
+
+def test_count_and_until():
+    reader, (counted, until_time, until_date) = read(calendar(
+        "UID:count\nDTSTART:20300107T090000Z\nDURATION:PT1H\nRRULE:FREQ=WEEKLY;BYDAY=MO,WE;COUNT=3",
+        # UNTIL equal to an occurrence's start includes it
+        "UID:until\nDTSTART:20300107T090000Z\nDURATION:PT1H\nRRULE:FREQ=DAILY;UNTIL=20300109T090000Z",
+        # A date UNTIL includes that whole day in the event's zone
+        "UID:until-date\nDTSTART;TZID=America/New_York:20300107T230000\nDURATION:PT30M\nRRULE:FREQ=DAILY;UNTIL=20300109",
+    ))
+    window = (date(2030, 1, 1), date(2030, 2, 1))
+    assert starts(counted, reader, *window) == [datetime(2030, 1, 7, 9), datetime(2030, 1, 9, 9), datetime(2030, 1, 14, 9)]
+    assert starts(until_time, reader, *window) == [datetime(2030, 1, day, 9) for day in (7, 8, 9)]
+    assert starts(until_date, reader, *window) == [datetime(2030, 1, day, 4) for day in (8, 9, 10)]
+    # COUNT is counted from the rule's start, not from the window
+    assert starts(counted, reader, date(2030, 1, 10), date(2030, 2, 1)) == [datetime(2030, 1, 14, 9)]
+
+
+def test_monthly_last_friday_and_day_31():
+    last_friday = list(ical.recurrence_dates({"FREQ": "MONTHLY", "BYDAY": "-1FR"}, date(2030, 1, 1), date(2030, 6, 30)))
+    assert last_friday == [date(2030, 1, 25), date(2030, 2, 22), date(2030, 3, 29), date(2030, 4, 26), date(2030, 5, 31), date(2030, 6, 28)]
+    # Months without a 31st have no occurrence
+    day_31 = list(ical.recurrence_dates({"FREQ": "MONTHLY", "BYMONTHDAY": "31"}, date(2030, 1, 31), date(2030, 8, 31)))
+    assert day_31 == [date(2030, 1, 31), date(2030, 3, 31), date(2030, 5, 31), date(2030, 7, 31), date(2030, 8, 31)]
+    last_day = list(ical.recurrence_dates({"FREQ": "MONTHLY", "BYMONTHDAY": "-1"}, date(2030, 1, 31), date(2030, 4, 30)))
+    assert last_day == [date(2030, 1, 31), date(2030, 2, 28), date(2030, 3, 31), date(2030, 4, 30)]
+
+
+@pytest.mark.parametrize("rrule", [
+    {"FREQ": "DAILY"},
+    {"FREQ": "DAILY", "INTERVAL": "5"},
+    {"FREQ": "DAILY", "INTERVAL": "3", "BYDAY": "MO,TU,WE"},
+    {"FREQ": "WEEKLY"},
+    {"FREQ": "WEEKLY", "INTERVAL": "3", "BYDAY": "MO,TH,SU"},
+    {"FREQ": "WEEKLY", "INTERVAL": "2", "BYDAY": "SA,SU", "WKST": "SU"},
+])
+@pytest.mark.parametrize("skip_before", [date(2020, 3, 4), date(2029, 12, 30), date(2030, 1, 1), date(2030, 1, 6)])
+def test_skip_before_matches_walking_from_the_start(rrule, skip_before):
+    first, last = date(2020, 3, 4), date(2030, 2, 15)
+    walked = [day for day in ical.recurrence_dates(rrule, first, last) if day >= skip_before]
+    skipped = [day for day in ical.recurrence_dates(rrule, first, last, skip_before) if day >= skip_before]
+    assert skipped == walked
+    assert walked
+
+
+@pytest.fixture
+def user_id(db):
+    user = models.User(name="Calendar", email="ical@example.com", time_zone="Europe/Paris")
+    db.add(user)
+    db.commit()
+    yield user.id
+    db.query(models.Schedule).filter(models.Schedule.user_id == user.id).delete()
+    db.delete(user)
+    db.commit()
+
+
+def test_importing_again_inserts_nothing(db, user_id):
+    tomorrow = datetime.utcnow().date() + timedelta(days=1)
+    text = calendar(
+        f"UID:weekly\nSUMMARY:Standup\nDTSTART:{tomorrow:%Y%m%d}T090000\nDURATION:PT15M\nRRULE:FREQ=WEEKLY;COUNT=4",
+        # Runs past midnight UTC, so it is stored as two rows
+        f"UID:late\nDTSTART:{tomorrow:%Y%m%d}T230000Z\nDTEND:{tomorrow + timedelta(days=1):%Y%m%d}T010000Z",
+    )
+    first = ical.import_calendar(db, user_id, text.splitlines(keepends=True), horizon_days=60, batch_size=2)
+    assert first == {"events": 2, "skipped": 0, "inserted": 6, "errors": []}
+    second = ical.import_calendar(db, user_id, text.splitlines(keepends=True), horizon_days=60, batch_size=2)
+    assert second == {"events": 2, "skipped": 0, "inserted": 0, "errors": []}
+    assert db.query(models.Schedule).filter(models.Schedule.user_id == user_id).count() == 6
@@ -0,0 +1,99 @@
+import random
+from datetime import date, time, timedelta
+
+import pytest
+
+from app import crud, schemas
+from app.cache import availability_cache
+
+TIME_ZONES = ["UTC", "America/New_York", "Asia/Kolkata", "Europe/London", "Australia/Sydney"]
+WEEKDAYS = ["Monday", "Tuesday", "Wednesday", "Thursday", "Friday", "Saturday", "Sunday"]
+
+# Windows around the DST changes of those zones: Europe and Sydney (Oct, Mar/Apr), New York (Nov, Mar)
+WINDOWS = [
+    (date(2026, 10, 1), date(2026, 10, 8)),
+    (date(2026, 10, 22), date(2026, 11, 4)),
+    (date(2027, 3, 10), date(2027, 4, 8)),
+]
+
+
+@pytest.fixture(scope="module")
+def user_ids(engine):
+    from app.database import SessionLocal
+
+    db = SessionLocal()
+    rng = random.Random(7)
+    ids = []
+    for index, tz in enumerate(TIME_ZONES + ["Asia/Kolkata"]):
+        ids.append(crud.create_user(db, schemas.UserCreate(name="user", email=f"materialized{index}@example.com", time_zone=tz)).id)
+
+    rules = []
+    for user_id, tz in zip(ids, TIME_ZONES + ["Europe/London"]):
+        for day in WEEKDAYS:
+            # Early and late slots, which cross midnight once in UTC or in another zone
+            start = rng.randrange(0, 4 * 60, 15)
+            rules.append(schemas.GeneralAvailabilityCreate(user_id=user_id, day=day, start_time=time(start // 60, start % 60), end_time=time(start // 60 + 2, start % 60), time_zone=tz))
+            start = rng.randrange(19 * 60, 21 * 60, 15)
+            rules.append(schemas.GeneralAvailabilityCreate(user_id=user_id, day=day, start_time=time(start // 60, start % 60), end_time=time(23, 45), time_zone=tz))
+    assert not crud.bulk_create_general_availability(db, rules)["errors"]
+
+    for user_id in ids:
+        for window_start, window_end in WINDOWS:
+            custom_date = window_start + timedelta(days=rng.randrange((window_end - window_start).days))
+            crud.create_custom_availability(db, schemas.CustomAvailabilityCreate(
+                user_id=user_id, date=custom_date, start_time=time(22), end_time=time(23, 30), time_zone=rng.choice(TIME_ZONES)
+            ))
+
+    for window_start, window_end in WINDOWS:
+        crud.materialize_availability(db, ids, *crud.load_window(window_start, window_end))
+    db.commit()
+    db.close()
+    return ids
+
+
+def common_availability(db, user_ids, start_date, end_date, tz):
+    availability_cache.clear()
+    return crud.get_common_availability(db, user_ids, start_date, end_date, tz)
+
+
+@pytest.mark.parametrize("tz", TIME_ZONES)
+@pytest.mark.parametrize("window", WINDOWS)
+def test_materialized_days_match_rules_across_dst_changes(db, user_ids, monkeypatch, tz, window):
+    groups = [[user_id] for user_id in user_ids] + [user_ids[:2], user_ids[2:5], user_ids]
+    materialized = [common_availability(db, group, *window, tz) for group in groups]
+    assert any(materialized)
+
+    # A materialized query that finds nothing sends every user down the rules path
+    query = crud.materialized_availability_query
+    monkeypatch.setattr(crud, "materialized_availability_query", lambda ids, start_date, end_date: query(ids, date(1970, 1, 1), date(1970, 1, 1)))
+    rules = [common_availability(db, group, *window, tz) for group in groups]
+    assert materialized == rules
+
+
+def test_materializing_again_updates_rows_in_place(db, user_ids):
+    from app.models import DailyAvailability
+
+    window = crud.load_window(*WINDOWS[0])
+    stored = db.query(DailyAvailability).filter(DailyAvailability.user_id == user_ids[0], DailyAvailability.date == window[0]).one()
+    slots = stored.slots
+    stored.slots = "0-1"
+    db.commit()
+
+    assert crud.materialize_availability(db, user_ids[:1], *window) == (window[1] - window[0]).days + 1
+    db.commit()
+    db.expire_all()
+    rows = db.query(DailyAvailability).filter(DailyAvailability.user_id == user_ids[0], DailyAvailability.date.between(*window)).all()
+    assert len(rows) == (window[1] - window[0]).days + 1
+    assert next(row.slots for row in rows if row.date == window[0]) == slots
+
+
+def test_extension_skips_while_another_runner_holds_the_lock(db, monkeypatch):
+    from contextlib import contextmanager
+
+    @contextmanager
+    def held_elsewhere(session):
+        yield False
+
+    monkeypatch.setattr(crud, "materialize_lock", held_elsewhere)
+    monkeypatch.setattr(crud, "_extend_materialized_horizon", lambda *args: pytest.fail("extended without the lock"))
+    assert crud.extend_materialized_horizon(db) == 0
@@ -0,0 +1,147 @@
+from datetime import date, time
+
+import pytest
+from fastapi import HTTPException
+from sqlalchemy.exc import IntegrityError
+
+from app import crud, models, timezones
+from app.schemas import CustomAvailabilityCreate, GeneralAvailabilityCreate
+
+
+ZONE = "Europe/Paris"
+
+
+@pytest.fixture
+def user_id(db):
+    user = models.User(name="Overlap", email="overlap@example.com", time_zone=ZONE)
+    db.add(user)
+    db.commit()
+    yield user.id
+    db.query(models.GeneralAvailability).filter(models.GeneralAvailability.user_id == user.id).delete()
+    db.query(models.CustomAvailability).filter(models.CustomAvailability.user_id == user.id).delete()
+    db.query(models.DailyAvailability).filter(models.DailyAvailability.user_id == user.id).delete()
+    db.delete(user)
+    db.commit()
+
+
+@pytest.fixture
+def other_season_rule(db, user_id):
+    """ A Monday 09:00-10:00 rule saved on the other side of DST than today, with that day's offset. """
+    offset = 60 if timezones.utc_offset(ZONE, date.today()) == 120 else 120
+    db.add(models.GeneralAvailability(
+        user_id=user_id, day="Monday", time_zone=ZONE, utc_offset=offset,
+        start_time=timezones.minutes_to_time(9 * 60 - offset), end_time=timezones.minutes_to_time(10 * 60 - offset),
+    ))
+    db.commit()
+    return offset
+
+
+def rule(user_id, start, end, time_zone=ZONE):
+    return GeneralAvailabilityCreate(user_id=user_id, day="Monday", start_time=start, end_time=end, time_zone=time_zone)
+
+
+def test_rules_are_compared_in_wall_clock_time(db, user_id, other_season_rule):
+    # Adjacent in local time, though it lands on the stored rule in UTC in one of the seasons
+    crud.create_general_availability(db, rule(user_id, time(10), time(11)))
+    with pytest.raises(HTTPException):
+        crud.create_general_availability(db, rule(user_id, time(9), time(10)))
+    with pytest.raises(HTTPException):
+        crud.create_general_availability(db, rule(user_id, time(9, 30), time(10, 30)))
+
+
+def test_bulk_rules_are_compared_in_wall_clock_time(db, user_id, other_season_rule):
+    result = crud.bulk_create_general_availability(db, [
+        rule(user_id, time(10), time(11)),
+        rule(user_id, time(9), time(10)),
+        rule(user_id, time(10, 30), time(12)),
+    ])
+    assert result["inserted"] == 1
+    assert [error["index"] for error in result["errors"]] == [1, 2]
+
+
+def test_rules_of_other_zones_are_compared_in_utc(db, user_id):
+    # The same hour as a 09:00-10:00 Paris rule, entered in UTC
+    crud.create_general_availability(db, rule(user_id, time(9), time(10)))
+    utc_start = timezones.local_to_utc(time(9), ZONE, date.today())
+    utc_end = timezones.local_to_utc(time(10), ZONE, date.today())
+    with pytest.raises(HTTPException):
+        crud.create_general_availability(db, rule(user_id, utc_start, utc_end, "UTC"))
+
+    result = crud.bulk_create_general_availability(db, [rule(user_id, utc_start, utc_end, "UTC"), rule(user_id, utc_end, time(23), "UTC")])
+    assert result["inserted"] == 1
+    assert [error["index"] for error in result["errors"]] == [0]
+
+    db.add(models.GeneralAvailability(user_id=user_id, day="Monday", time_zone="Asia/Tokyo", utc_offset=540, start_time=utc_start, end_time=utc_end))
+    with pytest.raises(IntegrityError):
+        db.commit()
+    db.rollback()
+
+
+def test_database_rejects_wall_clock_overlap(db, user_id, other_season_rule):
+    # Past the crud check: the trigger compares the same way
+    today_offset = timezones.utc_offset(ZONE, date.today())
+    db.add(models.GeneralAvailability(
+        user_id=user_id, day="Monday", time_zone=ZONE, utc_offset=today_offset,
+        start_time=timezones.minutes_to_time(9 * 60 - today_offset), end_time=timezones.minutes_to_time(10 * 60 - today_offset),
+    ))
+    with pytest.raises(IntegrityError):
+        db.commit()
+    db.rollback()
+
+    db.add(models.GeneralAvailability(
+        user_id=user_id, day="Monday", time_zone=ZONE, utc_offset=today_offset,
+        start_time=timezones.minutes_to_time(10 * 60 - today_offset), end_time=timezones.minutes_to_time(11 * 60 - today_offset),
+    ))
+    db.commit()
+
+
+def slot(user_id, on_date, start, end, time_zone="UTC"):
+    return CustomAvailabilityCreate(user_id=user_id, date=on_date, start_time=start, end_time=end, time_zone=time_zone)
+
+
+def test_custom_slots_are_compared_on_their_utc_date(db, user_id):
+    # 01:00-02:00 in Kolkata on November 2nd is 19:30-20:30 UTC on November 1st
+    crud.create_custom_availability(db, slot(user_id, date(2026, 11, 2), time(1), time(2), "Asia/Kolkata"))
+    crud.create_custom_availability(db, slot(user_id, date(2026, 11, 2), time(19, 30), time(20, 30)))
+    with pytest.raises(HTTPException):
+        crud.create_custom_availability(db, slot(user_id, date(2026, 11, 1), time(19, 30), time(20, 30)))
+
+    result = crud.bulk_create_custom_availability(db, [
+        slot(user_id, date(2026, 11, 1), time(20), time(21)),
+        slot(user_id, date(2026, 11, 2), time(20, 30), time(21)),
+    ])
+    assert [error["index"] for error in result["errors"]] == [0]
+
+
+def test_custom_slots_crossing_midnight_reach_the_next_utc_date(db, user_id):
+    crud.create_custom_availability(db, slot(user_id, date(2026, 11, 5), time(23), time(1)))
+    # Earlier on its own date, and right after it ends the next morning
+    crud.create_custom_availability(db, slot(user_id, date(2026, 11, 5), time(0, 30), time(1, 30)))
+    crud.create_custom_availability(db, slot(user_id, date(2026, 11, 6), time(1), time(2)))
+    with pytest.raises(HTTPException):
+        crud.create_custom_availability(db, slot(user_id, date(2026, 11, 6), time(0, 30), time(1)))
+    with pytest.raises(HTTPException):
+        crud.create_custom_availability(db, slot(user_id, date(2026, 11, 4), time(23, 30), time(23, 15)))
+
+    result = crud.bulk_create_custom_availability(db, [
+        slot(user_id, date(2026, 11, 6), time(0), time(0, 30)),
+        slot(user_id, date(2026, 11, 4), time(22), time(0, 15)),
+        slot(user_id, date(2026, 11, 5), time(0), time(0, 10)),
+        slot(user_id, date(2026, 11, 4), time(21), time(22)),
+    ])
+    assert [error["index"] for error in result["errors"]] == [0, 2]
+
+
+def test_database_rejects_custom_overlap_across_zones(db, user_id):
+    crud.create_custom_availability(db, slot(user_id, date(2026, 11, 2), time(1), time(2), "Asia/Kolkata"))
+    db.add(models.CustomAvailability(
+        user_id=user_id, date=date(2026, 11, 1), start_time=time(20), end_time=time(21), time_zone="UTC", utc_date=date(2026, 11, 1),
+    ))
+    with pytest.raises(IntegrityError):
+        db.commit()
+    db.rollback()
+
+    db.add(models.CustomAvailability(
+        user_id=user_id, date=date(2026, 11, 2), start_time=time(20), end_time=time(21), time_zone="UTC", utc_date=date(2026, 11, 2),
+    ))
+    db.commit()
@@ -0,0 +1,39 @@
+from datetime import date
+
+import pytest
+from sqlalchemy import UniqueConstraint, create_engine, text
+from sqlalchemy.orm import sessionmaker
+
+from app import crud, models
+from scripts.check_query_plans import READ_PATH_INDEXES, explain, index_name, read_path_queries, seed, uses_index
+
+
+@pytest.fixture(scope="module")
+def seeded(tmp_path_factory):
+    # A database of its own: seed() numbers its users from 1
+    engine = create_engine(f"sqlite:///{tmp_path_factory.mktemp('plans') / 'plans.sqlite'}")
+    models.Base.metadata.create_all(bind=engine)
+    db = sessionmaker(bind=engine)()
+    seed(db, models)
+    db.execute(text("ANALYZE"))
+    yield db
+    db.close()
+    engine.dispose()
+
+
+@pytest.mark.parametrize("name", sorted(READ_PATH_INDEXES))
+def test_read_path_query_uses_its_index(seeded, name):
+    query = read_path_queries(crud, list(range(1, 51)), date(2025, 1, 6), date(2025, 2, 6))[name]
+    plan = explain(seeded, query)
+    assert uses_index(plan, "sqlite", index_name(name, "sqlite")), plan
+
+
+def test_no_index_duplicates_a_unique_constraint():
+    # An index on a prefix of a unique constraint's columns only adds write cost, see READ_PATH_INDEXES
+    for table in models.Base.metadata.tables.values():
+        for index in table.indexes:
+            columns = [column.name for column in index.columns]
+            for constraint in table.constraints:
+                if not isinstance(constraint, UniqueConstraint):
+                    continue
+                assert [column.name for column in constraint.columns][:len(columns)] != columns, index.name
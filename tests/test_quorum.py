@@ -0,0 +1,65 @@
+from datetime import date, time
+
+import pytest
+
+from app import crud, models, schemas
+
+
+# A Monday past the materialized horizon
+MONDAY = date(2030, 1, 7)
+
+
+@pytest.fixture
+def user_ids(db):
+    # A and B free 09:00-11:00, C 10:00-11:00, D 11:30-12:00
+    slots = [(time(9), time(11)), (time(9), time(11)), (time(10), time(11)), (time(11, 30), time(12))]
+    users = [models.User(name=f"Quorum {index}", email=f"quorum{index}@example.com", time_zone="UTC") for index in range(len(slots))]
+    db.add_all(users)
+    db.commit()
+    ids = [user.id for user in users]
+    crud.bulk_create_general_availability(db, [
+        schemas.GeneralAvailabilityCreate(user_id=user_id, day="Monday", start_time=start, end_time=end, time_zone="UTC")
+        for user_id, (start, end) in zip(ids, slots)
+    ])
+    yield ids
+    for model in (models.GeneralAvailability, models.DailyAvailability):
+        db.query(model).filter(model.user_id.in_(ids)).delete()
+    db.query(models.User).filter(models.User.id.in_(ids)).delete()
+    db.commit()
+
+
+def quorum(db, required, optional, min_attendees, min_duration=0):
+    return crud.get_quorum_availability(db, required, optional, MONDAY, MONDAY, "UTC", min_attendees, min_duration)
+
+
+def test_windows_last_as_long_as_the_quorum_holds(db, user_ids):
+    a, b, c, d = user_ids
+    # The set of free users changes at 10:00, but two of them are free from 09:00 to 11:00
+    assert quorum(db, [], [a, b, c, d], 2, min_duration=90) == [
+        {"date": "07-01-2030", "slot": "09:00AM-11:00AM", "attendees": [a, b], "missing": [c, d]},
+    ]
+    assert quorum(db, [], [a, b, c, d], 2) == [
+        {"date": "07-01-2030", "slot": "09:00AM-11:00AM", "attendees": [a, b], "missing": [c, d]},
+    ]
+    assert quorum(db, [], [a, b, c, d], 3) == [
+        {"date": "07-01-2030", "slot": "10:00AM-11:00AM", "attendees": [a, b, c], "missing": [d]},
+    ]
+
+
+def test_required_users_bound_the_window(db, user_ids):
+    a, b, c, d = user_ids
+    assert quorum(db, [c], [a, b, d], 2, min_duration=90) == []
+    assert quorum(db, [c], [a, b, d], 2, min_duration=60) == [
+        {"date": "07-01-2030", "slot": "10:00AM-11:00AM", "attendees": [c, a, b], "missing": [d]},
+    ]
+
+
+def test_quorum_runs_merge_touching_windows():
+    windows = [(540, 600, frozenset({0, 1})), (600, 660, frozenset({0, 1, 2})), (690, 720, frozenset({0, 3})), (720, 750, frozenset({3, 4}))]
+    assert list(crud.quorum_runs(windows, frozenset())) == [(540, 660, frozenset({0, 1})), (690, 750, frozenset({3}))]
+    assert list(crud.quorum_runs(windows, frozenset({0}))) == [(540, 660, frozenset({0, 1})), (690, 720, frozenset({0, 3}))]
+
+
+def test_optional_users_default_to_none():
+    request = schemas.QuorumAvailabilityRequest(required_user_ids=[1, 2], startdate="07-01-2030", enddate="07-01-2030", timezone="UTC", min_attendees=2)
+    assert request.optional_user_ids == []